@@ -1,81 +1,209 @@
 import time
-import random
-from PIL import Image, ImageDraw
+from pathlib import Path
+
+import generators
+import pipeline
+import result_cache
+import spectro_render
+import tracing
+import vocoder
 
 # --- IMPORT DU MODULE NLP DE TON GROUPE ---
 try:
     import nlp_emo
+    import lexicon_store
 except ImportError:
     print("ERREUR CRITIQUE : Le fichier nlp_emo.py est introuvable.")
     nlp_emo = None
 
+def analyze_request(emo_cache, lexicon, user_text, generator_id, vocoder_config):
+    """
+    Étape NLP seule : prompt final, Valence/Arousal, graine et clé du cache disque.
+    Partagée par le pipeline de l'interface et le traitement par lot (batch_cli).
+    """
+    if emo_cache is not None:
+        # Un seul instantané du lexique pour l'analyse ET l'empreinte de la clé :
+        # un rechargement à chaud en cours de route ne peut pas les désaccorder
+        lexicon = emo_cache.index
+        # Analyse complète (Valence, Arousal, Probas...) + prompt technique,
+        # servis par le cache si la phrase a déjà été traitée
+        emo_data, base_prompt = emo_cache.analyze_with_prompt(user_text, index=lexicon)
+        
+        # On ajoute le tag visuel [emotion:x] pour faire comme ton exemple
+        primary_emotion = emo_data.labels[0] if emo_data.labels else "neutre"
+        final_prompt = f"[emotion:{primary_emotion}] {base_prompt}"
+        
+        # Récupération des valeurs pour la simulation visuelle
+        valence, arousal = emo_data.va
+    else:
+        # Fallback si nlp_emo plante
+        final_prompt = f"Erreur NLP - {user_text}"
+        valence, arousal = 0.5, 0.5
+
+    seed = spectro_render.seed_from_prompt(final_prompt)
+    lexicon_version = getattr(lexicon, "fingerprint", "none")
+    fallback = getattr(emo_cache, "fallback", None)
+    if fallback is not None:
+        lexicon_version += "+" + fallback.fingerprint
+    cache_key = result_cache.make_key(final_prompt, seed, generator_id, lexicon_version,
+                                      vocoder=vocoder_config)
+    return {"final_prompt": final_prompt, "valence": valence, "arousal": arousal,
+            "seed": seed, "cache_key": cache_key}
+
+
 class AIController:
-    def __init__(self):
+    # Durée simulée du modèle de génération (secondes, par passe du backend)
+    SIMULATED_LATENCY = 2.0
+
+    def __init__(self, lexicon_path=None, hot_reload=False, queue_size=4,
+                 generator="procedural", generator_workers=0, max_batch=8, batch_wait=0.05,
+                 output_dir="generated", vocoder_iters=32,
+                 cache_dir="cache", cache_max_bytes=512 * 1024 ** 2, compact_lexicon=False,
+                 oov_index=None):
         print("Initialisation du contrôleur IA...")
+        self.lexicon_watcher = None
+        self.output_dir = Path(output_dir)
+        # Nombre d'itérations Griffin-Lim : compromis qualité / latence
+        self.vocoder_config = vocoder.VocoderConfig(n_iter=vocoder_iters)
         
         # 1. Chargement du Lexique (Une seule fois au démarrage)
         if nlp_emo:
-            self.lexicon = nlp_emo.load_lexicon()
+            # On garde l'index compilé (matching en une passe) plutôt que le dict brut,
+            # relu depuis sa forme compilée sur disque si le JSON n'a pas changé
+            # compact_lexicon : format en tableaux mmap, partagé par les processus d'une même machine
+            self.lexicon = lexicon_store.load_compiled_lexicon(lexicon_path, compact=compact_lexicon)
+            # Repli hors lexique (plus proches voisins), seulement si le lexique ne trouve rien
+            self.oov_fallback = self.load_oov_fallback(oov_index) if oov_index else None
+            # Mémoïsation des analyses/prompts (phrases souvent resoumises)
+            self.emo_cache = nlp_emo.EmotionCache(self.lexicon, fallback=self.oov_fallback)
             print(f"Lexique chargé : {len(self.lexicon)} catégories.")
+
+            if hot_reload and lexicon_path:
+                self.lexicon_watcher = lexicon_store.LexiconWatcher(lexicon_path, self.swap_lexicon,
+                                                                    compact=compact_lexicon).start()
         else:
             self.lexicon = {}
+            self.oov_fallback = None
+
+        # 2. Générateur de spectrogrammes : chargé en arrière-plan, l'UI reste libre
+        self.generator_id = generator
+        self.result_cache = result_cache.ResultCache(cache_dir, max_bytes=cache_max_bytes)
+        options = {"latency": self.SIMULATED_LATENCY} if generator == "procedural" else {}
+        self.generator = generators.ModelPool(generator, workers=generator_workers, **options).warm_up()
+
+        self.single_flight = pipeline.SingleFlight()
+
+        # 3. Pipeline analyse -> spectrogramme -> vocodeur (un thread par étage)
+        self.pipeline = pipeline.StagedPipeline([
+            pipeline.Stage("analyze", self._stage_analyze, 0.1),
+            pipeline.Stage("spectrogram", self._stage_spectrogram, 0.6,
+                           max_batch=max_batch, max_wait=batch_wait),
+            pipeline.Stage("vocoder", self._stage_vocoder, 0.3),
+        ], maxsize=queue_size)
+
+    def load_oov_fallback(self, path):
+        try:
+            from oov_fallback import OOVFallback
+            fallback = OOVFallback(path)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Repli hors lexique indisponible ({path}) : {e}")
+            return None
+        if fallback.meta.get("lexicon_fingerprint") != self.lexicon.fingerprint:
+            print(f"[WARN] L'index {path} a été construit pour un autre lexique")
+        print(f"Repli hors lexique : {fallback.meta['items']} mots indexés.")
+        return fallback
+
+    def swap_lexicon(self, index):
+        """
+        Remplace le lexique actif. Simple réaffectation de référence (atomique) :
+        les pipelines en cours terminent avec l'index qu'ils ont déjà pris.
+        """
+        self.emo_cache.set_lexicon(index)
+        self.lexicon = index
+        print(f"Lexique rechargé : {len(index)} catégories.")
+
+    # ====================================================
+    # PIPELINE PAR ETAGES
+    # ====================================================
+    def submit(self, user_text, on_progress=None, block=True, timeout=None):
+        """
+        Soumet une requête au pipeline et renvoie tout de suite sa poignée
+        (future, progression par étage, annulation).
+        Bloque (contre-pression) si trop de requêtes attendent déjà.
+        Les requêtes identiques (même texte et mêmes réglages) en cours sont
+        fusionnées : chaque appelant a sa poignée, annulable séparément.
+        """
+        # Single-flight : une requête identique déjà en cours est partagée.
+        # Clé sur le texte brut : le prompt (donc graine et WAV) en dépend, pas seulement sa forme normalisée
+        key = (user_text, self.generator_id, self.vocoder_config)
+        handle = self.single_flight.submit(
+            key, user_text,
+            lambda: self.pipeline.submit(pipeline.GenerationHandle(user_text), block=block, timeout=timeout),
+            on_progress,
+        )
+        if tracing.enabled():
+            tracing.gauge("queue_depth", sum(self.pipeline.queue_depths()))
+            start = time.perf_counter()
+            handle.future.add_done_callback(
+                lambda f: f.cancelled() or tracing.record("pipeline_total", time.perf_counter() - start, start))
+        return handle
 
     def process_pipeline(self, user_text):
         """
         Pipeline hybride :
         - NLP : Vrai code (nlp_emo.py)
         - Image/Audio : Simulation (en attendant les modules)
+        Version synchrone : soumet puis attend le résultat.
         """
-        print(f"--- Traitement : {user_text} ---")
+        return self.submit(user_text).result()
+
+    def _stage_analyze(self, job):
+        print(f"--- Traitement : {job.text} ---")
+        user_text = job.text
 
         # ====================================================
         # ETAPE 1 : ANALYSE EMOTIONNELLE (VRAI CODE)
         # ====================================================
-        if nlp_emo:
-            # Analyse complète (Valence, Arousal, Probas...)
-            emo_data = nlp_emo.analyze_text_emotion(user_text, self.lexicon)
-            
-            # Génération du prompt technique via ta fonction
-            base_prompt = nlp_emo.emotion_to_prompt(user_text, emo_data)
-            
-            # On ajoute le tag visuel [emotion:x] pour faire comme ton exemple
-            primary_emotion = emo_data.labels[0] if emo_data.labels else "neutre"
-            final_prompt = f"[emotion:{primary_emotion}] {base_prompt}"
-            
-            # Récupération des valeurs pour la simulation visuelle
-            valence, arousal = emo_data.va
-        else:
-            # Fallback si nlp_emo plante
-            final_prompt = f"Erreur NLP - {user_text}"
-            valence, arousal = 0.5, 0.5
+        job.data.update(analyze_request(self.emo_cache if nlp_emo else None, self.lexicon, user_text,
+                                        self.generator_id, self.vocoder_config))
+        final_prompt = job.data["final_prompt"]
 
+        # Cache disque : déjà généré (même prompt, graine, backend, lexique) ?
+        hit = self.result_cache.get(job.data["cache_key"])
+        tracing.count("result_cache.hit" if hit is not None else "result_cache.miss")
+        if hit is not None:
+            job.data["spectrogram"] = hit.spectrogram
+            job.data["result"] = (final_prompt, hit.image, str(hit.audio_path))
 
+    def _stage_spectrogram(self, jobs):
         # ====================================================
-        # ETAPE 2 : GENERATION SPECTROGRAMME (SIMULATION)
+        # ETAPE 2 : GENERATION SPECTROGRAMME
         # ====================================================
-        # Ici brancher plus tard : image = stable_diffusion.generate(final_prompt)
-        time.sleep(2) 
-        
-        # Création d'un faux spectrogramme qui change de couleur selon l'émotion détectée
-        # Valence (X) -> Rouge vers Vert
-        # Arousal (Y) -> Sombre vers Lumineux
-        r = int((1 - valence) * 255)
-        g = int(valence * 255)
-        b = int(arousal * 255)
-        
-        img = Image.new('RGB', (512, 256), color=(r, g, b))
-        
-        # On dessine quelques traits pour faire "spectrogramme"
-        draw = ImageDraw.Draw(img)
-        for i in range(0, 512, 10):
-            height = random.randint(10, 200) * arousal
-            draw.line([(i, 256), (i, 256 - height)], fill=(255, 255, 255), width=2)
-
+        # Les requêtes arrivées ensemble sont micro-batchées en une seule passe
+        # du backend (ProceduralBackend par défaut, un vrai modèle plus tard)
+        # Graine dérivée du prompt : même demande -> même spectrogramme
+        requests = [
+            generators.GenerationRequest(job.data["final_prompt"], job.data["valence"], job.data["arousal"],
+                                         seed=job.data["seed"])
+            for job in jobs
+        ]
+        with tracing.span("render"):
+            magnitudes = self.generator.generate_batch(requests)
+            for job, req, mag in zip(jobs, requests, magnitudes):
+                job.data["spectrogram"] = mag
+                job.data["img"] = spectro_render.to_rgb(mag, req.valence, req.arousal)
+        tracing.gauge("render_batch", len(jobs))
 
+    def _stage_vocoder(self, job):
         # ====================================================
-        # ETAPE 3 : RECONSTRUCTION AUDIO (SIMULATION)
+        # ETAPE 3 : RECONSTRUCTION AUDIO (GRIFFIN-LIM)
         # ====================================================
-        # Ici brancher : audio_path = vocoder.reconstruct(img)
-        audio_path = "output_generated.wav"
+        # WAV 24kHz / 10s écrit par blocs (la forme d'onde n'est jamais entière en mémoire),
+        # nommé par la clé du cache : même fichier <=> même prompt, backend, lexique et vocodeur
+        audio_path = self.output_dir / f"{job.data['cache_key']}.wav"
+        with tracing.span("vocoder"):
+            vocoder.write_wav(job.data["spectrogram"], audio_path, self.vocoder_config)
+        self.result_cache.put(job.data["cache_key"], job.data["spectrogram"], job.data["img"],
+                              audio_path, prompt=job.data["final_prompt"])
 
-        return final_prompt, img, audio_path
\ No newline at end of file
+        job.data["result"] = (job.data["final_prompt"], job.data["img"], str(audio_path))
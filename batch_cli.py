@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+"""
+Traitement par lot sans interface graphique
+    python batch_cli.py prompts.jsonl -o resultats.jsonl
+    cat prompts.jsonl | python main.py --batch - -o resultats.jsonl --resume
+Entrée : JSONL, une requête par ligne ({"id": ..., "text": ...}, ou une chaîne JSON).
+- NLP dans le processus principal (lexique compilé + EmotionCache), puis
+  consultation du cache disque.
+- Génération + vocodeur dans un pool de processus (un par cœur), par petits lots.
+- Sortie JSONL dans l'ordre d'entrée (--ordered, défaut) ou au fil de l'eau.
+- Reprise après crash (--resume) : le fichier de sortie sert de point de
+  contrôle, les ids déjà écrits sont sautés.
+- Bilan final : débit et percentiles de latence par étage (sur stderr).
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import generators
+import result_cache
+import spectro_render
+import vocoder
+from backend_logic import analyze_request, lexicon_store, nlp_emo
+
+STAGES = ("analyze", "cache", "spectrogram", "vocoder", "total")
+
+# =============================================================================
+# 1. ENTRÉE / POINT DE CONTRÔLE
+# =============================================================================
+
+def iter_requests(stream):
+    """(id, texte) pour chaque ligne JSONL non vide ; id = numéro de ligne s'il est absent."""
+    for lineno, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            print(f"[WARN] Ligne {lineno + 1} ignorée (JSON invalide)", file=sys.stderr)
+            continue
+        if isinstance(obj, str):
+            yield str(lineno), obj
+        elif isinstance(obj, dict) and isinstance(obj.get("text"), str):
+            yield str(obj.get("id", lineno)), obj["text"]
+        else:
+            print(f"[WARN] Ligne {lineno + 1} ignorée (champ \"text\" manquant)", file=sys.stderr)
+
+def load_checkpoint(path: Path) -> set[str]:
+    """
+    Ids déjà présents dans un fichier de sortie. Une dernière ligne tronquée
+    (crash pendant l'écriture) est coupée pour que la reprise reparte proprement.
+    """
+    done = set()
+    if not path.exists():
+        return done
+    good = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                done.add(str(json.loads(raw)["id"]))
+            except (ValueError, KeyError, TypeError):
+                break
+            good += len(raw)
+    if good != path.stat().st_size:
+        print(f"[WARN] Fin de {path} tronquée, reprise après {len(done)} résultats", file=sys.stderr)
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    return done
+
+# =============================================================================
+# 2. WORKERS (GÉNÉRATION + VOCODEUR)
+# =============================================================================
+
+_worker = None
+
+def _worker_init(backend: str, options: dict, shared, output_dir: str, cache_dir: str | None,
+                 cache_max_bytes: int, vocoder_config: vocoder.VocoderConfig):
+    global _worker
+    model = generators.get_backend_class(backend)(**options)
+    model.load(shared)
+    cache = result_cache.ResultCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+    _worker = (model, Path(output_dir), cache, vocoder_config)
+
+def _export(src: Path, dst: Path):
+    """Lien physique de src vers dst (copie si autre système de fichiers), remplacé atomiquement."""
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    with contextlib.suppress(FileNotFoundError):
+        tmp.unlink()
+    try:
+        os.link(src, tmp)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+def _worker_run(jobs: list[dict]) -> list[dict]:
+    """Un lot : une passe du générateur, puis le vocodeur pour chaque requête."""
+    model, output_dir, cache, config = _worker
+    t0 = time.perf_counter()
+    requests = [generators.GenerationRequest(j["final_prompt"], j["valence"], j["arousal"], seed=j["seed"])
+                for j in jobs]
+    magnitudes = model.generate_batch(requests)
+    t_spec = time.perf_counter() - t0
+    out = []
+    for job, req, mag in zip(jobs, requests, magnitudes):
+        t1 = time.perf_counter()
+        img = spectro_render.to_rgb(mag, req.valence, req.arousal)
+        # Nommés par la clé du cache, écrits puis renommés : deux workers ne réécrivent jamais le même fichier
+        stem = output_dir / job["cache_key"]
+        audio_path = vocoder.write_wav(mag, stem.with_suffix(".wav"), config)
+        image_path = stem.with_suffix(".png")
+        tmp = output_dir / f".{image_path.name}.{os.getpid()}.tmp"
+        img.save(tmp, format="PNG")
+        os.replace(tmp, image_path)
+        if cache is not None:
+            cache.put(job["cache_key"], mag, img, audio_path, prompt=job["final_prompt"])
+        out.append({"audio": str(audio_path), "image": str(image_path),
+                    "spectrogram": t_spec, "vocoder": time.perf_counter() - t1})
+    return out
+
+# =============================================================================
+# 3. ORCHESTRATION
+# =============================================================================
+
+def percentiles(values: list[float], qs=(50, 95, 99)) -> dict:
+    if not values:
+        return {f"p{q}": None for q in qs}
+    s = sorted(values)
+    return {f"p{q}": s[min(len(s) - 1, int(round(q / 100 * (len(s) - 1))))] for q in qs}
+
+def default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class BatchRunner:
+    """Pipeline NLP (local) -> cache -> pool de processus, avec fenêtre bornée de lots en vol."""
+
+    def __init__(self, lexicon_path=None, workers=None, batch_size=8, generator="procedural",
+                 latency=0.0, output_dir="generated", cache_dir="cache", cache_max_bytes=512 * 1024 ** 2,
+                 vocoder_iters=32, ordered=True, compact_lexicon=False, oov_index=None):
+        self.workers = workers or default_workers()
+        self.batch_size = max(1, batch_size)
+        self.ordered = ordered
+        self.generator_id = generator
+        self.vocoder_config = vocoder.VocoderConfig(n_iter=vocoder_iters)
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = result_cache.ResultCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+
+        if nlp_emo:
+            self.lexicon = lexicon_store.load_compiled_lexicon(lexicon_path, compact=compact_lexicon)
+            fallback = None
+            if oov_index:
+                from oov_fallback import OOVFallback
+                fallback = OOVFallback(oov_index)
+            self.emo_cache = nlp_emo.EmotionCache(self.lexicon, fallback=fallback)
+        else:
+            self.lexicon, self.emo_cache = {}, None
+
+        options = {"latency": latency} if generator == "procedural" else {}
+        backend_cls = generators.get_backend_class(generator)
+        shared = backend_cls.load_shared(**options)
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=ctx, initializer=_worker_init,
+            initargs=(generator, options, shared, str(self.output_dir), str(cache_dir) if cache_dir else None,
+                      cache_max_bytes, self.vocoder_config),
+        )
+        self.latencies = {name: [] for name in STAGES}
+        self.counts = {"done": 0, "cached": 0, "deduplicated": 0, "skipped": 0, "failed": 0}
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _analyze(self, rid, text) -> dict:
+        t0 = time.perf_counter()
+        job = analyze_request(self.emo_cache, self.lexicon, text, self.generator_id, self.vocoder_config)
+        t1 = time.perf_counter()
+        job.update(id=rid, text=text, t_start=t0, analyze=t1 - t0)
+        hit = self.cache.get(job["cache_key"]) if self.cache is not None else None
+        job["cache"] = time.perf_counter() - t1
+        if hit is not None:
+            # La sortie ne pointe jamais dans le cache (une éviction l'effacerait) :
+            # fichiers liés dans output_dir sous le même nom que pour un calcul
+            stem = self.output_dir / job["cache_key"]
+            try:
+                _export(hit.audio_path, stem.with_suffix(".wav"))
+                _export(hit.audio_path.parent / result_cache.PREVIEW, stem.with_suffix(".png"))
+            except FileNotFoundError:
+                return job  # évincée entre-temps : traitée comme un calcul
+            job.update(audio=str(stem.with_suffix(".wav")), image=str(stem.with_suffix(".png")),
+                       cached=True, spectrogram=0.0, vocoder=0.0)
+        return job
+
+    def _record(self, job) -> dict | None:
+        """Enregistre les latences d'un résultat terminé et renvoie sa ligne de sortie (None si échec)."""
+        job["total"] = time.perf_counter() - job["t_start"]
+        if job.get("error"):
+            self.counts["failed"] += 1
+        else:
+            self.counts["done"] += 1
+            self.counts["cached"] += bool(job.get("cached"))
+            for name in STAGES:
+                self.latencies[name].append(job[name])
+        if job.get("error"):
+            # Pas écrit dans la sortie : une reprise retentera cette requête
+            print(f"[WARN] Requête {job['id']} en échec : {job['error']}", file=sys.stderr)
+            return None
+        return {"id": job["id"], "text": job["text"], "prompt": job["final_prompt"],
+                "valence": job["valence"], "arousal": job["arousal"], "seed": job["seed"],
+                "audio": job["audio"], "image": job["image"], "cached": bool(job.get("cached"))}
+
+    def run(self, requests, out, skip: set[str] = frozenset()):
+        """
+        Traite un itérable de (id, texte) et écrit une ligne JSON par résultat dans out.
+        En mode ordonné, un résultat attend que tous les précédents soient écrits.
+        """
+        window = self.workers * 2          # lots en vol (contre-pression sur la lecture)
+        inflight = {}                      # future -> lot de jobs
+        pending = {}                       # rang -> ligne prête (mode ordonné)
+        waiting = {}                       # clé du cache -> copies d'un prompt déjà soumis
+        produced = {}                      # clé du cache -> fichiers déjà produits pendant ce lot
+        next_rank = 0
+        batch = []
+
+        def emit(rank, record):
+            nonlocal next_rank
+            if not self.ordered:
+                if record is not None:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                return
+            pending[rank] = record
+            while next_rank in pending:
+                record = pending.pop(next_rank)
+                if record is not None:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                next_rank += 1
+
+        def finish(done):
+            for fut in done:
+                jobs = inflight.pop(fut)
+                try:
+                    results = fut.result()
+                except Exception as e:
+                    results = [{"error": f"{type(e).__name__}: {e}"}] * len(jobs)
+                for job, res in zip(jobs, results):
+                    job.update(res)
+                    emit(job["rank"], self._record(job))
+                    if not job.get("error"):
+                        produced[job["cache_key"]] = {"audio": job["audio"], "image": job["image"]}
+                    for copy in waiting.pop(job["cache_key"], []):
+                        reuse(copy, res)
+            out.flush()
+
+        def reuse(job, res):
+            """Copie d'un prompt identique : reprend les fichiers produits pour le premier."""
+            job.update(res, spectrogram=0.0, vocoder=0.0)
+            self.counts["deduplicated"] += not job.get("error")
+            emit(job["rank"], self._record(job))
+
+        def flush_batch():
+            nonlocal batch
+            if not batch:
+                return
+            while len(inflight) >= window:
+                finish(wait(inflight, return_when=FIRST_COMPLETED).done)
+            fields = ("final_prompt", "valence", "arousal", "seed", "cache_key")
+            fut = self.executor.submit(_worker_run, [{k: j[k] for k in fields} for j in batch])
+            inflight[fut] = batch
+            batch = []
+
+        t_start = time.perf_counter()
+        rank = 0
+        for rid, text in requests:
+            if rid in skip:
+                self.counts["skipped"] += 1
+                continue
+            job = self._analyze(rid, text)
+            job["rank"] = rank
+            rank += 1
+            if job.get("cached"):
+                emit(job["rank"], self._record(job))
+                continue
+            # Prompt identique dans ce lot : vocodé une seule fois
+            key = job["cache_key"]
+            if key in produced:
+                reuse(job, produced[key])
+                continue
+            if key in waiting:
+                waiting[key].append(job)
+                continue
+            waiting[key] = []
+            batch.append(job)
+            if len(batch) >= self.batch_size:
+                flush_batch()
+        flush_batch()
+        while inflight:
+            finish(wait(inflight, return_when=FIRST_COMPLETED).done)
+        out.flush()
+        return self.report(time.perf_counter() - t_start)
+
+    def report(self, elapsed: float) -> dict:
+        n = self.counts["done"]
+        return {
+            "elapsed_s": elapsed,
+            "throughput_per_s": n / elapsed if elapsed > 0 else None,
+            "workers": self.workers,
+            **self.counts,
+            "latency_s": {name: percentiles(vals) for name, vals in self.latencies.items()},
+        }
+
+def print_report(rep: dict, stream=sys.stderr):
+    print(f"[BATCH] {rep['done']} résultats ({rep['cached']} depuis le cache, {rep['deduplicated']} dédoublonnés, "
+          f"{rep['skipped']} repris, {rep['failed']} en échec) en {rep['elapsed_s']:.2f}s, "
+          f"{rep['throughput_per_s'] or 0:.2f}/s, {rep['workers']} workers", file=stream)
+    for name, p in rep["latency_s"].items():
+        if p["p50"] is None:
+            continue
+        print(f"[BATCH] {name:<12} p50={p['p50'] * 1000:8.1f}ms  p95={p['p95'] * 1000:8.1f}ms  "
+              f"p99={p['p99'] * 1000:8.1f}ms", file=stream)
+
+# =============================================================================
+# 4. LIGNE DE COMMANDE
+# =============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="batch_cli", description="Génération par lot sans interface (JSONL).")
+    p.add_argument("input", nargs="?", default="-", help="fichier JSONL, ou - pour stdin (défaut)")
+    p.add_argument("-o", "--output", default="-", help="fichier JSONL de sortie, ou - pour stdout (défaut)")
+    p.add_argument("--resume", action="store_true", help="reprendre : saute les ids déjà présents dans --output")
+    order = p.add_mutually_exclusive_group()
+    order.add_argument("--ordered", dest="ordered", action="store_true", default=True,
+                       help="résultats dans l'ordre d'entrée (défaut)")
+    order.add_argument("--unordered", dest="ordered", action="store_false",
+                       help="résultats écrits dès qu'ils sont prêts")
+    p.add_argument("-j", "--workers", type=int, default=None, help="processus de génération (défaut : nb de cœurs)")
+    p.add_argument("--batch-size", type=int, default=8, help="requêtes par passe du générateur")
+    p.add_argument("--lexicon", default=None, help="lexique JSON (défaut : lexique intégré)")
+    p.add_argument("--compact-lexicon", action="store_true",
+                   help="lexique au format compact mmap (<lexique>.lexc) plutôt que l'index en dicts")
+    p.add_argument("--oov-index", default=None, help="index de repli hors lexique (oov_fallback.py)")
+    p.add_argument("--generator", default="procedural", choices=generators.available_backends())
+    p.add_argument("--latency", type=float, default=0.0, help="latence simulée par passe du générateur (s)")
+    p.add_argument("--output-dir", default="generated", help="dossier des WAV/PNG produits")
+    p.add_argument("--cache-dir", default="cache", help="cache disque des résultats ('' pour désactiver)")
+    p.add_argument("--vocoder-iters", type=int, default=32, help="itérations Griffin-Lim")
+    p.add_argument("--report", default=None, help="écrit aussi le bilan (JSON) dans ce fichier")
+    return p
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.resume and args.output == "-":
+        print("[ERREUR] --resume demande un fichier de sortie (-o)", file=sys.stderr)
+        return 2
+
+    out_path = None if args.output == "-" else Path(args.output)
+    skip = load_checkpoint(out_path) if args.resume else set()
+    if skip:
+        print(f"[BATCH] Reprise : {len(skip)} résultats déjà présents", file=sys.stderr)
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out = sys.stdout if out_path is None else open(out_path, "a" if args.resume else "w", encoding="utf-8")
+    # Les messages des modules (print) vont sur stderr : stdout peut porter le JSONL
+    with contextlib.redirect_stdout(sys.stderr):
+        runner = BatchRunner(args.lexicon, args.workers, args.batch_size, args.generator, args.latency,
+                             args.output_dir, args.cache_dir or None, vocoder_iters=args.vocoder_iters,
+                             ordered=args.ordered, compact_lexicon=args.compact_lexicon,
+                             oov_index=args.oov_index)
+        try:
+            rep = runner.run(iter_requests(src), out, skip)
+        finally:
+            runner.close()
+            if src is not sys.stdin:
+                src.close()
+            if out is not sys.stdout:
+                out.close()
+
+    print_report(rep)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+    return 1 if rep["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Banc de mesure reproductible des chemins chauds
+    python benchmark.py -o bench_results.json
+    python benchmark.py --baseline bench_results.json --threshold 0.10
+Cas mesurés :
+- normalize / analyze_text_emotion : lexiques synthétiques (défaut -> 100k entrées)
+  x textes de 5 à 100k mots ;
+- softmax_dict / aggregate_va ;
+- rendu des spectrogrammes (render_batch, to_rgb) ;
+- AppInterface.update_plots sur un canevas Agg (sans affichage), et la vue d'un
+  WAV de 10 min via sa pyramide (construction, vue complète, zoom) ;
+- process_pipeline de bout en bout, latence simulée à 0.
+Données générées avec des graines fixes. Résultat : JSON (médiane, min, écart
+interquartile par cas). Avec --baseline, chaque cas est comparé à l'ancien
+fichier et les régressions au-delà du seuil sont signalées (code retour 1).
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+import nlp_emo
+import spectro_render
+
+LEXICON_SIZES = (None, 1_000, 10_000, 100_000)   # None = lexique par défaut
+TEXT_WORDS = (5, 100, 10_000, 100_000)
+QUICK_LEXICON_SIZES = (None, 10_000)
+QUICK_TEXT_WORDS = (5, 10_000)
+
+# =============================================================================
+# 1. DONNÉES SYNTHÉTIQUES
+# =============================================================================
+
+_SYLLABLES = ["ba", "ko", "ri", "mu", "te", "sa", "lo", "vi", "né", "zu", "pé", "da", "gi", "fo", "cha", "ou"]
+_FILLER = ["le", "la", "un", "une", "et", "de", "dans", "avec", "très", "pas", "nous", "il", "elle", "sur"]
+
+def synthetic_lexicon(n_entries: int | None, seed: int = 0) -> dict:
+    """Lexique par défaut complété de pseudo-mots (dont ~5% d'expressions de 2 mots) jusqu'à n_entries."""
+    lexicon = {emo: dict(words) for emo, words in nlp_emo.DEFAULT_LEXICON.items()}
+    if n_entries is None:
+        return lexicon
+    rng = random.Random(seed)
+    emotions = list(nlp_emo.EMO_TO_VA)
+    seen = {w for words in lexicon.values() for w in words}
+    total = len(seen)
+    while total < n_entries:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.05:
+            word += " " + "".join(rng.choice(_SYLLABLES) for _ in range(2))
+        if word in seen:
+            continue
+        seen.add(word)
+        lexicon.setdefault(rng.choice(emotions), {})[word] = rng.choice((1, 1, 2, 3))
+        total += 1
+    return lexicon
+
+def synthetic_text(lexicon: dict, n_words: int, seed: int = 0) -> str:
+    """Texte de n_words mots : ~30% de mots du lexique, accents/majuscules/ponctuation mêlés."""
+    rng = random.Random(seed)
+    vocab = [w for words in lexicon.values() for w in words]
+    out = []
+    for _ in range(n_words):
+        w = rng.choice(vocab) if rng.random() < 0.3 else rng.choice(_FILLER)
+        if rng.random() < 0.1:
+            w = w.capitalize()
+        if rng.random() < 0.08:
+            w += rng.choice((",", ".", " !", "..."))
+        out.append(w)
+    return " ".join(out)
+
+# =============================================================================
+# 2. MESURE
+# =============================================================================
+
+def measure(fn, repeat: int = 5, min_time: float = 0.05, max_number: int = 10_000) -> dict:
+    """
+    Comme timeit : calibre le nombre d'appels par mesure (>= min_time), puis
+    `repeat` mesures ; temps par appel en secondes.
+    """
+    fn()  # échauffement (caches, imports paresseux)
+    number = 1
+    while number < max_number:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - t0 >= min_time:
+            break
+        number *= 10
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - t0) / number)
+    q = statistics.quantiles(runs, n=4) if len(runs) > 1 else [runs[0]] * 3
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "iqr_s": q[2] - q[0],
+            "repeat": repeat, "number": number}
+
+# =============================================================================
+# 3. CAS
+# =============================================================================
+
+def bench_nlp(results: dict, lexicon_sizes, text_words, repeat: int):
+    for size in lexicon_sizes:
+        lexicon = synthetic_lexicon(size)
+        n_entries = sum(len(v) for v in lexicon.values())
+        label = "default" if size is None else str(size)
+        t0 = time.perf_counter()
+        index = nlp_emo.compile_lexicon(lexicon)
+        results[f"compile_lexicon/lex={label}"] = {
+            "median_s": time.perf_counter() - t0, "min_s": None, "iqr_s": None, "repeat": 1, "number": 1,
+            "params": {"entries": n_entries}}
+        for n_words in text_words:
+            text = synthetic_text(lexicon, n_words)
+            params = {"entries": n_entries, "words": n_words}
+            if size is None:
+                # normalize ne dépend pas du lexique : mesuré une fois par taille de texte
+                results[f"normalize/words={n_words}"] = dict(measure(lambda: nlp_emo.normalize(text), repeat),
+                                                              params={"words": n_words})
+            results[f"analyze_text_emotion/lex={label}/words={n_words}"] = dict(
+                measure(lambda: nlp_emo.analyze_text_emotion(text, index), repeat), params=params)
+
+def bench_scoring(results: dict, repeat: int):
+    rng = random.Random(0)
+    scores = {emo: rng.randint(0, 12) for emo in nlp_emo.EMO_TO_VA}
+    probs = nlp_emo.softmax_dict(scores)
+    results["softmax_dict"] = dict(measure(lambda: nlp_emo.softmax_dict(scores), repeat),
+                                   params={"emotions": len(scores)})
+    results["aggregate_va"] = dict(measure(lambda: nlp_emo.aggregate_va(probs), repeat),
+                                   params={"emotions": len(probs)})
+
+def bench_render(results: dict, repeat: int):
+    for n in (1, 8):
+        params = [(0.2 + 0.07 * i, 0.8 - 0.05 * i, i) for i in range(n)]
+        results[f"render_batch/n={n}"] = dict(measure(lambda: spectro_render.render_batch(params), repeat),
+                                              params={"batch": n, "height": spectro_render.DEFAULT_HEIGHT,
+                                                      "width": spectro_render.DEFAULT_WIDTH})
+    mag = spectro_render.render_batch([(0.5, 0.5, 0)])[0]
+    out = np.empty(mag.shape + (4,), dtype=np.uint8)
+    results["to_rgb"] = dict(measure(lambda: spectro_render.to_rgb(mag, 0.5, 0.5, out=out), repeat),
+                             params={"shape": list(mag.shape)})
+
+def plot_harness():
+    """
+    Objet minimal portant les méthodes de tracé d'AppInterface, sur une figure
+    Agg de même taille que dans l'interface (aucune fenêtre Tk créée).
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from ui_interface import AppInterface
+
+    ui = types.SimpleNamespace(PLOT_DURATION=AppInterface.PLOT_DURATION,
+                               SIGNAL_MIN_SPAN=AppInterface.SIGNAL_MIN_SPAN)
+    ui.fig = Figure(figsize=(10, 4), facecolor="#121212")
+    ui.axs = ui.fig.subplots(1, 2)
+    ui.canvas = FigureCanvasAgg(ui.fig)
+    for name in ("init_plot_artists", "set_plot_axes", "on_plot_draw", "blit_plot_artists", "plot_data",
+                 "update_plots", "set_spectrum", "draw_signal", "on_signal_scroll", "on_signal_press",
+                 "on_signal_drag", "on_signal_release"):
+        setattr(ui, name, types.MethodType(getattr(AppInterface, name), ui))
+    ui.emotion_class = AppInterface.emotion_class
+    ui.decimate_minmax = AppInterface.decimate_minmax
+    ui.init_plot_artists()
+    ui.canvas.draw()  # 1er rendu complet : capture du fond pour le blit
+    return ui
+
+def bench_plots(results: dict, repeat: int):
+    try:
+        ui = plot_harness()
+    except ImportError as e:
+        print(f"[WARN] update_plots non mesuré ({e})", file=sys.stderr)
+        return
+    labels = iter(["calme", "colere", "joie"] * 1_000_000)
+    results["update_plots/blit"] = dict(measure(lambda: ui.update_plots(next(labels)), repeat),
+                                        params={"path": "changement de classe, blit"})
+    results["update_plots/unchanged"] = dict(measure(lambda: ui.update_plots("joie"), repeat),
+                                             params={"path": "même classe, rien à redessiner"})
+
+    def cold():
+        ui.plot_cache.clear(); ui.plot_class = None
+        ui.update_plots("colere")
+    results["update_plots/cold"] = dict(measure(cold, repeat), params={"path": "calcul des courbes + blit"})
+
+    def full():
+        ui.plot_class = None
+        ui.update_plots("calme"); ui.canvas.draw()
+    results["update_plots/full_draw"] = dict(measure(full, repeat), params={"path": "rendu complet (resize)"})
+    bench_signal(results, ui, repeat)
+
+def bench_signal(results: dict, ui, repeat: int, seconds: int = 600, rate: int = 24000):
+    """WAV synthétique de 10 min : construction de la pyramide puis tracés à deux échelles."""
+    import wave
+    from waveform_pyramid import SignalPyramid, build_pyramid, pyramid_dir
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        path = f"{tmp}/long.wav"
+        with wave.open(path, "wb") as w:
+            w.setnchannels(1); w.setsampwidth(2); w.setframerate(rate)
+            for _ in range(seconds // 10):
+                t = np.arange(10 * rate) / rate
+                x = 0.5 * np.sin(2 * np.pi * 440 * t) + 0.1 * rng.standard_normal(len(t))
+                w.writeframes((np.clip(x, -1, 1) * 32767).astype("<i2").tobytes())
+        results["signal/build_pyramid"] = dict(measure(lambda: build_pyramid(path, pyramid_dir(path)), 1),
+                                               params={"seconds": seconds, "rate": rate})
+        ui.signal = SignalPyramid.open(path)
+        ui.canvas.draw_idle = lambda: None  # on mesure la lecture de la pyramide + set_data
+
+        def view(t0, t1):
+            ui.signal_view = (t0, t1)
+            ui.draw_signal()
+        results["signal/draw_full"] = dict(measure(lambda: view(0.0, float(seconds)), repeat),
+                                           params={"span_s": seconds})
+        results["signal/draw_zoom_1s"] = dict(measure(lambda: view(300.0, 301.0), repeat), params={"span_s": 1})
+        ui.signal = None
+
+def bench_end_to_end(results: dict, repeat: int, vocoder_iters: int):
+    import backend_logic
+    backend_logic.AIController.SIMULATED_LATENCY = 0.0
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        ai = backend_logic.AIController(output_dir=f"{tmp}/generated", cache_dir=f"{tmp}/cache",
+                                        vocoder_iters=vocoder_iters)
+        ai.generator.wait_ready()
+        counter = iter(range(10 ** 9))
+        lexicon = synthetic_lexicon(None)
+
+        def cold():
+            # Texte inédit à chaque appel : analyse + rendu + vocodeur + écriture du cache
+            ai.process_pipeline(synthetic_text(lexicon, 12, seed=next(counter)))
+        warm_text = synthetic_text(lexicon, 12, seed=-1)
+
+        results["process_pipeline/cold"] = dict(measure(cold, repeat, min_time=0.0),
+                                                params={"vocoder_iters": vocoder_iters})
+        results["process_pipeline/cached"] = dict(measure(lambda: ai.process_pipeline(warm_text), repeat),
+                                                  params={"vocoder_iters": vocoder_iters})
+        ai.pipeline.shutdown()
+        ai.generator.shutdown()
+
+# =============================================================================
+# 4. COMPARAISON / LIGNE DE COMMANDE
+# =============================================================================
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Cas communs dont la médiane a augmenté de plus de `threshold` (fraction)."""
+    regressions = []
+    for name, res in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("median_s") or res.get("min_s") is None:
+            continue
+        ratio = res["median_s"] / old["median_s"]
+        res["baseline_median_s"] = old["median_s"]
+        res["ratio"] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append({"case": name, "ratio": ratio, "old_s": old["median_s"], "new_s": res["median_s"]})
+    return regressions
+
+def environment() -> dict:
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "machine": platform.machine(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="benchmark", description="Mesure des chemins chauds (NLP, rendu, tracés, pipeline).")
+    p.add_argument("-o", "--output", default="bench_results.json", help="fichier JSON des résultats")
+    p.add_argument("--baseline", default=None, help="résultats de référence (JSON) à comparer")
+    p.add_argument("--threshold", type=float, default=0.10, help="hausse tolérée de la médiane (0.10 = +10%%)")
+    p.add_argument("--only", nargs="*", default=None, choices=("nlp", "scoring", "render", "plots", "pipeline"),
+                   help="groupes de cas à exécuter (défaut : tous)")
+    p.add_argument("--quick", action="store_true", help="grille réduite (lexiques/textes) et moins de mesures")
+    p.add_argument("--repeat", type=int, default=None, help="mesures par cas (défaut : 5, 3 en --quick)")
+    p.add_argument("--vocoder-iters", type=int, default=32, help="itérations Griffin-Lim du cas de bout en bout")
+    return p
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    repeat = args.repeat or (3 if args.quick else 5)
+    groups = set(args.only or ("nlp", "scoring", "render", "plots", "pipeline"))
+    results = {}
+    if "nlp" in groups:
+        bench_nlp(results, QUICK_LEXICON_SIZES if args.quick else LEXICON_SIZES,
+                  QUICK_TEXT_WORDS if args.quick else TEXT_WORDS, repeat)
+    if "scoring" in groups:
+        bench_scoring(results, repeat)
+    if "render" in groups:
+        bench_render(results, repeat)
+    if "plots" in groups:
+        bench_plots(results, repeat)
+    if "pipeline" in groups:
+        bench_end_to_end(results, repeat, args.vocoder_iters)
+
+    report = {"environment": environment(), "args": vars(args), "results": results}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    for name, res in results.items():
+        extra = f"  x{res['ratio']:.2f}" if "ratio" in res else ""
+        print(f"{name:<45} {res['median_s'] * 1e3:12.4f} ms{extra}")
+    for r in regressions:
+        print(f"[REGRESSION] {r['case']} : {r['old_s'] * 1e3:.4f} ms -> {r['new_s'] * 1e3:.4f} ms "
+              f"(x{r['ratio']:.2f}, seuil +{args.threshold:.0%})")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Lexique compact en tableaux, partagé entre processus
+Le lexique dict de dicts (str -> int) coûte des dizaines d'octets par entrée et
+chaque processus en garde sa copie. Ici, un seul fichier binaire :
+- table de chaînes triée (octets UTF-8 concaténés + décalages), avec les 8
+  premiers octets de chaque terme en uint64 pour la recherche dichotomique ;
+- ids d'émotion et poids en int8 (float64 si un poids n'est pas un petit entier) ;
+- index d'émotions fixe : d'abord les clés de EMO_TO_VA, puis les émotions
+  supplémentaires du lexique (l'ordre source est conservé à part).
+Le fichier est ouvert en mmap lecture seule : les processus d'un pool partagent
+les mêmes pages physiques (cache du noyau). CompactLexicon expose score_tokens /
+match_tokens comme CompiledLexicon : analyze_text_emotion donne les mêmes résultats.
+"""
+
+import json
+import mmap
+import os
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+import nlp_emo
+
+MAGIC = b"LEXCMP01"
+VERSION = 1
+_ALIGN = 8
+
+# =============================================================================
+# 1. ÉCRITURE
+# =============================================================================
+
+def _prefix_key(b: bytes) -> int:
+    """8 premiers octets en entier big-endian : même ordre que le tri des octets."""
+    return int.from_bytes(b[:8].ljust(8, b"\0"), "big")
+
+def string_table(terms: list[bytes]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(préfixes uint64, décalages uint32, octets concaténés) d'une liste de termes DÉJÀ triée."""
+    offsets = np.zeros(len(terms) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(t) for t in terms])
+    return (np.array([_prefix_key(t) for t in terms], dtype="<u8"), offsets,
+            np.frombuffer(b"".join(terms), dtype=np.uint8))
+
+def write_compact_lexicon(lexicon: dict, path: str | Path, extra: dict | None = None) -> Path:
+    """Écrit le lexique (tel que renvoyé par load_lexicon) au format compact, atomiquement."""
+    path = Path(path)
+    emotion_index = list(nlp_emo.EMO_TO_VA) + [e for e in lexicon if e not in nlp_emo.EMO_TO_VA]
+    if len(emotion_index) > 127:
+        raise ValueError(f"{len(emotion_index)} émotions : l'index int8 est limité à 127")
+    emo_id = {e: i for i, e in enumerate(emotion_index)}
+
+    # Entrées dans l'ordre (émotion, mot) du source : leur rang fixe l'ordre d'addition
+    rank_emotion, rank_weight = [], []
+    postings = {}   # terme (octets) -> [rang, ...]
+    heads = {}      # 1er mot d'une expression -> nb max de mots des expressions qui commencent par lui
+    for emo, words in lexicon.items():
+        for w, weight in words.items():
+            parts = w.split(" ")
+            if w != "" and "" in parts:
+                continue  # espaces en trop : ne peut jamais matcher (comme CompiledLexicon)
+            postings.setdefault(w.encode("utf-8"), []).append(len(rank_emotion))
+            rank_emotion.append(emo_id[emo])
+            rank_weight.append(weight)
+            if len(parts) > 1:
+                head = parts[0].encode("utf-8")
+                heads[head] = max(heads.get(head, 0), len(parts))
+                postings.setdefault(head, [])
+
+    terms = sorted(postings)
+    prefix, offsets, blob = string_table(terms)
+    post_ptr = np.zeros(len(terms) + 1, dtype="<u4")
+    post_ptr[1:] = np.cumsum([len(postings[t]) for t in terms])
+
+    small_int = all(isinstance(w, int) and -128 <= w <= 127 for w in rank_weight)
+    arrays = {
+        "term_prefix": prefix,
+        "term_offsets": offsets,
+        "term_blob": blob,
+        "term_head": np.array([min(heads.get(t, 0), 255) for t in terms], dtype=np.uint8),
+        "post_ptr": post_ptr,
+        "post_rank": np.array([r for t in terms for r in postings[t]], dtype="<u4"),
+        "rank_emotion": np.array(rank_emotion, dtype=np.int8),
+        "rank_weight": np.array(rank_weight, dtype=np.int8 if small_int else "<f8"),
+    }
+    if not small_int:
+        arrays["rank_is_int"] = np.array([isinstance(w, int) for w in rank_weight], dtype=np.uint8)
+
+    header = {
+        "version": VERSION,
+        "fingerprint": nlp_emo.lexicon_fingerprint(lexicon),
+        "emotion_index": emotion_index,
+        "source_order": [emo_id[e] for e in lexicon],
+        "max_phrase": max(heads.values(), default=1),
+        "arrays": {},
+        **(extra or {}),
+    }
+    # Décalages des tableaux (alignés) : l'en-tête en dépend et sa taille dépend d'eux,
+    # on agrandit la zone réservée jusqu'à ce qu'il y tienne
+    relative, offset = {}, 0
+    for name, a in arrays.items():
+        relative[name] = offset
+        offset += -(-a.nbytes // _ALIGN) * _ALIGN
+    base = 0
+    while True:
+        header["arrays"] = layout = {name: [base + relative[name], a.dtype.str, len(a)] for name, a in arrays.items()}
+        blob = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        need = -(-(len(MAGIC) + 4 + len(blob)) // _ALIGN) * _ALIGN
+        if need <= base:
+            break
+        base = need
+    blob = blob.ljust(base - len(MAGIC) - 4)
+
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + len(blob).to_bytes(4, "little") + blob)
+            for name, a in arrays.items():
+                f.seek(layout[name][0])
+                f.write(a.tobytes())
+            f.truncate(base + offset)
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
+
+def read_header(path: str | Path) -> dict | None:
+    """En-tête JSON d'un fichier compact (None si absent, illisible ou d'une autre version)."""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            size = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(size))
+    except (OSError, ValueError):
+        return None
+    return header if header.get("version") == VERSION else None
+
+# =============================================================================
+# 2. LECTURE (MMAP) & SCORING
+# =============================================================================
+
+class StringTable:
+    """
+    Table de chaînes triée (voir string_table) sur des tampons en lecture seule :
+    préfixes en NumPy pour la recherche vectorisée, puis bisect sur les octets.
+    """
+
+    def __init__(self, prefix: np.ndarray, offsets: np.ndarray, blob: np.ndarray):
+        self.prefix = prefix
+        # memoryview : entiers / octets Python sans copie, bisect y accède à chaque comparaison
+        self._offsets = memoryview(np.ascontiguousarray(offsets, dtype="<u4")).cast("B").cast("I")
+        self._blob = memoryview(np.ascontiguousarray(blob, dtype=np.uint8)).cast("B")
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def lookup(self, words) -> dict:
+        """mot -> position dans la table (-1 si absent)."""
+        words = list(words)
+        if not words:
+            return {}
+        encoded = [w.encode("utf-8") for w in words]
+        keys = np.array([_prefix_key(b) for b in encoded], dtype=np.uint64)
+        lo = np.searchsorted(self.prefix, keys, "left").tolist()
+        hi = np.searchsorted(self.prefix, keys, "right").tolist()
+        out = {}
+        for w, b, l, h in zip(words, encoded, lo, hi):
+            i = bisect_left(self, b, l, h) if h - l > 1 else l
+            out[w] = i if i < h and self[i] == b else -1
+        return out
+
+
+class CompactLexicon:
+    """Lexique compact en lecture seule (mmap), interchangeable avec CompiledLexicon."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        header = read_header(self.path)
+        if header is None:
+            raise ValueError(f"{self.path} n'est pas un lexique compact (version {VERSION})")
+        self.header = header
+        self.fingerprint = header["fingerprint"]
+        self.emotion_index = header["emotion_index"]
+        self.source_order = header["source_order"]
+        self.emotions = [self.emotion_index[i] for i in self.source_order]   # ordre du lexique source
+        self.max_phrase = header["max_phrase"]
+
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for name, (offset, dtype, count) in header["arrays"].items():
+            setattr(self, name, np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset))
+        if not hasattr(self, "rank_is_int"):
+            self.rank_is_int = None
+        self._terms = StringTable(self.term_prefix, self.term_offsets, self.term_blob)
+
+    def __len__(self) -> int:
+        return len(self.emotions)
+
+    def __reduce__(self):
+        # Un processus fils rouvre le fichier : mêmes pages physiques, aucune copie
+        return (CompactLexicon, (str(self.path),))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def _lookup(self, words) -> dict:
+        return self._terms.lookup(words)
+
+    def _postings(self, tid: int) -> list[int]:
+        return self.post_rank[self.post_ptr[tid]:self.post_ptr[tid + 1]].tolist()
+
+    def match_tokens(self, tokens: list[str]) -> set[int]:
+        """Rangs des entrées présentes dans la suite de tokens (mêmes règles que CompiledLexicon)."""
+        if not tokens:
+            tid = self._lookup([""]).get("", -1)
+            return set(self._postings(tid)) if tid >= 0 else set()
+        ids = self._lookup(dict.fromkeys(tokens))
+        matched = set()
+        for tid in ids.values():
+            if tid >= 0:
+                matched.update(self._postings(tid))
+        if self.max_phrase > 1:
+            phrases = {}
+            n = len(tokens)
+            for i, tok in enumerate(tokens):
+                tid = ids[tok]
+                if tid < 0 or self.term_head[tid] < 2:
+                    continue
+                for k in range(2, min(int(self.term_head[tid]), n - i) + 1):
+                    phrases.setdefault(" ".join(tokens[i:i + k]), None)
+            for tid in self._lookup(phrases).values():
+                if tid >= 0:
+                    matched.update(self._postings(tid))
+        return matched
+
+    def score_tokens(self, tokens: list[str]) -> dict:
+        """Scores bruts par émotion, dans l'ordre du lexique source (identiques à CompiledLexicon)."""
+        ranks = sorted(self.match_tokens(tokens))
+        if not ranks:
+            return {}
+        emos = self.rank_emotion[ranks].tolist()
+        weights = self.rank_weight[ranks].tolist()
+        if self.rank_is_int is not None:
+            weights = [int(w) if is_int else w for w, is_int in zip(weights, self.rank_is_int[ranks].tolist())]
+        scores = {}
+        names = self.emotion_index
+        for e, w in zip(emos, weights):
+            emo = names[e]
+            scores[emo] = scores.get(emo, 0) + w
+        return scores
+
+    def entry_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(colonne dans self.emotions, poids float64, poids entier ?) par rang, pour score_batch."""
+        position = np.full(len(self.emotion_index), -1, dtype=np.intp)
+        position[self.source_order] = np.arange(len(self.source_order))
+        cols = position[self.rank_emotion.astype(np.intp)]
+        is_int = (self.rank_is_int.astype(bool) if self.rank_is_int is not None
+                  else np.ones(len(cols), dtype=bool))
+        return cols, self.rank_weight.astype(np.float64), is_int
+
+def compact_lexicon(lexicon: dict, path: str | Path, extra: dict | None = None) -> CompactLexicon:
+    """Écrit puis ouvre le format compact d'un lexique (extra : champs ajoutés à l'en-tête)."""
+    return CompactLexicon(write_compact_lexicon(lexicon, path, extra))
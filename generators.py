@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Backends de génération de spectrogrammes
+- SpectrogramBackend : interface commune (chargement des poids + génération par lot).
+- Registre par nom : register_backend / get_backend_class.
+- ModelPool : pool de workers préchargés (threads ou processus), préchauffé
+  en arrière-plan ; les poids en lecture seule sont chargés une fois dans le
+  processus parent puis transmis aux workers à leur démarrage.
+- ProceduralBackend : spectrogramme procédural (spectro_render), backend CPU par défaut.
+Sortie commune : tableau float32 (N, hauteur, largeur) de magnitudes dans [0, 1].
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+import spectro_render
+
+@dataclass(frozen=True)
+class GenerationRequest:
+    prompt: str
+    valence: float = 0.5
+    arousal: float = 0.5
+    seed: int | None = None
+
+# =============================================================================
+# 1. INTERFACE & REGISTRE
+# =============================================================================
+
+_BACKENDS = {}
+
+def register_backend(cls):
+    """Décorateur : rend un backend disponible sous cls.name."""
+    _BACKENDS[cls.name] = cls
+    return cls
+
+def get_backend_class(name: str):
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend inconnu : {name} (disponibles : {', '.join(sorted(_BACKENDS))})")
+
+def available_backends() -> list[str]:
+    return sorted(_BACKENDS)
+
+
+class SpectrogramBackend:
+    """Interface d'un générateur texte -> spectrogramme."""
+    name = "base"
+
+    def __init__(self, **options):
+        self.options = options
+
+    @classmethod
+    def load_shared(cls, **options):
+        """
+        Poids en lecture seule, chargés une seule fois dans le processus parent
+        puis sérialisés vers chaque worker (doivent être picklables).
+        None si le backend n'en a pas.
+        """
+        return None
+
+    def load(self, shared=None):
+        """Préparation propre au worker (device, buffers...)."""
+
+    def generate_batch(self, requests: list[GenerationRequest]) -> np.ndarray:
+        """Une passe de génération pour tout le lot -> (N, H, W) float32."""
+        raise NotImplementedError
+
+
+@register_backend
+class ProceduralBackend(SpectrogramBackend):
+    """Spectrogramme procédural façonné par Valence/Arousal (CPU, sans modèle)."""
+    name = "procedural"
+
+    def generate_batch(self, requests):
+        # Latence simulée du modèle : payée une fois par lot (une "passe")
+        latency = self.options.get("latency", 0.0)
+        if latency:
+            time.sleep(latency)
+        return spectro_render.render_batch(
+            [(req.valence, req.arousal, req.seed) for req in requests],
+            height=self.options.get("height", spectro_render.DEFAULT_HEIGHT),
+            width=self.options.get("width", spectro_render.DEFAULT_WIDTH),
+        )
+
+# =============================================================================
+# 2. POOL DE WORKERS PRÉCHAUFFÉS
+# =============================================================================
+
+# Instance du backend propre à chaque processus worker
+_worker_backend = None
+
+def _worker_init(name: str, options: dict, shared):
+    global _worker_backend
+    _worker_backend = get_backend_class(name)(**options)
+    _worker_backend.load(shared)
+
+def _worker_ping() -> bool:
+    return _worker_backend is not None
+
+def _worker_generate(requests: list[GenerationRequest]):
+    return _worker_backend.generate_batch(requests)
+
+
+class ModelPool:
+    """
+    Pool de workers pour un backend.
+    workers=0 : exécution dans le processus courant (pas de sérialisation).
+    workers>0 : processus séparés, démarrés par "forkserver" (ou "spawn") :
+    le pool est créé depuis le thread de préchauffage, un fork d'un processus
+    multi-thread pourrait hériter d'un verrou tenu par un autre thread.
+    Les poids partagés (load_shared) sont transmis à chaque worker.
+    Le chargement se fait en arrière-plan (warm_up) ; generate_batch attend
+    que le pool soit prêt.
+    """
+
+    def __init__(self, backend: str = "procedural", workers: int = 0, **options):
+        self.backend_name = backend
+        self.backend_cls = get_backend_class(backend)
+        self.workers = workers
+        self.options = options
+        self.ready = threading.Event()
+        self.error = None
+        self._local = None
+        self._executor = None
+        self._warm_thread = None
+        self._lock = threading.Lock()
+
+    def warm_up(self, wait: bool = False):
+        """Lance le chargement du modèle sans bloquer (sauf wait=True)."""
+        with self._lock:
+            if self._warm_thread is None:
+                self._warm_thread = threading.Thread(target=self._load, name=f"warmup-{self.backend_name}", daemon=True)
+                self._warm_thread.start()
+        if wait:
+            self.wait_ready()
+        return self
+
+    def wait_ready(self, timeout: float | None = None):
+        self.warm_up()
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"Backend {self.backend_name} pas prêt après {timeout}s")
+        if self.error is not None:
+            raise RuntimeError(f"Echec du chargement du backend {self.backend_name}") from self.error
+
+    def _load(self):
+        try:
+            shared = self.backend_cls.load_shared(**self.options)
+            if self.workers <= 0:
+                self._local = self.backend_cls(**self.options)
+                self._local.load(shared)
+            else:
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=ctx,
+                    initializer=_worker_init, initargs=(self.backend_name, self.options, shared),
+                )
+                # Force le démarrage + chargement de chaque worker maintenant
+                for f in [self._executor.submit(_worker_ping) for _ in range(self.workers)]:
+                    f.result()
+        except Exception as e:
+            self.error = e
+            print(f"[WARN] Préchauffage du backend {self.backend_name} en échec : {e}")
+        finally:
+            self.ready.set()
+
+    def generate_batch(self, requests: list[GenerationRequest]) -> np.ndarray:
+        self.wait_ready()
+        if self._executor is None:
+            return self._local.generate_batch(requests)
+        if len(requests) <= 1:
+            return self._executor.submit(_worker_generate, requests).result()
+        # Un morceau du lot par worker, traités en parallèle puis recollés dans l'ordre
+        size = -(-len(requests) // self.workers)
+        futures = [self._executor.submit(_worker_generate, requests[i:i + size])
+                   for i in range(0, len(requests), size)]
+        return np.concatenate([f.result() for f in futures])
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+Service HTTP local (asyncio, sans dépendance) autour d'AIController
+    python http_service.py --port 8765
+Points d'entrée :
+- GET  /health                            état, profondeur des files
+- POST /analyze   {"text": ...} | {"texts": [...]}   analyse émotionnelle
+- POST /generate  {"text": ..., "format": "json"|"wav"|"npy"}   génération complète
+- GET  /results/<clé>/audio.wav | spectrogram.npy | preview.png
+Les requêtes arrivées dans une même fenêtre (--window) sont traitées par
+lot ; au-delà des limites de file / de générations en cours, réponse 503
+immédiate (Retry-After). Les octets WAV / .npy sont envoyés par morceaux
+(Transfer-Encoding: chunked), sans charger le fichier entier en mémoire.
+Écoute uniquement sur la boucle locale.
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import queue
+import sys
+from pathlib import Path
+
+import result_cache
+from backend_logic import AIController, nlp_emo
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+RESULT_FILES = {"audio.wav": (result_cache.AUDIO, "audio/wav"),
+                "spectrogram.npy": (result_cache.SPEC, "application/octet-stream"),
+                "preview.png": (result_cache.PREVIEW, "image/png")}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class Overloaded(HTTPError):
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(503, message, {"Retry-After": str(max(1, round(retry_after)))})
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# =============================================================================
+# 1. MICRO-BATCHING
+# =============================================================================
+
+class MicroBatcher:
+    """
+    Regroupe les éléments soumis pendant `window` secondes (au plus max_batch)
+    et appelle fn(liste) dans un thread ; chaque appelant reçoit son résultat.
+    fn renvoie une liste alignée sur l'entrée (un élément peut être une exception).
+    Au-delà de max_queue éléments en attente, submit lève Overloaded.
+    """
+
+    def __init__(self, fn, window: float = 0.01, max_batch: int = 32, max_queue: int = 256):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.batches = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, item):
+        if self._queue.qsize() >= self.max_queue:
+            raise Overloaded("file d'attente pleine", self.window * self._queue.qsize() / self.max_batch)
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Appelants partis entre-temps (connexion fermée) : inutile de calculer pour eux
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            try:
+                results = await loop.run_in_executor(None, self.fn, [item for item, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, fut), res in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(res, BaseException):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+# =============================================================================
+# 2. SERVICE
+# =============================================================================
+
+def emotion_to_json(emo) -> dict:
+    return {"labels": list(emo.labels), "probs": dict(emo.probs), "va": list(emo.va),
+            "raw_scores": dict(emo.raw_scores)}
+
+
+class AudioService:
+    """Serveur HTTP/1.1 minimal (keep-alive) : analyse et génération par micro-lots."""
+
+    def __init__(self, ai: AIController, host: str = "127.0.0.1", port: int = 8765,
+                 window: float = 0.01, max_batch: int = 32, max_queue: int = 256, max_inflight: int = 16):
+        if not is_loopback(host):
+            raise ValueError(f"Le service n'écoute que sur la boucle locale (reçu : {host})")
+        self.ai = ai
+        self.host = host
+        self.port = port
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.rejected = 0
+        self.analyzer = MicroBatcher(self._analyze_batch, window, max_batch, max_queue)
+        self.generator = MicroBatcher(self._submit_batch, window, max_batch, max_queue)
+        self._server = None
+
+    # ------------------------------------------------------------------ cycle de vie
+    async def start(self):
+        self.analyzer.start()
+        self.generator.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # port réel si 0
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.analyzer.stop()
+        await self.generator.stop()
+
+    # ------------------------------------------------------------------ lots (threads)
+    def _analyze_batch(self, texts: list[str]) -> list:
+        """Un passage vectorisé (nlp_emo.analyze_many, mêmes résultats que analyze_text_emotion)."""
+        return list(nlp_emo.analyze_many(texts, self.ai.lexicon, fallback=getattr(self.ai, "oov_fallback", None)))
+
+    def _submit_batch(self, texts: list[str]) -> list:
+        """
+        Soumet le lot d'un coup au pipeline (l'étage spectrogramme le traite en une
+        passe) ; renvoie une poignée par requête, ou Overloaded si la file est pleine.
+        """
+        out = []
+        for text in texts:
+            try:
+                out.append(self.ai.submit(text, block=False))
+            except queue.Full:
+                out.append(Overloaded("pipeline saturé", AIController.SIMULATED_LATENCY))
+        return out
+
+    # ------------------------------------------------------------------ points d'entrée
+    async def _route(self, method: str, path: str, body: bytes, writer):
+        if path == "/health":
+            return await self._send_json(writer, 200, {
+                "status": "ok", "ready": self.ai.generator.ready.is_set(),
+                "analyze_queue": self.analyzer.depth, "generate_queue": self.generator.depth,
+                "pipeline_queues": self.ai.pipeline.queue_depths(), "inflight": self.inflight,
+                "rejected": self.rejected, "batches": {"analyze": self.analyzer.batches,
+                                                       "generate": self.generator.batches},
+            })
+        if path == "/analyze":
+            if method != "POST":
+                raise HTTPError(405, "POST attendu")
+            if nlp_emo is None:
+                raise HTTPError(500, "module NLP indisponible")
+            req = self._parse_json(body)
+            if isinstance(req.get("texts"), list) and all(isinstance(t, str) for t in req["texts"]):
+                results = await asyncio.gather(*(self.analyzer.submit(t) for t in req["texts"]))
+                return await self._send_json(writer, 200, {"results": [emotion_to_json(r) for r in results]})
+            if isinstance(req.get("text"), str):
+                return await self._send_json(writer, 200, emotion_to_json(await self.analyzer.submit(req["text"])))
+            raise HTTPError(400, "champ \"text\" (ou \"texts\") attendu")
+        if path == "/generate":
+            if method != "POST":
+                raise HTTPError(405, "POST attendu")
+            return await self._generate(self._parse_json(body), writer)
+        if path.startswith("/results/"):
+            parts = path.split("/")
+            if len(parts) == 4 and parts[3] in RESULT_FILES and method == "GET":
+                name, ctype = RESULT_FILES[parts[3]]
+                return await self._send_file(writer, self._result_path(parts[2], name), ctype)
+        raise HTTPError(404, f"introuvable : {path}")
+
+    async def _generate(self, req: dict, writer):
+        text, fmt = req.get("text"), req.get("format", "json")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "champ \"text\" attendu")
+        if fmt not in ("json", "wav", "npy"):
+            raise HTTPError(400, "format : json, wav ou npy")
+        if self.inflight >= self.max_inflight:
+            raise Overloaded("trop de générations en cours", AIController.SIMULATED_LATENCY)
+        self.inflight += 1
+        try:
+            handle = await self.generator.submit(text)
+            try:
+                prompt, _img, audio_path = await asyncio.wrap_future(handle.future)
+            except asyncio.CancelledError:
+                handle.cancel()  # connexion fermée / arrêt : libère le calcul partagé
+                raise
+        finally:
+            self.inflight -= 1
+        key = handle.data["cache_key"]  # calculée par l'étage d'analyse du pipeline
+        if fmt == "wav":
+            return await self._send_file(writer, Path(audio_path), "audio/wav")
+        if fmt == "npy":
+            return await self._send_file(writer, self._result_path(key, result_cache.SPEC), "application/octet-stream")
+        base = f"/results/{key}"
+        return await self._send_json(writer, 200, {
+            "id": key, "prompt": prompt,
+            "audio": f"{base}/audio.wav", "spectrogram": f"{base}/spectrogram.npy", "preview": f"{base}/preview.png",
+        })
+
+    def _result_path(self, key: str, name: str) -> Path:
+        if len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+            raise HTTPError(404, "clé inconnue")
+        return self.ai.result_cache.root / key[:2] / key / name
+
+    @staticmethod
+    def _parse_json(body: bytes) -> dict:
+        try:
+            req = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "JSON invalide")
+        if not isinstance(req, dict):
+            raise HTTPError(400, "objet JSON attendu")
+        return req
+
+    # ------------------------------------------------------------------ HTTP
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_json(writer, 413, {"error": "en-têtes trop longs"}, close=True)
+                    break
+                if len(head) > MAX_HEADER_BYTES:
+                    await self._send_json(writer, 413, {"error": "en-têtes trop longs"}, close=True)
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._send_json(writer, 400, {"error": "ligne de requête invalide"}, close=True)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length", "0") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._send_json(writer, 413, {"error": "corps trop long"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1")
+                try:
+                    await self._route(method.upper(), path.split("?", 1)[0], body, writer)
+                except HTTPError as e:
+                    if isinstance(e, Overloaded):
+                        self.rejected += 1
+                    await self._send_json(writer, e.status, {"error": str(e)}, e.headers)
+                except Exception as e:
+                    print(f"[WARN] Erreur service HTTP ({path}) : {e}")
+                    await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send_head(self, writer, status: int, headers: dict):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status: int, payload, headers: dict | None = None, close: bool = False):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        h = {"Content-Type": "application/json; charset=utf-8", "Content-Length": len(data), **(headers or {})}
+        if close:
+            h["Connection"] = "close"
+        await self._send_head(writer, status, h)
+        writer.write(data)
+        await writer.drain()
+
+    async def _send_file(self, writer, path: Path, content_type: str):
+        """Envoi par morceaux (chunked) ; drain() à chaque morceau = contre-pression du client."""
+        try:
+            f = open(path, "rb")
+        except OSError:
+            raise HTTPError(404, "résultat absent (évincé du cache ?)")
+        with f:
+            await self._send_head(writer, 200, {"Content-Type": content_type, "Transfer-Encoding": "chunked"})
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+# =============================================================================
+# 3. LIGNE DE COMMANDE
+# =============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="http_service", description="Service HTTP local (analyse + génération).")
+    p.add_argument("--host", default="127.0.0.1", help="adresse locale d'écoute (boucle locale uniquement)")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--window", type=float, default=0.01, help="fenêtre de micro-batching (s)")
+    p.add_argument("--max-batch", type=int, default=32, help="requêtes max par lot")
+    p.add_argument("--max-queue", type=int, default=256, help="requêtes max en attente de lot (sinon 503)")
+    p.add_argument("--max-inflight", type=int, default=16, help="générations max en cours (sinon 503)")
+    p.add_argument("--latency", type=float, default=None, help="latence simulée du générateur (s)")
+    p.add_argument("--lexicon", default=None, help="lexique JSON (défaut : lexique intégré)")
+    p.add_argument("--compact-lexicon", action="store_true",
+                   help="lexique au format compact mmap (<lexique>.lexc), partagé entre instances")
+    p.add_argument("--oov-index", default=None, help="index de repli hors lexique (oov_fallback.py)")
+    return p
+
+async def _serve(args):
+    if args.latency is not None:
+        AIController.SIMULATED_LATENCY = args.latency
+    # File du pipeline >= générations admises : un lot complet ne finit jamais en 503
+    ai = AIController(lexicon_path=args.lexicon, queue_size=max(args.max_batch, args.max_inflight),
+                      max_batch=args.max_batch, compact_lexicon=args.compact_lexicon, oov_index=args.oov_index)
+    service = await AudioService(ai, args.host, args.port, args.window, args.max_batch,
+                                 args.max_queue, args.max_inflight).start()
+    print(f"Service HTTP sur http://{args.host}:{service.port}")
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not is_loopback(args.host):
+        print(f"[ERREUR] --host doit être une adresse locale (reçu : {args.host})", file=sys.stderr)
+        return 2
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
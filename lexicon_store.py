@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage compilé du lexique & rechargement à chaud
+- Le lexique JSON est compilé (index CompiledLexicon) puis sérialisé à côté
+  du fichier source : "<lexique>.json.compiled".
+- Au démarrage suivant, si la date de modification (ou à défaut le hash) du
+  source n'a pas changé, on recharge directement l'index sans parser le JSON.
+- Variante compact=True : format en tableaux "<lexique>.json.lexc" ouvert en mmap
+  (compact_lexicon), partagé entre processus au lieu d'un index par processus.
+- LexiconWatcher surveille le fichier et publie le nouvel index via un callback.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+import compact_lexicon
+import nlp_emo
+
+# A incrémenter si la structure de CompiledLexicon change
+FORMAT_VERSION = 1
+SUFFIX = ".compiled"
+COMPACT_SUFFIX = ".lexc"
+
+def compiled_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + SUFFIX)
+
+def compact_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + COMPACT_SUFFIX)
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _read_header(cache: Path) -> tuple[dict | None, object]:
+    """Lit uniquement l'en-tête (premier pickle) ; renvoie aussi le fichier ouvert."""
+    f = open(cache, "rb")
+    try:
+        header = pickle.load(f)
+        if not isinstance(header, dict) or header.get("version") != FORMAT_VERSION:
+            f.close()
+            return None, None
+        return header, f
+    except Exception:
+        f.close()
+        return None, None
+
+def _unpickle(f) -> nlp_emo.CompiledLexicon:
+    """pickle.load sans GC : des centaines de milliers de petits objets sinon scannés."""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.load(f)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def _write_cache(cache: Path, header: dict, index: nlp_emo.CompiledLexicon):
+    """Ecriture atomique : fichier temporaire puis os.replace."""
+    tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError as e:
+        print(f"[WARN] Impossible d'écrire le lexique compilé {cache}: {e}")
+        tmp.unlink(missing_ok=True)
+
+def _load_or_compile(path: Path) -> nlp_emo.CompiledLexicon:
+    """Cache valide -> unpickle ; sinon parse JSON + compilation + écriture du cache."""
+    st = path.stat()
+    cache = compiled_path(path)
+    digest = None
+
+    if cache.exists():
+        header, f = _read_header(cache)
+        if header is not None:
+            with f:
+                fresh = header["mtime_ns"] == st.st_mtime_ns and header["size"] == st.st_size
+                if not fresh:
+                    # mtime changée (copie, checkout...) : le contenu peut être identique
+                    digest = _file_sha256(path)
+                    fresh = header["sha256"] == digest
+                if fresh:
+                    index = _unpickle(f)
+                    if digest is not None:
+                        header.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+                        _write_cache(cache, header, index)
+                    return index
+
+    with open(path, "r", encoding="utf-8") as f:
+        lexicon = json.load(f)
+    index = nlp_emo.compile_lexicon(lexicon)
+    header = {
+        "version": FORMAT_VERSION,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": digest or _file_sha256(path),
+    }
+    _write_cache(cache, header, index)
+    return index
+
+def _load_or_build_compact(path: Path):
+    """Fichier compact valide -> mmap ; sinon parse JSON + écriture du format compact."""
+    st = path.stat()
+    target = compact_path(path)
+    digest = None
+
+    header = compact_lexicon.read_header(target)
+    if header is not None:
+        fresh = header.get("source_mtime_ns") == st.st_mtime_ns and header.get("source_size") == st.st_size
+        if not fresh:
+            digest = _file_sha256(path)
+            fresh = header.get("source_sha256") == digest
+        if fresh:
+            return compact_lexicon.CompactLexicon(target)
+
+    with open(path, "r", encoding="utf-8") as f:
+        lexicon = json.load(f)
+    source = {"source_mtime_ns": st.st_mtime_ns, "source_size": st.st_size,
+              "source_sha256": digest or _file_sha256(path)}
+    try:
+        return compact_lexicon.compact_lexicon(lexicon, target, extra=source)
+    except OSError as e:
+        print(f"[WARN] Impossible d'écrire le lexique compact {target}: {e}")
+        return nlp_emo.compile_lexicon(lexicon)
+
+def load_compiled_lexicon(path: str | Path | None = None, strict: bool = False,
+                          compact: bool = False) -> nlp_emo.CompiledLexicon:
+    """
+    Equivalent compilé de nlp_emo.load_lexicon.
+    strict=False : en cas d'erreur, avertissement + lexique par défaut (comme avant).
+    strict=True  : l'erreur est propagée (utilisé par le rechargement à chaud).
+    compact=True : CompactLexicon en mmap (mêmes scores, mémoire partagée entre processus).
+    """
+    if path and Path(path).exists():
+        try:
+            index = _load_or_build_compact(Path(path)) if compact else _load_or_compile(Path(path))
+            nlp_emo._register_loaded(getattr(index, "source", None), index.fingerprint)
+            return index
+        except Exception as e:
+            if strict:
+                raise
+            print(f"[WARN] Echec chargement lexique {path}: {e}")
+    elif strict:
+        raise FileNotFoundError(path)
+    return nlp_emo.compile_lexicon(nlp_emo.load_lexicon())
+
+
+class LexiconWatcher:
+    """
+    Surveille un fichier lexique (polling de mtime/taille, sans dépendance)
+    et appelle on_reload(index) avec le nouvel index compilé.
+    Un fichier en cours d'édition / invalide est ignoré : l'ancien index reste actif.
+    """
+
+    def __init__(self, path: str | Path, on_reload, interval: float = 1.0, compact: bool = False):
+        self.path = Path(path)
+        self.on_reload = on_reload
+        self.interval = interval
+        self.compact = compact
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = self._signature()
+
+    def _signature(self):
+        try:
+            st = self.path.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lexicon-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    def check(self) -> bool:
+        """Recharge si le fichier a changé. Renvoie True si un nouvel index a été publié."""
+        sig = self._signature()
+        if sig is None or sig == self._last:
+            return False
+        try:
+            index = load_compiled_lexicon(self.path, strict=True, compact=self.compact)
+        except Exception as e:
+            print(f"[WARN] Rechargement lexique ignoré ({self.path}): {e}")
+            return False
+        self._last = sig
+        self.on_reload(index)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
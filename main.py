@@ -1,7 +1,56 @@
-import customtkinter as ctk
-from ui_interface import AppInterface
+import sys
+import time
+
+_T0 = time.perf_counter()
+
+
+class StartupProfile:
+    """Mode --profile-startup : durée de chaque phase du démarrage, puis sortie dès que GÉNÉRER est actif."""
+
+    def __init__(self):
+        self.phases = []
+        self.app = None
+
+    def phase(self, name, seconds):
+        # Appelé depuis le thread Tk ou le thread de démarrage du backend
+        self.phases.append((name, seconds, time.perf_counter() - _T0))
+        if name == "ready" and self.app is not None:
+            self.app.after(0, self.finish)
+
+    def first_paint(self, event=None):
+        if not any(name == "first paint" for name, _, _ in self.phases):
+            self.phase("first paint", None)
+
+    def finish(self):
+        # Laisse au préchargement de matplotlib le temps de se terminer
+        self.app.executor.shutdown(wait=True)
+        print("[STARTUP] phase                      durée    depuis le lancement", file=sys.stderr)
+        for name, seconds, since in self.phases:
+            dur = f"{seconds * 1000:8.1f}ms" if seconds is not None else " " * 10
+            print(f"[STARTUP] {name:<24} {dur}  {since * 1000:8.1f}ms", file=sys.stderr)
+        self.app.destroy()
+
 
 if __name__ == "__main__":
+    # Mode sans interface : python main.py --batch [options de batch_cli]
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        import batch_cli
+        sys.exit(batch_cli.main(sys.argv[2:]))
+
+    profile = StartupProfile() if "--profile-startup" in sys.argv[1:] else None
+    on_phase = profile.phase if profile else None
+
+    # customtkinter n'est importé que pour l'interface graphique
+    t = time.perf_counter()
+    import customtkinter as ctk
+    if profile: profile.phase("import customtkinter", time.perf_counter() - t)
+    t = time.perf_counter()
+    from ui_interface import AppInterface
+    if profile: profile.phase("import ui_interface", time.perf_counter() - t)
+
     ctk.set_appearance_mode("Dark")
-    app = AppInterface()
-    app.mainloop()
\ No newline at end of file
+    app = AppInterface(on_phase=on_phase)
+    if profile:
+        profile.app = app
+        app.bind("<Map>", profile.first_paint, add="+")
+    app.mainloop()
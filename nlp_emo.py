@@ -7,12 +7,20 @@ Ce module transforme une phrase utilisateur en :
 3. Un prompt technique pour Stable Diffusion Audio.
 """
 
-from collections import defaultdict
+import hashlib
 import json
+import math
 import re
+import threading
+import time
 import unicodedata
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
+from typing import Iterable, Iterator
+
+import tracing
 
 # =============================================================================
 # 1. CONFIGURATION & LEXIQUE ÉTENDU
@@ -92,15 +100,15 @@ DEFAULT_LEXICON = {
 # 2. FONCTIONS UTILITAIRES
 # =============================================================================
 
-@dataclass
+@dataclass(frozen=True)
 class EmotionOutput:
     labels: list[str]          
     probs: dict[str, float]    # scores normalisés (somme=1)
     va: tuple[float, float]    # (valence, arousal) calculé
     raw_scores: dict[str, int] # scores bruts pour debug
 
-def normalize(text: str) -> str:
-    """Nettoyage strict du texte pour maximiser le matching."""
+def _normalize_reference(text: str) -> str:
+    """Implémentation historique (lente), gardée comme référence de normalize()."""
     text = text.lower()
     # Suppression accents
     text = "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
@@ -110,15 +118,73 @@ def normalize(text: str) -> str:
     text = re.sub(r"\s+", " ", text).strip()
     return text
 
+def _fold_char(c: str) -> str:
+    """Minuscule + suppression d'accents + ponctuation -> espace, pour un caractère."""
+    out = []
+    for d in unicodedata.normalize("NFD", c.lower()):
+        if unicodedata.category(d) == "Mn":
+            continue
+        out.append(d if ("a" <= d <= "z" or "0" <= d <= "9") else " ")
+    return "".join(out)
+
+class _FoldTable(dict):
+    """
+    Table de str.translate : précalculée pour l'ASCII, le latin étendu et la
+    ponctuation générale (guillemets, tirets...). Les autres caractères sont
+    repliés à la demande sans être mémorisés : le texte reçu par /analyze ne
+    doit pas pouvoir faire grossir la table jusqu'à couvrir tout Unicode.
+    """
+    def __missing__(self, codepoint: int) -> str:
+        return _fold_char(chr(codepoint))
+
+_FOLD_RANGES = (range(0x250), range(0x2000, 0x2070))
+_FOLD_TABLE = _FoldTable((cp, _fold_char(chr(cp))) for r in _FOLD_RANGES for cp in r)
+
+def tokenize(text: str) -> list[str]:
+    """Tokens normalisés : une passe str.translate puis un split."""
+    return text.translate(_FOLD_TABLE).split()
+
+def normalize(text: str) -> str:
+    """Nettoyage strict du texte pour maximiser le matching."""
+    # Minuscules, accents, ponctuation : une seule passe de traduction, puis compactage
+    return " ".join(text.translate(_FOLD_TABLE).split())
+
+def normalize_many(texts: Iterable[str]) -> list[str]:
+    """Version en masse de normalize()."""
+    table = _FOLD_TABLE
+    return [" ".join(t.translate(table).split()) for t in texts]
+
+# Génération du dernier lexique chargé : les caches l'observent pour s'invalider
+_lexicon_generation = 0
+_last_loaded_fingerprint = None
+
+def lexicon_fingerprint(lexicon: dict) -> str:
+    """Empreinte stable du contenu d'un lexique (ordre compris)."""
+    payload = json.dumps(lexicon, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def lexicon_generation() -> int:
+    """Incrémentée à chaque fois que load_lexicon charge un lexique différent."""
+    return _lexicon_generation
+
 def load_lexicon(path: str | Path | None = None) -> dict:
     """Charge un lexique externe JSON si fourni, sinon utilise celui par défaut."""
+    lexicon = DEFAULT_LEXICON
     if path and Path(path).exists():
         try:
             with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+                lexicon = json.load(f)
         except Exception as e:
             print(f"[WARN] Echec chargement lexique {path}: {e}")
-    return DEFAULT_LEXICON
+    _register_loaded(lexicon)
+    return lexicon
+
+def _register_loaded(lexicon: dict, fingerprint: str | None = None):
+    global _lexicon_generation, _last_loaded_fingerprint
+    fp = fingerprint or lexicon_fingerprint(lexicon)
+    if fp != _last_loaded_fingerprint:
+        _last_loaded_fingerprint = fp
+        _lexicon_generation += 1
 
 def softmax_dict(d: dict[str, float]) -> dict[str, float]:
     """Transformation Softmax pour obtenir des probabilités."""
@@ -147,29 +213,159 @@ def aggregate_va(probs: dict[str, float]) -> tuple[float,float]:
         
     return (val_sum, aro_sum)
 
+# =============================================================================
+# 2b. INDEX COMPILÉ DU LEXIQUE
+# =============================================================================
+
+class CompiledLexicon:
+    """
+    Index du lexique construit une seule fois :
+    - table de hachage token -> entrées pour les mots simples,
+    - automate d'Aho-Corasick (sur les tokens) pour les expressions ("coeur brise").
+    Une passe sur les tokens donne les mêmes scores que le matching " {w} " in " {t} ".
+    """
+
+    def __init__(self, lexicon: dict):
+        self.source = lexicon
+        self.fingerprint = lexicon_fingerprint(lexicon)
+        self.emotions = list(lexicon.keys())
+        self.entries = []   # entry_id -> (index émotion, poids)
+        self.single = {}    # token -> [entry_id, ...]
+        self.empty = []     # entrées vides : "  " n'est dans " {t} " que si t est vide
+        # Automate multi-mots : transitions, liens d'échec, sorties par noeud
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for e_idx, words in enumerate(lexicon.values()):
+            for w, weight in words.items():
+                if w == "":
+                    self.empty.append(self._add_entry(e_idx, weight))
+                    continue
+                parts = w.split(" ")
+                if "" in parts:
+                    # Espaces en trop : ne peut jamais matcher un texte normalisé
+                    continue
+                eid = self._add_entry(e_idx, weight)
+                if len(parts) == 1:
+                    self.single.setdefault(w, []).append(eid)
+                else:
+                    self._add_phrase(parts, eid)
+
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return len(self.emotions)
+
+    def __getstate__(self):
+        # Les matrices NumPy dérivées (analyse par lots) se recalculent à la demande
+        state = dict(self.__dict__)
+        state.pop("_term_emotion", None)
+        return state
+
+    def _add_entry(self, e_idx: int, weight) -> int:
+        self.entries.append((e_idx, weight))
+        return len(self.entries) - 1
+
+    def _add_phrase(self, parts: list[str], eid: int):
+        node = 0
+        for tok in parts:
+            nxt = self._goto[node].get(tok)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][tok] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] += (eid,)
+
+    def _build_failure_links(self):
+        """Parcours en largeur classique d'Aho-Corasick."""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for tok, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and tok not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(tok, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+                queue.append(child)
+
+    def match_tokens(self, tokens: list[str]) -> set[int]:
+        """Ensemble des entry_id présents dans la suite de tokens (temps linéaire)."""
+        matched = set() if tokens else set(self.empty)
+        single = self.single
+        goto, fail, out = self._goto, self._fail, self._out
+        use_automaton = len(goto) > 1
+        node = 0
+        for tok in tokens:
+            ids = single.get(tok)
+            if ids:
+                matched.update(ids)
+            if use_automaton:
+                while node and tok not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(tok, 0)
+                if out[node]:
+                    matched.update(out[node])
+        return matched
+
+    def score_tokens(self, tokens: list[str]) -> dict:
+        """Scores bruts par émotion, dans l'ordre du lexique source."""
+        scores = {}
+        emotions, entries = self.emotions, self.entries
+        # entry_id croissant = ordre (émotion, mot) du lexique -> même ordre d'addition
+        for eid in sorted(self.match_tokens(tokens)):
+            e_idx, weight = entries[eid]
+            emo = emotions[e_idx]
+            scores[emo] = scores.get(emo, 0) + weight
+        return scores
+
+_DEFAULT_COMPILED = None
+
+def compile_lexicon(lexicon: "dict | CompiledLexicon | None" = None) -> CompiledLexicon:
+    """Compile un lexique brut (ou renvoie l'index tel quel s'il l'est déjà)."""
+    global _DEFAULT_COMPILED
+    # Tout index exposant score_tokens (ex : compact_lexicon.CompactLexicon) est utilisé tel quel
+    if isinstance(lexicon, CompiledLexicon) or hasattr(lexicon, "score_tokens"):
+        return lexicon
+    if lexicon is None or lexicon is DEFAULT_LEXICON:
+        if _DEFAULT_COMPILED is None:
+            _DEFAULT_COMPILED = CompiledLexicon(DEFAULT_LEXICON)
+        return _DEFAULT_COMPILED
+    return CompiledLexicon(lexicon)
+
 # =============================================================================
 # 3. FONCTIONS PRINCIPALES (API)
 # =============================================================================
 
-def analyze_text_emotion(text: str, lexicon: dict = None) -> EmotionOutput:
+def analyze_text_emotion(text: str, lexicon: "dict | CompiledLexicon" = None,
+                         fallback=None) -> EmotionOutput:
     """
     Analyse le texte et retourne l'objet EmotionOutput complet.
     C'est la fonction principale appelée par le contrôleur.
+    Passer un CompiledLexicon évite de recompiler l'index à chaque appel.
+    fallback (oov_fallback.OOVFallback) : consulté seulement si aucun mot du lexique n'est trouvé.
     """
-    if lexicon is None: lexicon = DEFAULT_LEXICON
-        
-    t = normalize(text)
-    scores = defaultdict(int)
-    
-    # Matching par mots entiers
-    for emo, words in lexicon.items():
-        for w, weight in words.items():
-            if f" {w} " in f" {t} ": 
-                scores[emo] += weight
+    index = compile_lexicon(lexicon)
+
+    # Matching par mots entiers (une seule passe sur les tokens)
+    tokens = tokenize(text)
+    scores = index.score_tokens(tokens)
+
+    # Aucun mot du lexique : émotions des mots voisins (table de vecteurs), si disponible
+    if not scores and fallback is not None:
+        scores = fallback.score_tokens(tokens)
 
     if not scores:
         scores = {"calme": 1}
 
+    return build_emotion_output(scores)
+
+def build_emotion_output(scores: dict[str, float]) -> EmotionOutput:
+    """Softmax + Valence/Arousal + top-2 à partir des scores bruts."""
     probs = softmax_dict(scores)
     va = aggregate_va(probs)
     labels = [k for k,_ in sorted(probs.items(), key=lambda kv: -kv[1])[:2]]
@@ -191,4 +387,282 @@ def emotion_to_prompt(user_text: str, emo: EmotionOutput) -> str:
         f"{safe_text}. "
         f"spectrogram of {mood_str} ambient sound, sustained tones, minimal rhythm. "
         f"valence:{v:.2f}, arousal:{a:.2f}, 24kHz, 10s, clean texture"
-    )
\ No newline at end of file
+    )
+
+# =============================================================================
+# 4. ANALYSE PAR LOTS (NUMPY)
+# =============================================================================
+
+@dataclass
+class BatchScores:
+    """Résultats d'un lot sous forme de tableaux (une ligne par texte)."""
+    emotions: list[str]   # axe des colonnes
+    raw: "np.ndarray"     # (n, E) scores bruts
+    present: "np.ndarray" # (n, E) bool : émotion présente dans raw_scores
+    is_int: "np.ndarray"  # (n, E) bool : score issu uniquement de poids entiers
+    probs: "np.ndarray"   # (n, E) probabilités (0 hors émotions présentes)
+    va: "np.ndarray"      # (n, 2) valence / arousal
+    top2: "np.ndarray"    # (n, 2) indices des 2 meilleures émotions (-1 si absente)
+
+    def to_outputs(self) -> list[EmotionOutput]:
+        """Reconstruit les EmotionOutput identiques à analyze_text_emotion."""
+        outputs = []
+        emotions = self.emotions
+        # Conversion en listes Python une fois pour toutes (évite les scalaires NumPy)
+        rows = zip(self.raw.tolist(), self.present.tolist(), self.is_int.tolist(),
+                   self.probs.tolist(), self.va.tolist(), self.top2.tolist())
+        for raw, present, is_int, probs, va, top2 in rows:
+            cols = [j for j, p in enumerate(present) if p]
+            raw_scores = {emotions[j]: int(raw[j]) if is_int[j] else raw[j] for j in cols}
+            outputs.append(EmotionOutput(
+                labels=[emotions[j] for j in top2 if j >= 0],
+                probs={emotions[j]: probs[j] for j in cols},
+                va=(va[0], va[1]),
+                raw_scores=raw_scores,
+            ))
+        return outputs
+
+def _term_emotion_matrix(index: CompiledLexicon):
+    """
+    Matrice creuse terme x émotion au format CSR : chaque entrée du lexique
+    n'a qu'une émotion, donc indptr = arange et on ne garde que (colonne, poids).
+    """
+    import numpy as np
+    cached = getattr(index, "_term_emotion", None)
+    if cached is None:
+        emotions = list(index.emotions)
+        if "calme" not in emotions:
+            emotions.append("calme")  # colonne du fallback {"calme": 1}
+        if hasattr(index, "entry_arrays"):
+            cols, weights, is_int = index.entry_arrays()  # index compact : déjà en tableaux
+        else:
+            cols = np.array([e for e, _ in index.entries], dtype=np.intp)
+            weights = np.array([float(w) for _, w in index.entries], dtype=np.float64)
+            is_int = np.array([isinstance(w, int) for _, w in index.entries], dtype=bool)
+        cached = (emotions, cols, weights, is_int)
+        index._term_emotion = cached
+    return cached
+
+def score_batch(texts: list[str], lexicon: "dict | CompiledLexicon" = None, fallback=None) -> BatchScores:
+    """
+    Score un lot de textes DÉJÀ normalisés.
+    Le matching construit la matrice creuse document x terme (COO) ; le reste
+    (produit avec la matrice terme x émotion, softmax, V/A, top-2) est en NumPy.
+    fallback : repli hors lexique pour les textes sans aucun match (une recherche pour tout le lot).
+    """
+    import numpy as np
+    index = compile_lexicon(lexicon)
+    emotions, term_col, term_w, term_int = _term_emotion_matrix(index)
+    if fallback is not None:
+        emotions = emotions + [e for e in fallback.emotions if e not in emotions]
+    n, n_emo = len(texts), len(emotions)
+
+    # Matrice document x terme (présence), termes triés pour garder l'ordre d'addition
+    doc_rows, doc_terms = [], []
+    for i, t in enumerate(texts):
+        matched = sorted(index.match_tokens(t.split(" ") if t else []))
+        doc_rows.extend([i] * len(matched))
+        doc_terms.extend(matched)
+    rows = np.array(doc_rows, dtype=np.intp)
+    terms = np.array(doc_terms, dtype=np.intp)
+    cols = term_col[terms]
+
+    # Produit creux doc x terme . terme x émotion (np.add.at : addition dans l'ordre)
+    raw = np.zeros((n, n_emo), dtype=np.float64)
+    np.add.at(raw, (rows, cols), term_w[terms])
+    present = np.zeros((n, n_emo), dtype=bool)
+    present[rows, cols] = True
+    n_float = np.zeros((n, n_emo), dtype=np.intp)
+    np.add.at(n_float, (rows, cols), ~term_int[terms])
+    is_int = n_float == 0
+
+    if fallback is not None:
+        unmatched = np.flatnonzero(~present.any(axis=1)).tolist()
+        col = {e: j for j, e in enumerate(emotions)}
+        found = fallback.score_many([texts[i].split(" ") if texts[i] else [] for i in unmatched])
+        for i, fb_scores in zip(unmatched, found):
+            for e, v in fb_scores.items():
+                raw[i, col[e]] = v
+                present[i, col[e]] = True
+                is_int[i, col[e]] = False
+
+    # Fallback {"calme": 1} pour les textes sans aucun match
+    empty = ~present.any(axis=1)
+    calme = emotions.index("calme")
+    raw[empty, calme] = 1
+    present[empty, calme] = True
+
+    # Softmax restreinte aux émotions présentes (même ordre de sommation que softmax_dict)
+    # exp via math.exp sur les écarts distincts : np.exp peut différer d'1 ULP de la libm
+    m = np.where(present, raw, -np.inf).max(axis=1, keepdims=True)
+    diffs, inverse = np.unique(np.where(present, raw - m, 0.0), return_inverse=True)
+    table = np.array([math.exp(d) for d in diffs.tolist()], dtype=np.float64)
+    exps = np.where(present, table[inverse.reshape(n, n_emo)], 0.0)
+    s = np.zeros(n, dtype=np.float64)
+    for j in range(n_emo):
+        s += exps[:, j]
+    probs = np.where(present, exps / s[:, None], 0.0)
+
+    # Valence / Arousal (accumulation colonne par colonne comme aggregate_va)
+    va_table = np.array([EMO_TO_VA.get(e, (0.5, 0.5)) for e in emotions], dtype=np.float64)
+    va = np.zeros((n, 2), dtype=np.float64)
+    for j in range(n_emo):
+        va += np.where(present[:, j, None], va_table[j] * probs[:, j, None], 0.0)
+
+    # Top-2 : tri stable par probabilité décroissante (égalités -> ordre du lexique)
+    order = np.argsort(np.where(present, -probs, np.inf), axis=1, kind="stable")[:, :2]
+    k = np.minimum(present.sum(axis=1), 2)
+    top2 = np.where(np.arange(order.shape[1]) < k[:, None], order, -1)
+
+    return BatchScores(emotions=emotions, raw=raw, present=present, is_int=is_int,
+                       probs=probs, va=va, top2=top2)
+
+def analyze_many(texts: Iterable[str], lexicon: "dict | CompiledLexicon" = None,
+                 chunk_size: int = 1024, fallback=None) -> Iterator[EmotionOutput]:
+    """
+    Version par lots de analyze_text_emotion.
+    Accepte n'importe quel itérable (fichier, générateur...) et le consomme
+    par paquets de chunk_size : la mémoire reste bornée quelle que soit la taille.
+    """
+    index = compile_lexicon(lexicon)
+    batch = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= chunk_size:
+            yield from score_batch(normalize_many(batch), index, fallback).to_outputs()
+            batch = []
+    if batch:
+        yield from score_batch(normalize_many(batch), index, fallback).to_outputs()
+
+
+# =============================================================================
+# 5. CACHE LRU (ANALYSE + PROMPT)
+# =============================================================================
+
+def freeze_output(emo: EmotionOutput) -> EmotionOutput:
+    """Copie immuable d'un EmotionOutput (tuple + dicts en lecture seule)."""
+    return EmotionOutput(
+        labels=tuple(emo.labels),
+        probs=MappingProxyType(dict(emo.probs)),
+        va=tuple(emo.va),
+        raw_scores=MappingProxyType(dict(emo.raw_scores)),
+    )
+
+class EmotionCache:
+    """
+    Cache LRU borné (taille + TTL) devant analyze_text_emotion et emotion_to_prompt.
+    Clé = texte normalisé (ou texte nettoyé pour le prompt) + empreinte du lexique
+    (et du repli hors lexique s'il y en a un).
+    Se vide tout seul si load_lexicon charge un autre lexique.
+    """
+
+    def __init__(self, lexicon: "dict | CompiledLexicon" = None,
+                 maxsize: int = 4096, ttl: float | None = 3600.0, fallback=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data = OrderedDict()  # clé -> (expiration, valeur)
+        self._lock = threading.Lock()
+        self._generation = lexicon_generation()
+        self.index = compile_lexicon(lexicon)
+        self.fallback = fallback
+
+    def _version(self, index) -> str:
+        if self.fallback is None:
+            return index.fingerprint
+        return f"{index.fingerprint}+{self.fallback.fingerprint}"
+
+    def set_lexicon(self, lexicon: "dict | CompiledLexicon"):
+        """Change de lexique ; le cache est vidé si le contenu diffère."""
+        index = compile_lexicon(lexicon)
+        with self._lock:
+            if index.fingerprint != self.index.fingerprint:
+                self._invalidate()
+            self.index = index
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
+
+    def _invalidate(self):
+        self._data.clear()
+        self.invalidations += 1
+
+    def _get(self, key, count: bool = True):
+        """Valeur en cache ou None ; count=False : consultation interne, hors statistiques."""
+        with self._lock:
+            if self._generation != lexicon_generation():
+                self._generation = lexicon_generation()
+                self._invalidate()
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += count
+                    return value
+                del self._data[key]
+                self.evictions += 1
+            self.misses += count
+            return None
+
+    def _put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def analyze(self, text: str) -> EmotionOutput:
+        """Equivalent mémoïsé de analyze_text_emotion (résultat immuable)."""
+        return self._analyze(text, self.index, count=True)
+
+    def _analyze(self, text: str, index, count: bool) -> EmotionOutput:
+        with tracing.span("normalize"):
+            norm = normalize(text)
+        key = ("emo", norm, self._version(index))
+        emo = self._get(key, count)
+        if emo is None:
+            if count: tracing.count("emo_cache.miss")
+            # Même calcul que analyze_text_emotion, sur les tokens du texte déjà normalisé
+            with tracing.span("lexicon_match"):
+                tokens = norm.split()
+                scores = index.score_tokens(tokens)
+            if not scores and self.fallback is not None:
+                with tracing.span("oov_fallback"):
+                    scores = self.fallback.score_tokens(tokens)
+            emo = freeze_output(build_emotion_output(scores or {"calme": 1}))
+            self._put(key, emo)
+        elif count:
+            tracing.count("emo_cache.hit")
+        return emo
+
+    def analyze_with_prompt(self, user_text: str, index=None) -> tuple[EmotionOutput, str]:
+        """
+        Analyse + prompt Stable Diffusion, mémoïsés ensemble (une consultation comptée une fois).
+        index : lexique à utiliser (instantané pris par l'appelant, cohérent avec sa clé de cache
+        disque malgré un rechargement concurrent) ; par défaut le lexique courant.
+        """
+        index = index if index is not None else self.index
+        # Le prompt ne dépend que du texte nettoyé (la normalisation en découle)
+        key = ("prompt", user_text.replace("\n", " ").strip(), self._version(index))
+        cached = self._get(key)
+        if cached is None:
+            tracing.count("emo_cache.miss")
+            emo = self._analyze(user_text, index, count=False)
+            with tracing.span("prompt_build"):
+                cached = (emo, emotion_to_prompt(user_text, emo))
+            self._put(key, cached)
+        else:
+            tracing.count("emo_cache.hit")
+        return cached
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Module Trajectoire Emotionnelle (textes longs)
+Au lieu d'une distribution unique pour tout le texte, on lit le texte par
+morceaux et on produit une courbe d'émotion : une analyse par fenêtre
+glissante de tokens, avec Valence/Arousal éventuellement lissés.
+Sert à piloter une suite de segments de spectrogramme (histoires, scripts...).
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import nlp_emo
+
+# Dernier blanc du buffer : tout ce qui suit peut être un mot coupé par le découpage
+_LAST_SPACE = re.compile(r"\s\S*\Z")
+
+@dataclass(frozen=True)
+class TrajectoryPoint:
+    index: int                       # numéro de la fenêtre
+    start: int                       # premier token (inclus)
+    end: int                         # dernier token (exclu)
+    emotion: nlp_emo.EmotionOutput   # analyse de la fenêtre
+    va: tuple[float, float]          # (valence, arousal) brut de la fenêtre
+    va_smoothed: tuple[float, float] # lissage exponentiel (= va si désactivé)
+
+def iter_chunks(source, chunk_size: int = 1 << 16) -> Iterator[str]:
+    """
+    Source de texte -> morceaux.
+    Accepte un chemin (Path), un fichier ouvert (méthode read) ou un itérable de str.
+    """
+    if isinstance(source, Path):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from iter_chunks(f, chunk_size)
+    elif hasattr(source, "read"):
+        for chunk in iter(lambda: source.read(chunk_size), ""):
+            yield chunk
+    elif isinstance(source, str):
+        yield source
+    else:
+        yield from source
+
+def iter_tokens(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Tokens normalisés d'un flux de morceaux.
+    On ne coupe que sur un blanc : un mot (ou un accent combinant) à cheval
+    sur deux morceaux est gardé en réserve jusqu'au morceau suivant.
+    """
+    carry = ""
+    for chunk in chunks:
+        buf = carry + chunk
+        m = _LAST_SPACE.search(buf)
+        if m is None:
+            carry = buf
+            continue
+        carry = buf[m.start() + 1:]
+        t = nlp_emo.normalize(buf[:m.start()])
+        if t:
+            yield from t.split(" ")
+    t = nlp_emo.normalize(carry)
+    if t:
+        yield from t.split(" ")
+
+def analyze_stream(source, lexicon: "dict | nlp_emo.CompiledLexicon" = None,
+                   window: int = 64, hop: int = 32,
+                   smoothing: float | None = None) -> Iterator[TrajectoryPoint]:
+    """
+    Analyse émotionnelle par fenêtre glissante (window tokens, pas de hop tokens).
+    Mémoire en O(window) : seuls les tokens de la fenêtre courante sont gardés,
+    donc les expressions multi-mots sont reconnues même à cheval sur deux morceaux.
+    smoothing : coefficient alpha du lissage exponentiel de V/A (None = pas de lissage).
+    """
+    if not 0 < hop <= window:
+        raise ValueError("Il faut 0 < hop <= window")
+    if smoothing is not None and not 0.0 < smoothing <= 1.0:
+        raise ValueError("smoothing doit être dans ]0, 1]")
+
+    index = nlp_emo.compile_lexicon(lexicon)
+    buf = deque()
+    start = 0           # position absolue de buf[0]
+    emitted_end = 0     # fin de la dernière fenêtre émise
+    n = 0
+    prev = None
+
+    def emit():
+        nonlocal n, prev, emitted_end
+        scores = index.score_tokens(list(buf))
+        if not scores:
+            scores = {"calme": 1}
+        emo = nlp_emo.build_emotion_output(scores)
+        va = emo.va
+        if smoothing is None or prev is None:
+            smoothed = va
+        else:
+            smoothed = (smoothing * va[0] + (1 - smoothing) * prev[0],
+                        smoothing * va[1] + (1 - smoothing) * prev[1])
+        prev = smoothed
+        emitted_end = start + len(buf)
+        point = TrajectoryPoint(index=n, start=start, end=emitted_end,
+                                emotion=emo, va=va, va_smoothed=smoothed)
+        n += 1
+        return point
+
+    for tok in iter_tokens(iter_chunks(source)):
+        buf.append(tok)
+        if len(buf) == window:
+            yield emit()
+            for _ in range(hop):
+                buf.popleft()
+            start += hop
+
+    # Fenêtre finale partielle s'il reste des tokens non couverts (ou texte court)
+    if n == 0 or start + len(buf) > emitted_end:
+        yield emit()
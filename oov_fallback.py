@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Repli hors lexique : émotions des mots inconnus par plus proches voisins
+Quand un texte n'a aucun mot du lexique, analyze_text_emotion renvoyait
+{"calme": 1}. Avec un OOVFallback, chaque token inconnu est projeté dans une
+table locale de vecteurs de mots (format texte word2vec / fastText .vec) et
+comparé aux mots du lexique via un index quantifié IVF-PQ en NumPy :
+- IVF : k-means grossier (nlist centroïdes), on ne visite que les nprobe listes
+  les plus proches de la requête ;
+- PQ : chaque vecteur est codé sur m octets (m sous-espaces x 256 centroïdes),
+  le produit scalaire approché se lit dans une table (m, 256) par requête ;
+- les meilleurs candidats sont reclassés avec les vecteurs exacts (float16).
+Tout est écrit dans un dossier de .npy relus en memory-map ; les requêtes sont
+traitées par lots et mémoïsées par token.
+Construction :
+    python oov_fallback.py cc.fr.300.vec -o oov_index --lexicon lexique.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+import nlp_emo
+from compact_lexicon import StringTable, string_table
+
+VERSION = 1
+META = "meta.json"
+TRAIN_SAMPLE = 20_000    # points max pour l'entraînement des k-means
+KMEANS_ITERS = 12
+
+# =============================================================================
+# 1. LECTURE DES VECTEURS
+# =============================================================================
+
+def _count_vectors(path: Path) -> tuple[int, int, bool]:
+    """(nombre de lignes-vecteurs, dimension, la 1re ligne est-elle un en-tête "N D" ?)"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        first = f.readline().rstrip("\n").split(" ")
+        header = len(first) == 2 and all(x.isdigit() for x in first)
+        if header:
+            return int(first[0]), int(first[1]), True
+        dim = len(first) - 1
+        return 1 + sum(1 for _ in f), dim, False
+
+def read_vectors(path: str | Path, out_path: Path, max_words: int | None = None) -> tuple[dict, np.memmap]:
+    """
+    Lit un fichier .vec ligne par ligne vers un .npy float16 normalisé (L2), sans
+    tout charger en mémoire. Les mots sont normalisés comme les textes (nlp_emo.normalize) ;
+    en cas de doublon, la première occurrence (la plus fréquente en .vec) est gardée.
+    Renvoie (mot normalisé -> ligne, vecteurs en memory-map).
+    """
+    path = Path(path)
+    n, dim, header = _count_vectors(path)
+    if max_words:
+        n = min(n, max_words)
+    vectors = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float16, shape=(n, dim))
+    rows = {}
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        if header:
+            f.readline()
+        i = 0
+        for line in f:
+            if i >= n:
+                break
+            parts = line.rstrip().split(" ")
+            if len(parts) != dim + 1:
+                continue  # ligne mal formée (mot avec espace, troncature...)
+            v = np.asarray(parts[1:], dtype=np.float32)
+            norm = float(np.linalg.norm(v))
+            vectors[i] = v / norm if norm else v
+            rows.setdefault(nlp_emo.normalize(parts[0]), i)
+            i += 1
+    vectors.flush()
+    return rows, vectors[:i]
+
+# =============================================================================
+# 2. CONSTRUCTION DE L'INDEX (IVF-PQ)
+# =============================================================================
+
+def kmeans(x: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Lloyd en NumPy (distance euclidienne) ; initialisation sur k points tirés au hasard."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Cluster vide : réensemencé sur un point au hasard
+        centroids[empty] = x[rng.choice(len(x), int(empty.sum()))]
+    return centroids
+
+def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Indice du centroïde le plus proche (||x-c||² = ||c||² - 2 x.c + cte), par blocs."""
+    c2 = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(x), dtype=np.intp)
+    for s in range(0, len(x), 8192):
+        out[s:s + 8192] = np.argmin(c2 - 2 * x[s:s + 8192] @ centroids.T, axis=1)
+    return out
+
+def _default_subspaces(dim: int) -> int:
+    """
+    Plus grand diviseur de dim donnant des sous-vecteurs d'au moins 8 dimensions :
+    le coût d'une requête est proportionnel à m (une lecture de table par sous-espace).
+    """
+    return max((m for m in range(1, dim // 8 + 1) if dim % m == 0), default=1)
+
+def build_index(vectors_path: str | Path, lexicon: dict | None, out_dir: str | Path,
+                nlist: int | None = None, subspaces: int | None = None,
+                max_words: int | None = None, seed: int = 0) -> Path:
+    """
+    Indexe les mots simples du lexique présents dans la table de vecteurs.
+    La table complète (vocabulaire + vecteurs) est gardée pour vectoriser les requêtes.
+    """
+    lexicon = lexicon if lexicon is not None else nlp_emo.DEFAULT_LEXICON
+    out_dir = Path(out_dir)
+    tmp = out_dir.with_name(f"{out_dir.name}.tmp-{uuid.uuid4().hex}")
+    tmp.mkdir(parents=True)
+    try:
+        rows, vectors = read_vectors(vectors_path, tmp / "vectors.npy", max_words)
+        words = sorted(w.encode("utf-8") for w in rows)
+        prefix, offsets, blob = string_table(words)
+        vocab_row = np.array([rows[w.decode("utf-8")] for w in words], dtype=np.int32)
+
+        # Base indexée : un élément par mot du lexique trouvé, avec ses (émotion, poids)
+        emotions = list(lexicon)
+        items = {}   # ligne du vecteur -> [(id émotion, poids), ...]
+        for e_idx, (emo, entries) in enumerate(lexicon.items()):
+            for w, weight in entries.items():
+                row = rows.get(w) if " " not in w else None
+                if row is not None:
+                    items.setdefault(row, []).append((e_idx, float(weight)))
+        if not items:
+            raise ValueError("aucun mot du lexique n'a de vecteur dans la table")
+        item_row = np.array(sorted(items), dtype=np.int32)
+        item_ptr = np.zeros(len(item_row) + 1, dtype=np.int32)
+        item_ptr[1:] = np.cumsum([len(items[r]) for r in item_row.tolist()])
+        labels = [lab for r in item_row.tolist() for lab in items[r]]
+
+        x = vectors[item_row].astype(np.float32)
+        dim = x.shape[1]
+        m = subspaces or _default_subspaces(dim)
+        if dim % m:
+            raise ValueError(f"dimension {dim} non divisible par {m} sous-espaces")
+        nlist = nlist or int(np.clip(round(np.sqrt(len(x))), 1, 1024))
+        rng = np.random.default_rng(seed)
+        train = x[rng.choice(len(x), min(len(x), TRAIN_SAMPLE), replace=False)]
+
+        # IVF : listes inversées triées par centroïde
+        centroids = kmeans(train, nlist, seed=seed)
+        assign = _nearest(x, centroids)
+        order = np.argsort(assign, kind="stable")
+        list_ptr = np.zeros(len(centroids) + 1, dtype=np.int32)
+        list_ptr[1:] = np.cumsum(np.bincount(assign, minlength=len(centroids)))
+
+        # PQ sur les vecteurs eux-mêmes : q.x ~ somme des q_j.codebook_j[code_j]
+        dsub = dim // m
+        ksub = min(256, len(train))
+        codebooks = np.empty((m, ksub, dsub), dtype=np.float32)
+        codes = np.empty((len(x), m), dtype=np.uint8)
+        for j in range(m):
+            sub = x[:, j * dsub:(j + 1) * dsub]
+            codebooks[j] = kmeans(train[:, j * dsub:(j + 1) * dsub], ksub, seed=seed + j + 1)
+            codes[:, j] = _nearest(sub, codebooks[j])
+
+        arrays = {
+            "vocab_prefix": prefix, "vocab_offsets": offsets, "vocab_blob": blob, "vocab_row": vocab_row,
+            "centroids": centroids.astype(np.float32), "codebooks": codebooks,
+            "list_ptr": list_ptr, "list_items": order.astype(np.int32), "codes": codes[order],
+            "item_row": item_row, "item_ptr": item_ptr,
+            "item_emotion": np.array([e for e, _ in labels], dtype=np.int8),
+            "item_weight": np.array([w for _, w in labels], dtype=np.float32),
+        }
+        for name, a in arrays.items():
+            np.save(tmp / f"{name}.npy", a)
+        st = Path(vectors_path).stat()
+        meta = {
+            "version": VERSION, "emotions": emotions, "dim": dim, "nlist": len(centroids),
+            "subspaces": m, "items": len(item_row), "vocab": len(words),
+            "lexicon_fingerprint": nlp_emo.lexicon_fingerprint(lexicon),
+            "source": {"path": str(vectors_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns},
+        }
+        meta["fingerprint"] = hashlib.sha1(json.dumps(meta, sort_keys=True).encode("utf-8")).hexdigest()
+        with open(tmp / META, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        if out_dir.exists():
+            shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return out_dir
+
+# =============================================================================
+# 3. REQUÊTES & REPLI
+# =============================================================================
+
+class OOVFallback:
+    """
+    Index IVF-PQ relu en memory-map. score_tokens(tokens) -> scores bruts par émotion
+    (même forme que CompiledLexicon.score_tokens), à n'appeler que si le lexique n'a rien trouvé.
+    """
+
+    def __init__(self, directory: str | Path, k: int = 8, nprobe: int = 8, min_sim: float = 0.45,
+                 rerank: int = 16, memo_size: int = 100_000):
+        self.directory = Path(directory)
+        with open(self.directory / META, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != VERSION:
+            raise ValueError(f"{self.directory} : index de version {self.meta.get('version')}, attendu {VERSION}")
+        self.emotions = self.meta["emotions"]
+        self.k, self.nprobe, self.min_sim, self.rerank = k, nprobe, min_sim, rerank
+        # Les paramètres de requête changent les scores : ils font partie de l'empreinte
+        self.fingerprint = f"{self.meta['fingerprint'][:16]}-k{k}-p{nprobe}-s{min_sim}-r{rerank}"
+        for name in ("vectors", "vocab_prefix", "vocab_offsets", "vocab_blob", "vocab_row", "centroids",
+                     "codebooks", "list_ptr", "list_items", "codes", "item_row", "item_ptr",
+                     "item_emotion", "item_weight"):
+            # ndarray sur le même mapping : évite le surcoût Python de np.memmap à chaque indexation
+            setattr(self, name, np.asarray(np.load(self.directory / f"{name}.npy", mmap_mode="r")))
+        self._vocab = StringTable(self.vocab_prefix, self.vocab_offsets, self.vocab_blob)
+        self._list_ptr = self.list_ptr.tolist()
+        self._memo = OrderedDict()   # token -> ((id émotion, score), ...)
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._memo), "hits": self.hits, "misses": self.misses}
+
+    def token_vectors(self, tokens: list[str]) -> tuple[list[str], np.ndarray]:
+        """(tokens présents dans la table, leurs vecteurs float32 normalisés)."""
+        found = [(t, i) for t, i in self._vocab.lookup(tokens).items() if i >= 0]
+        if not found:
+            return [], np.zeros((0, self.meta["dim"]), dtype=np.float32)
+        rows = self.vocab_row[[i for _, i in found]]
+        return [t for t, _ in found], np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def search(self, queries: np.ndarray, k: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k approché d'un lot de requêtes (q, d) normalisées.
+        Renvoie (indices d'éléments (q, k), similarités cosinus (q, k)) ; -1 / -inf si moins de k candidats.
+        """
+        k = k or self.k
+        q = np.ascontiguousarray(queries, dtype=np.float32)
+        nq = len(q)
+        m, ksub, dsub = self.codebooks.shape
+        nprobe = min(self.nprobe, len(self.centroids))
+        coarse = q @ np.asarray(self.centroids).T                     # (q, nlist)
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe] if nprobe < coarse.shape[1] \
+            else np.tile(np.arange(coarse.shape[1]), (nq, 1))
+        # Tables de produits scalaires par sous-espace, pour tout le lot, aplaties : (q, m * ksub)
+        lut = np.einsum("qmd,mkd->qmk", q.reshape(nq, m, dsub), self.codebooks).reshape(nq, m * ksub)
+        ids = np.full((nq, k), -1, dtype=np.int64)
+        sims = np.full((nq, k), -np.inf, dtype=np.float32)
+        sub = (np.arange(m) * ksub).astype(np.int32)
+        for i in range(nq):
+            lists = [np.arange(self._list_ptr[c], self._list_ptr[c + 1]) for c in probes[i].tolist()]
+            cand = np.concatenate(lists) if lists else np.zeros(0, dtype=np.intp)
+            if not len(cand):
+                continue
+            approx = np.take(lut[i], self.codes[cand] + sub).sum(axis=1)
+            # Reclassement exact des meilleurs candidats approchés
+            n_keep = min(len(cand), k * self.rerank)
+            best = cand[np.argpartition(-approx, n_keep - 1)[:n_keep]] if n_keep < len(cand) else cand
+            items = np.asarray(self.list_items[best], dtype=np.intp)
+            exact = np.asarray(self.vectors[self.item_row[items]], dtype=np.float32) @ q[i]
+            top = np.argsort(-exact, kind="stable")[:k]
+            ids[i, :len(top)] = items[top]
+            sims[i, :len(top)] = exact[top]
+        return ids, sims
+
+    def _contributions(self, ids: np.ndarray, sims: np.ndarray) -> tuple:
+        """Vote pondéré des voisins assez proches : sim x poids, moyenné sur les voisins retenus."""
+        acc = {}
+        kept = [(i, s) for i, s in zip(ids.tolist(), sims.tolist()) if i >= 0 and s >= self.min_sim]
+        for item, sim in kept:
+            lo, hi = int(self.item_ptr[item]), int(self.item_ptr[item + 1])
+            for e, w in zip(self.item_emotion[lo:hi].tolist(), self.item_weight[lo:hi].tolist()):
+                acc[e] = acc.get(e, 0.0) + sim * w / len(kept)
+        return tuple(sorted(acc.items()))
+
+    def lookup_tokens(self, tokens) -> dict:
+        """token -> contributions ((id émotion, score), ...), mémoïsées ; une recherche groupée pour les nouveaux."""
+        unique = list(dict.fromkeys(tokens))
+        out, missing = {}, []
+        with self._lock:
+            for t in unique:
+                c = self._memo.get(t)
+                if c is None:
+                    missing.append(t)
+                else:
+                    self._memo.move_to_end(t)
+                    out[t] = c
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            found, vecs = self.token_vectors(missing)
+            computed = dict.fromkeys(missing, ())
+            if found:
+                ids, sims = self.search(vecs)
+                for t, i, s in zip(found, ids, sims):
+                    computed[t] = self._contributions(i, s)
+            out.update(computed)
+            with self._lock:
+                self._memo.update(computed)
+                while len(self._memo) > self._memo_size:
+                    self._memo.popitem(last=False)
+        return out
+
+    def score_tokens(self, tokens: list[str]) -> dict:
+        """Scores bruts (float) par émotion, dans l'ordre du lexique source ; {} si rien d'assez proche."""
+        return self.score_many([tokens])[0]
+
+    def score_many(self, token_lists: list[list[str]]) -> list[dict]:
+        """score_tokens pour un lot de textes (une seule recherche pour tous les tokens inconnus)."""
+        contrib = self.lookup_tokens(t for tokens in token_lists for t in tokens)
+        out = []
+        for tokens in token_lists:
+            acc = {}
+            for t in tokens:
+                for e, v in contrib[t]:
+                    acc[e] = acc.get(e, 0.0) + v
+            out.append({self.emotions[e]: acc[e] for e in sorted(acc)})
+        return out
+
+# =============================================================================
+# 4. LIGNE DE COMMANDE
+# =============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="oov_fallback", description="Construit l'index IVF-PQ du repli hors lexique.")
+    p.add_argument("vectors", help="vecteurs de mots, format texte word2vec / fastText (.vec)")
+    p.add_argument("-o", "--output", default="oov_index", help="dossier de l'index")
+    p.add_argument("--lexicon", default=None, help="lexique JSON (défaut : lexique intégré)")
+    p.add_argument("--max-words", type=int, default=None, help="ne lit que les N premiers mots de la table")
+    p.add_argument("--nlist", type=int, default=None, help="listes inversées (défaut : ~racine du nb de mots)")
+    p.add_argument("--subspaces", type=int, default=None, help="sous-espaces PQ (octets par vecteur)")
+    return p
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    lexicon = nlp_emo.load_lexicon(args.lexicon)
+    try:
+        out = build_index(args.vectors, lexicon, args.output, args.nlist, args.subspaces, args.max_words)
+    except (OSError, ValueError) as e:
+        print(f"[ERREUR] {e}", file=sys.stderr)
+        return 1
+    with open(out / META, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    print(f"Index écrit dans {out} : {meta['items']} mots du lexique, vocabulaire {meta['vocab']}, "
+          f"{meta['nlist']} listes, {meta['subspaces']} octets par vecteur")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
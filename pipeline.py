@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de génération par étages
+analyse -> spectrogramme -> vocodeur, chaque étage sur son propre thread,
+reliés par des files bornées : l'analyse NLP de la requête N+1 se fait
+pendant la génération de la requête N.
+Chaque requête reçoit un GenerationHandle (future + progression + annulation).
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass
+
+_STOP = object()  # sentinelle d'arrêt propagée d'étage en étage
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    fn: object                 # fn(handle), ou fn([handles]) si max_batch > 1
+    weight: float = 1.0        # part de l'avancement global
+    max_batch: int = 1         # micro-batching : nb max de requêtes par appel
+    max_wait: float = 0.0      # attente max (s) pour compléter un lot
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    stage: str       # nom de l'étage
+    state: str       # "start" | "done"
+    progress: float  # avancement global de la requête (0 -> 1)
+
+
+class GenerationHandle:
+    """Poignée d'une requête soumise au pipeline."""
+
+    def __init__(self, text: str, on_progress=None):
+        self.text = text
+        self.data = {}            # contexte partagé entre les étages
+        self.future = Future()
+        self.progress = 0.0
+        self.stage = None
+        self._callbacks = [on_progress] if on_progress else []
+        self._cancelled = threading.Event()
+
+    def add_progress_callback(self, callback):
+        """callback(ProgressEvent), appelé depuis le thread de l'étage."""
+        self._callbacks.append(callback)
+
+    def emit(self, event: ProgressEvent):
+        self.progress = event.progress
+        self.stage = event.stage
+        for cb in list(self._callbacks):
+            try:
+                cb(event)
+            except Exception as e:
+                print(f"[WARN] Callback de progression en erreur : {e}")
+
+    def cancel(self) -> bool:
+        """Demande l'annulation ; prise en compte au plus tard à l'étage suivant."""
+        if self.future.done():
+            return False
+        self._cancelled.set()
+        self.future.cancel()  # efficace tant que le premier étage n'a pas démarré
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or self.future.cancelled()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float | None = None):
+        return self.future.result(timeout)
+
+
+class StagedPipeline:
+    """
+    Étages (Stage) reliés par des files de taille maxsize.
+    Quand la file d'entrée est pleine, submit() bloque (ou lève queue.Full
+    si block=False / timeout dépassé) : c'est la contre-pression.
+    """
+
+    def __init__(self, stages: list[Stage], maxsize: int = 4):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in stages]
+        total = sum(st.weight for st in stages) or 1.0
+        # Avancement global à la fin de chaque étage
+        self._milestones = []
+        acc = 0.0
+        for st in stages:
+            acc += st.weight / total
+            self._milestones.append(acc)
+        self._threads = [
+            threading.Thread(target=self._worker, args=(i,), name=f"stage-{st.name}", daemon=True)
+            for i, st in enumerate(stages)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, handle: GenerationHandle, block: bool = True, timeout: float | None = None) -> GenerationHandle:
+        self.queues[0].put(handle, block=block, timeout=timeout)
+        return handle
+
+    def queue_depths(self) -> list[int]:
+        return [q.qsize() for q in self.queues]
+
+    def shutdown(self, wait: bool = True):
+        self.queues[0].put(_STOP)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def _collect(self, inbox: queue.Queue, max_batch: int, max_wait: float) -> tuple[list, bool]:
+        """Premier élément bloquant, puis complète le lot jusqu'à max_batch / max_wait."""
+        first = inbox.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = inbox.get(timeout=remaining) if remaining > 0 else inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _worker(self, i: int):
+        stage = self.stages[i]
+        name = stage.name
+        inbox = self.queues[i]
+        outbox = self.queues[i + 1] if i + 1 < len(self.queues) else None
+        start_progress = self._milestones[i - 1] if i else 0.0
+        stop = False
+        while not stop:
+            batch, stop = self._collect(inbox, stage.max_batch, stage.max_wait)
+            live = []
+            for handle in batch:
+                fut = handle.future
+                if i == 0 and not fut.set_running_or_notify_cancel():
+                    continue  # annulée avant de démarrer
+                if handle.cancelled:
+                    if not fut.done():
+                        fut.set_exception(CancelledError(f"annulée avant l'étage {name}"))
+                    continue
+                live.append(handle)
+            if live:
+                self._run_stage(stage, live, start_progress, self._milestones[i], outbox)
+        if outbox is not None:
+            outbox.put(_STOP)
+
+    def _run_stage(self, stage: Stage, handles: list, start_progress: float, end_progress: float, outbox):
+        try:
+            for handle in handles:
+                handle.emit(ProgressEvent(stage.name, "start", start_progress))
+            if stage.max_batch > 1:
+                stage.fn(handles)
+            else:
+                for handle in handles:
+                    stage.fn(handle)
+        except Exception as e:
+            for handle in handles:
+                handle.future.set_exception(e)
+            return
+        for handle in handles:
+            # Une requête déjà résolue (ex : trouvée en cache) sort du pipeline tout de suite,
+            # sans attendre les lots ni les files des étages suivants
+            resolved = outbox is None or "result" in handle.data
+            handle.emit(ProgressEvent(stage.name, "done", 1.0 if resolved else end_progress))
+            if resolved:
+                handle.future.set_result(handle.data.get("result"))
+            else:
+                outbox.put(handle)
+
+
+class SharedHandle(GenerationHandle):
+    """
+    Poignée d'un appelant rattaché à un calcul partagé (single-flight).
+    Son annulation ne détache que cet appelant ; le calcul n'est annulé
+    que lorsque plus personne ne l'attend.
+    """
+
+    def __init__(self, text: str, flight, on_progress=None):
+        super().__init__(text, on_progress)
+        self._flight = flight
+        self._cancel_lock = threading.Lock()
+
+    def cancel(self) -> bool:
+        # Idempotent : Future.cancel() renvoie aussi True sur un future déjà annulé,
+        # la référence de cet appelant ne doit être rendue qu'une fois
+        with self._cancel_lock:
+            if self._cancelled.is_set() or not self.future.cancel():  # future propre à l'appelant, jamais "running"
+                return False
+            self._cancelled.set()
+        self._flight.release()
+        return True
+
+
+class _Flight:
+    def __init__(self, group, key, handle: GenerationHandle):
+        self.group = group
+        self.key = key
+        self.handle = handle
+        self.refs = 0
+
+    def release(self):
+        with self.group._lock:
+            self.refs -= 1
+            last = self.refs == 0
+            if last and self.group._inflight.get(self.key) is self:
+                del self.group._inflight[self.key]
+        if last:
+            self.handle.cancel()
+
+
+class SingleFlight:
+    """
+    Déduplication des requêtes identiques en cours : la première lance le
+    calcul, les suivantes (même clé) s'y rattachent et reçoivent le même résultat.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.requests = 0
+        self.collapsed = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "collapsed": self.collapsed, "inflight": len(self._inflight)}
+
+    def submit(self, key, text: str, start, on_progress=None) -> SharedHandle:
+        """start() -> GenerationHandle n'est appelé que si aucun calcul n'est en cours pour key."""
+        with self._lock:
+            self.requests += 1
+            flight = self._inflight.get(key)
+            if flight is not None and not flight.handle.done():
+                self.collapsed += 1
+                flight.refs += 1  # même section critique : un release() concurrent ne peut l'annuler
+            else:
+                flight = None
+        if flight is None:
+            # Lancement hors verrou (submit peut bloquer par contre-pression)
+            handle = start()
+            with self._lock:
+                current = self._inflight.get(key)
+                if current is not None and not current.handle.done():
+                    # Un autre appelant a lancé le même calcul entre-temps
+                    handle.cancel()
+                    flight = current
+                    self.collapsed += 1
+                else:
+                    flight = _Flight(self, key, handle)
+                    self._inflight[key] = flight
+                flight.refs += 1
+            if flight.handle is handle:
+                # Hors verrou : le rappel s'exécute tout de suite si le calcul est déjà fini
+                handle.future.add_done_callback(lambda _f, fl=flight: self._forget(fl))
+        caller = SharedHandle(text, flight, on_progress)
+        self._attach(caller, flight.handle)
+        return caller
+
+    def _forget(self, flight: _Flight):
+        with self._lock:
+            if self._inflight.get(flight.key) is flight:
+                del self._inflight[flight.key]
+
+    @staticmethod
+    def _attach(caller: SharedHandle, shared: GenerationHandle):
+        """Relaie progression, contexte des étages et résultat du calcul partagé vers l'appelant."""
+        caller.data = shared.data  # clé du cache, graine... renseignées par les étages
+        if shared.stage is not None:
+            caller.emit(ProgressEvent(shared.stage, "attach", shared.progress))
+        shared.add_progress_callback(lambda e: None if caller.future.done() else caller.emit(e))
+
+        def relay(fut: Future):
+            if caller.future.done():
+                return
+            if fut.cancelled():
+                caller.future.cancel()
+            elif fut.exception() is not None:
+                caller.future.set_exception(fut.exception())
+            else:
+                caller.future.set_result(fut.result())
+        shared.future.add_done_callback(relay)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Cache disque des résultats de génération (adressé par contenu)
+Clé = hash(prompt final, graine, backend, version du lexique, réglages).
+Une entrée = un dossier <racine>/<2 premiers hex>/<clé>/ contenant :
+- spec.npy     : magnitudes float32 brutes (relues en memory-map)
+- preview.png  : aperçu couleur
+- audio.wav    : audio reconstruit
+- meta.json    : métadonnées (prompt, taille...), son atime sert au LRU
+- audio.pyramid/ (éventuel) : pyramide d'affichage créée à côté du WAV (waveform_pyramid)
+La taille d'une entrée compte tous les fichiers de son dossier.
+Écritures atomiques (dossier temporaire puis rename), sûres entre processus.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+SPEC, PREVIEW, AUDIO, META = "spec.npy", "preview.png", "audio.wav", "meta.json"
+RESCAN_INTERVAL = 30.0  # s : au-delà, l'estimation de taille est recalculée sur disque
+
+@dataclass
+class CachedResult:
+    key: str
+    spectrogram: np.ndarray   # memory-map en lecture seule
+    image: Image.Image
+    audio_path: Path
+    meta: dict
+
+def make_key(prompt: str, seed: int, backend: str, lexicon_version: str, **params) -> str:
+    """Empreinte sha256 de tout ce qui détermine le résultat."""
+    payload = json.dumps([prompt, seed, backend, lexicon_version, sorted(params.items())],
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Cache LRU borné en taille (max_bytes), partagé par tous les processus sur le même dossier."""
+
+    def __init__(self, root: str | Path = "cache", max_bytes: int = 512 * 1024 ** 2):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None  # estimation de la taille totale, calculée au premier put
+        self._scanned = 0.0  # instant (monotonic) du dernier parcours du disque
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stores": self.stores,
+                    "evictions": self.evictions, "bytes": self._size}
+
+    # ------------------------------------------------------------------ lecture
+    def get(self, key: str) -> CachedResult | None:
+        entry = self._entry_dir(key)
+        try:
+            with open(entry / META, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            spec = np.load(entry / SPEC, mmap_mode="r")
+            with Image.open(entry / PREVIEW) as im:
+                image = im.copy()
+            # Touche l'entrée : l'atime de meta.json sert d'horodatage LRU
+            now = time.time()
+            os.utime(entry / META, (now, now))
+        except (OSError, ValueError):
+            # Absente, ou évincée par un autre processus pendant la lecture
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return CachedResult(key, spec, image, entry / AUDIO, meta)
+
+    # ------------------------------------------------------------------ écriture
+    def put(self, key: str, spectrogram: np.ndarray, image: Image.Image,
+            audio_path: str | Path, **meta) -> Path:
+        """Stocke une entrée de façon atomique ; renvoie son dossier."""
+        final = self._entry_dir(key)
+        if final.exists():
+            return final
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        try:
+            np.save(tmp / SPEC, np.ascontiguousarray(spectrogram, dtype=np.float32))
+            image.save(tmp / PREVIEW)
+            shutil.copyfile(audio_path, tmp / AUDIO)
+            size = sum(p.stat().st_size for p in tmp.iterdir())
+            meta = dict(meta, key=key, size=size, created=time.time())
+            with open(tmp / META, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            final.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(tmp, final)   # atomique ; échoue si un autre processus a gagné
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return final
+        with self._lock:
+            self.stores += 1
+            if self._size is not None:
+                self._size += size
+        self._evict_if_needed()
+        return final
+
+    # ------------------------------------------------------------------ éviction
+    @staticmethod
+    def _entry_size(path: str) -> int:
+        """Taille de tous les fichiers sous le dossier d'une entrée (pyramide comprise)."""
+        size = 0
+        for root, _dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.stat(os.path.join(root, name)).st_size
+                except OSError:
+                    pass  # supprimé pendant le parcours
+        return size
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """(dernier accès, taille, dossier) de chaque entrée présente sur disque."""
+        entries = []
+        if not self.root.exists():
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name.startswith("."):
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    st = os.stat(os.path.join(entry.path, META))
+                except OSError:
+                    continue
+                # Taille réelle et non celle de meta.json : des fichiers (pyramide du WAV)
+                # peuvent s'ajouter à l'entrée après son écriture
+                entries.append((max(st.st_atime, st.st_mtime), self._entry_size(entry.path), Path(entry.path)))
+        return entries
+
+    def _evict_if_needed(self):
+        with self._lock:
+            # L'estimation ignore ce que d'autres processus ajoutent (entrées, pyramides) :
+            # elle n'est crue que pendant RESCAN_INTERVAL
+            fresh = time.monotonic() - self._scanned < RESCAN_INTERVAL
+            if self._size is not None and self._size <= self.max_bytes and fresh:
+                return
+        scanned = time.monotonic()
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                # Rename puis suppression : un lecteur ne voit jamais d'entrée à moitié effacée
+                trash = self.root / f".tmp-del-{uuid.uuid4().hex}"
+                try:
+                    os.rename(path, trash)
+                except OSError:
+                    continue  # déjà évincée par un autre processus
+                shutil.rmtree(trash, ignore_errors=True)
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._size = total
+            self._scanned = scanned
+            self.evictions += evicted
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Historique de session à mémoire bornée
+Chaque entrée garde une petite vignette précalculée et une poignée paresseuse
+vers l'image pleine résolution. Au-delà d'un budget mémoire, les images les
+moins récemment utilisées sont déversées sur disque (PNG) et relues à la demande.
+"""
+
+import itertools
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PIL import Image
+
+THUMB_SIZE = (96, 48)
+
+# Clés d'images uniques entre instances : un cache d'affichage peut servir plusieurs historiques
+_KEYS = itertools.count(1)
+
+def image_nbytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+class ResultHandle:
+    """Image pleine résolution, en mémoire ou déversée sur disque."""
+
+    def __init__(self, owner: "SessionHistory", key: int, img: Image.Image | None = None,
+                 path: str | Path | None = None, nbytes: int = 0):
+        self._owner = owner
+        self.key = key
+        self._img = img
+        self.path = Path(path) if path else None   # copie disque (déversement ou archive)
+        self.nbytes = image_nbytes(img) if img is not None else nbytes
+
+    @property
+    def resident(self) -> bool:
+        return self._img is not None
+
+    def get(self) -> Image.Image:
+        img = self._img
+        if img is None:
+            with Image.open(self.path) as im:
+                img = im.copy()
+            self._img = img
+            self.nbytes = image_nbytes(img)
+        self._owner._touch(self)
+        return img
+
+    def spill(self, directory: Path):
+        """Écrit l'image sur disque (une seule fois) et libère la mémoire."""
+        if self._img is None:
+            return
+        if self.path is None:
+            self.path = directory / f"{self.key:06d}.png"
+            self._img.save(self.path)
+        self._img = None
+
+
+@dataclass
+class HistoryEntry:
+    text: str
+    prompt: str
+    emotion: str
+    audio: str
+    time: str
+    thumbnail: Image.Image | None
+    result: ResultHandle | None
+    store_id: int | None = None   # id dans le SessionStore, si l'entrée est archivée
+    extra: dict = field(default_factory=dict)  # objets d'affichage (ex : CTkImage de la vignette)
+
+
+class SessionHistory:
+    """Liste d'entrées + LRU des images résidentes sous max_bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 ** 2, spill_dir: str | Path | None = None):
+        self.max_bytes = max_bytes
+        self.entries = []
+        self._resident = OrderedDict()  # key -> ResultHandle, du moins au plus récent
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._spill_dir = Path(spill_dir) if spill_dir else None
+        self._tmp = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index) -> HistoryEntry:
+        return self.entries[index]
+
+    @property
+    def resident_bytes(self) -> int:
+        return self._resident_bytes
+
+    def _directory(self) -> Path:
+        if self._spill_dir is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="ai_studio_history_")
+            self._spill_dir = Path(self._tmp.name)
+        self._spill_dir.mkdir(parents=True, exist_ok=True)
+        return self._spill_dir
+
+    def _new_key(self) -> int:
+        return next(_KEYS)
+
+    def append(self, text, prompt, emotion, img, audio, time) -> int:
+        """Nouvelle génération (image en mémoire) ; renvoie son index."""
+        thumb = img.copy()
+        thumb.thumbnail(THUMB_SIZE)
+        handle = ResultHandle(self, self._new_key(), img)
+        self.entries.append(HistoryEntry(text, prompt, emotion, audio, time, thumb, handle))
+        self._touch(handle)
+        return len(self.entries) - 1
+
+    def prepend_stored(self, sessions, thumbnails=None) -> int:
+        """
+        Ajoute en tête des sessions archivées (SessionStore.page, du plus récent
+        au plus ancien) ; leurs images restent sur disque jusqu'au premier affichage.
+        thumbnails : vignettes déjà décodées (ex : hors du thread Tk), sinon décodées ici.
+        Renvoie le nombre d'entrées ajoutées (les index existants sont décalés d'autant).
+        """
+        if thumbnails is None:
+            thumbnails = [st.thumbnail_image() for st in sessions]
+        older = []
+        for st, thumb in zip(reversed(sessions), reversed(thumbnails)):
+            handle = ResultHandle(self, self._new_key(), path=st.image_path) if st.image_path else None
+            older.append(HistoryEntry(st.text, st.prompt, st.emotion, st.audio, st.time,
+                                      thumb, handle, store_id=st.id))
+        self.entries[:0] = older
+        return len(older)
+
+    def _touch(self, handle: ResultHandle):
+        with self._lock:
+            if handle.key in self._resident:
+                self._resident.move_to_end(handle.key)
+            else:
+                self._resident[handle.key] = handle
+                self._resident_bytes += handle.nbytes
+            # Déversement des moins récents, en gardant toujours celui qu'on vient d'utiliser
+            while self._resident_bytes > self.max_bytes and len(self._resident) > 1:
+                _, old = self._resident.popitem(last=False)
+                old.spill(self._directory())
+                self._resident_bytes -= old.nbytes
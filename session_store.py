@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage persistant de l'historique des sessions (SQLite)
+- Mode WAL : les lectures de l'interface ne bloquent pas l'écriture d'une nouvelle entrée.
+- Écriture en ajout seul (INSERT), jamais de réécriture des entrées existantes.
+- Lecture paginée, de la plus récente à la plus ancienne (curseur sur l'id) :
+  la sidebar affiche la dernière page sans charger toute l'archive.
+- Recherche indexée par émotion (index B-tree) et par texte (FTS5, ou LIKE
+  si la build SQLite n'a pas FTS5).
+Les images pleine résolution sont des fichiers PNG à côté de la base ; la
+base ne garde que leur chemin et une petite vignette.
+"""
+
+import io
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id         INTEGER PRIMARY KEY,
+    created    REAL NOT NULL,
+    time       TEXT NOT NULL,
+    text       TEXT NOT NULL,
+    prompt     TEXT NOT NULL,
+    emotion    TEXT NOT NULL,
+    audio      TEXT,
+    image_path TEXT,
+    thumbnail  BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_emotion ON sessions(emotion, id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts
+    USING fts5(text, prompt, content='sessions', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN
+    INSERT INTO sessions_fts(rowid, text, prompt) VALUES (new.id, new.text, new.prompt);
+END;
+"""
+
+@dataclass
+class StoredSession:
+    id: int
+    created: float
+    time: str
+    text: str
+    prompt: str
+    emotion: str
+    audio: str | None
+    image_path: Path | None
+    thumbnail: bytes | None
+
+    def thumbnail_image(self) -> Image.Image | None:
+        if not self.thumbnail:
+            return None
+        with Image.open(io.BytesIO(self.thumbnail)) as im:
+            return im.copy()
+
+_COLUMNS = "s.id, s.created, s.time, s.text, s.prompt, s.emotion, s.audio, s.image_path, s.thumbnail"
+
+def _fts_query(text: str) -> str:
+    """Chaque mot devient un préfixe entre guillemets (pas de syntaxe FTS5 exposée)."""
+    return " ".join('"{}"*'.format(w.replace('"', '""')) for w in text.split())
+
+def _like_pattern(word: str) -> str:
+    return "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class SessionStore:
+    """Historique persistant : <root>/sessions.db + <root>/images/<uuid>.png"""
+
+    def __init__(self, root: str | Path = "sessions"):
+        self.root = Path(root)
+        self.images = self.root / "images"
+        self.images.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / "sessions.db"
+        # Une connexion pour l'écriture (thread de génération), une pour la lecture (UI)
+        self._write = self._connect()
+        self._read = self._connect()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        with self._write_lock:
+            self._write.executescript(SCHEMA)
+            try:
+                self._write.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                print("[WARN] SQLite sans FTS5 : recherche texte par LIKE")
+                self.has_fts = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self):
+        for conn in (self._write, self._read):
+            conn.close()
+
+    # ------------------------------------------------------------------ écriture
+    def save_image(self, img: Image.Image) -> Path:
+        """Écrit une image pleine résolution en PNG à côté de la base ; renvoie son chemin."""
+        image_path = self.images / f"{uuid.uuid4().hex}.png"
+        img.save(image_path)
+        return image_path
+
+    def add(self, text: str, prompt: str, emotion: str, img: Image.Image | None = None,
+            audio: str | None = None, time_label: str = "", thumbnail: Image.Image | None = None,
+            image_path: str | Path | None = None) -> int:
+        """
+        Ajoute une session ; l'image pleine résolution est écrite en PNG à côté de la base
+        (ou image_path : PNG déjà écrit par save_image).
+        """
+        thumb_bytes = None
+        if thumbnail is not None:
+            buf = io.BytesIO()
+            thumbnail.save(buf, format="PNG")
+            thumb_bytes = buf.getvalue()
+        if image_path is None and img is not None:
+            # Fichier nommé avant l'insertion : la ligne est écrite une fois, complète
+            image_path = self.save_image(img)
+        with self._write_lock:
+            cur = self._write.execute(
+                "INSERT INTO sessions (created, time, text, prompt, emotion, audio, image_path, thumbnail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), time_label, text, prompt, emotion, audio,
+                 str(image_path) if image_path else None, thumb_bytes),
+            )
+            session_id = cur.lastrowid
+        return session_id
+
+    # ------------------------------------------------------------------ lecture
+    def page(self, before_id: int | None = None, limit: int = 50,
+             text: str | None = None, emotion: str | None = None) -> list[StoredSession]:
+        """
+        Sessions d'id < before_id, de la plus récente à la plus ancienne,
+        éventuellement filtrées par émotion et/ou par texte (tous les mots).
+        """
+        where, args = [], []
+        if before_id is not None:
+            where.append("s.id < ?"); args.append(before_id)
+        if emotion:
+            where.append("s.emotion = ?"); args.append(emotion)
+        joins = ""
+        if text and text.split():
+            if self.has_fts:
+                joins = " JOIN sessions_fts f ON f.rowid = s.id"
+                where.append("f.sessions_fts MATCH ?"); args.append(_fts_query(text))
+            else:
+                for w in text.split():
+                    where.append("(s.text LIKE ? ESCAPE '\\' OR s.prompt LIKE ? ESCAPE '\\')")
+                    args += [_like_pattern(w)] * 2
+        sql = f"SELECT {_COLUMNS} FROM sessions s{joins}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY s.id DESC LIMIT ?"
+        args.append(limit)
+        with self._read_lock:
+            rows = self._read.execute(sql, args).fetchall()
+        return [StoredSession(r[0], r[1], r[2], r[3], r[4], r[5], r[6],
+                              Path(r[7]) if r[7] else None, r[8]) for r in rows]
+
+    def search(self, text: str | None = None, emotion: str | None = None, limit: int = 50) -> list[StoredSession]:
+        return self.page(None, limit, text=text, emotion=emotion)
+
+    def count(self) -> int:
+        with self._read_lock:
+            return self._read.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def emotions(self) -> list[str]:
+        """Émotions présentes dans l'archive (lecture de l'index seul)."""
+        with self._read_lock:
+            return [r[0] for r in self._read.execute("SELECT DISTINCT emotion FROM sessions ORDER BY emotion")]
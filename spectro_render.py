@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Rendu procédural de spectrogrammes (NumPy)
+Remplace le dessin PIL trait par trait : les énergies par bande sont
+calculées d'un bloc, façonnées par Valence/Arousal, avec une graine par
+requête (reproductible, donc cachable).
+Convention : tableau float32 (hauteur=fréquences, largeur=trames), valeurs
+dans [0, 1], ligne 0 = fréquence la plus haute (comme une image).
+"""
+
+import hashlib
+from typing import Sequence
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_HEIGHT = 256   # bandes de fréquence
+DEFAULT_WIDTH = 512    # trames
+
+def seed_from_prompt(prompt: str) -> int:
+    """Graine stable dérivée du prompt (même prompt -> même spectrogramme)."""
+    return int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:4], "little")
+
+def render_batch(params: Sequence[tuple[float, float, int | None]],
+                 height: int = DEFAULT_HEIGHT, width: int = DEFAULT_WIDTH,
+                 out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Rend N spectrogrammes [(valence, arousal, seed), ...] dans un seul tableau
+    (N, height, width) float32, éventuellement préalloué (out).
+    """
+    n = len(params)
+    if out is None:
+        out = np.empty((n, height, width), dtype=np.float32)
+    elif out.shape != (n, height, width) or out.dtype != np.float32:
+        raise ValueError(f"out doit être float32 de forme {(n, height, width)}")
+    if n == 0:
+        return out
+
+    va = np.asarray([(v, a) for v, a, _ in params], dtype=np.float32)
+    valence = va[:, 0, None, None]
+    arousal = va[:, 1, None, None]
+
+    # Axes normalisés : f de 1 (haut de l'image) à 0 (bas), t de 0 à 1
+    f = np.linspace(1.0, 0.0, height, dtype=np.float32)[None, :, None]
+    t = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, None, :]
+
+    # Bruit de fond par requête (graine propre), écrit directement dans out
+    for i, (_, _, seed) in enumerate(params):
+        np.random.default_rng(seed).random(out=out[i], dtype=np.float32)
+    # Rugosité : plus la valence est basse, plus le bruit pèse
+    out *= 0.15 + 0.35 * (1.0 - valence)
+
+    # Enveloppe spectrale : l'arousal éclaircit (plus d'aigus)
+    envelope = np.exp(-f * (4.0 - 3.0 * arousal))
+    out *= envelope
+
+    # Partiels harmoniques : fondamentale plus haute quand la valence monte
+    f0 = 0.05 + 0.07 * valence
+    harmonics = np.arange(1, 9, dtype=np.float32)[None, :, None, None]
+    centers = f0[:, None] * harmonics                     # (N, K, 1, 1)
+    width_f = 0.005 + 0.008 * arousal[:, None]
+    bands = np.exp(-0.5 * ((f[:, None] - centers) / width_f) ** 2) / harmonics
+    tones = bands.sum(axis=1)                             # (N, H, 1)
+
+    # Modulation temporelle : rythme d'autant plus rapide que l'arousal est élevé
+    rate = 1.0 + 15.0 * arousal
+    pulse = 0.5 + 0.5 * np.cos(2.0 * np.pi * rate * t) ** 2
+    pulse = 1.0 - arousal * (1.0 - pulse)                 # calme -> quasi constant
+
+    out += tones * pulse * envelope
+    # Normalisation par spectrogramme dans [0, 1] + compression (échelle perceptive)
+    peak = out.max(axis=(1, 2), keepdims=True)
+    np.divide(out, np.maximum(peak, 1e-6), out=out)
+    np.sqrt(out, out=out)
+    return out
+
+def render_spectrogram(valence: float, arousal: float, seed: int | None = None,
+                       height: int = DEFAULT_HEIGHT, width: int = DEFAULT_WIDTH) -> tuple[np.ndarray, Image.Image]:
+    """Un spectrogramme : (magnitudes float32, image couleur partageant son buffer RGBA)."""
+    mag = render_batch([(valence, arousal, seed)], height, width)[0]
+    return mag, to_rgb(mag, valence, arousal)
+
+def to_rgb(mag: np.ndarray, valence: float, arousal: float, out: np.ndarray | None = None) -> Image.Image:
+    """
+    Image couleur pour l'affichage (pochette) :
+    Valence -> rouge vers vert, Arousal -> sombre vers lumineux, énergie -> blanc.
+    Le résultat est une vue PIL (frombuffer) sur un buffer uint8 RGBA, sans copie
+    supplémentaire (Pillow ne sait pas mapper un buffer float32, d'où le passage en uint8).
+    """
+    h, w = mag.shape
+    if out is None:
+        out = np.empty((h, w, 4), dtype=np.uint8)
+    tint = np.array([(1 - valence) * 255, valence * 255, arousal * 255], dtype=np.float32)
+    m = mag[..., None]
+    # tint + (255 - tint) * m, converti directement dans le buffer de sortie
+    np.multiply(255.0 - tint, m, out=out[..., :3], casting="unsafe")
+    out[..., :3] += tint.astype(np.uint8)
+    out[..., 3] = 255
+    return Image.frombuffer("RGBA", (w, h), out, "raw", "RGBA", 0, 1)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""normalize() / tokenize() doivent rester équivalents à l'implémentation historique."""
+
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import nlp_emo
+from nlp_emo import _FOLD_TABLE, _normalize_reference, normalize, normalize_many, tokenize
+
+
+def test_every_codepoint_matches_reference():
+    size = len(_FOLD_TABLE)
+    mismatches = [cp for cp in range(sys.maxunicode + 1)
+                  if normalize(chr(cp)) != _normalize_reference(chr(cp))]
+    assert mismatches == []
+    # Les caractères hors plages précalculées ne sont pas mémorisés
+    assert len(_FOLD_TABLE) == size
+
+
+def test_random_strings_match_reference():
+    rng = random.Random(1234)
+    pools = [
+        "abcXYZ019 \t\n.,;:!?'\"-«»’…éèêàçœÆÉÏñß",
+        "".join(map(chr, range(0x20, 0x250))),
+        "".join(map(chr, range(0x250, 0x3000))),
+    ]
+    for _ in range(20000):
+        pool = rng.choice(pools)
+        n = rng.randint(0, 40)
+        if rng.random() < 0.2:
+            text = "".join(chr(rng.randint(0, sys.maxunicode)) for _ in range(n))
+        else:
+            text = "".join(rng.choice(pool) for _ in range(n))
+        expected = _normalize_reference(text)
+        assert normalize(text) == expected, repr(text)
+        assert tokenize(text) == expected.split(), repr(text)
+        assert normalize_many([text, text]) == [expected, expected]
+
+
+def test_sample_sentences():
+    assert normalize("  Ça, c'est TRÈS « joyeux » !  ") == "ca c est tres joyeux"
+    assert tokenize("L’été—déjà fini…") == ["l", "ete", "deja", "fini"]
+    assert nlp_emo.normalize("") == ""
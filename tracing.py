@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation légère : durées par étage, compteurs, jauges
+- span(nom) : bloc chronométré (with). Désactivé, c'est un objet partagé qui ne
+  fait rien : un appel de fonction et un test, pas d'allocation.
+- record(nom, secondes) : durée mesurée ailleurs (ex : callback de future).
+- count(nom) / gauge(nom, valeur) : compteurs (succès de cache...) et jauges
+  (profondeur de file...).
+- summary() / format_summary() : p50/p95/p99 glissants sur les `window` dernières
+  mesures de chaque étage (console d'ingénierie).
+- Export optionnel au format Chrome trace (chrome://tracing, Perfetto).
+Activation : enable(), ou variables d'environnement AI_STUDIO_TRACE=1 et
+AI_STUDIO_TRACE_FILE=trace.json (écrit à la sortie du programme).
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+_enabled = False
+_window = 512
+_lock = threading.Lock()
+_durations = {}          # nom -> deque des dernières durées (s)
+_totals = {}             # nom -> nombre total de mesures
+_counters = {}
+_gauges = {}             # nom -> (dernière valeur, max)
+_events = None           # deque d'événements Chrome trace, None = pas d'export
+_export_path = None
+_t0 = time.perf_counter()
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(window: int = 512, export_path: str | None = None, max_events: int = 200_000):
+    """Active la collecte ; export_path : fichier Chrome trace écrit à la sortie."""
+    global _enabled, _window, _events, _export_path
+    with _lock:
+        _window = window
+        if export_path:
+            if _export_path is None:
+                atexit.register(_export_at_exit)
+            _export_path = export_path
+            _events = deque(maxlen=max_events)
+        _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    with _lock:
+        _durations.clear(); _totals.clear(); _counters.clear(); _gauges.clear()
+        if _events is not None:
+            _events.clear()
+
+# =============================================================================
+# 1. MESURES
+# =============================================================================
+
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _add(self.name, end - self.start, self.start)
+        return False
+
+def span(name: str):
+    """Chronomètre un bloc : with tracing.span("render"): ..."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+def record(name: str, seconds: float, start: float | None = None):
+    """Ajoute une durée déjà mesurée (start : instant perf_counter de début, pour l'export)."""
+    if _enabled:
+        _add(name, seconds, start if start is not None else time.perf_counter() - seconds)
+
+def _add(name: str, seconds: float, start: float):
+    with _lock:
+        d = _durations.get(name)
+        if d is None or d.maxlen != _window:
+            d = _durations[name] = deque(d or (), maxlen=_window)
+        d.append(seconds)
+        _totals[name] = _totals.get(name, 0) + 1
+        if _events is not None:
+            _events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                            "ts": (start - _t0) * 1e6, "dur": seconds * 1e6})
+
+def count(name: str, n: int = 1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+def gauge(name: str, value: float):
+    if _enabled:
+        with _lock:
+            _, peak = _gauges.get(name, (value, value))
+            _gauges[name] = (value, max(peak, value))
+            if _events is not None:
+                _events.append({"name": name, "ph": "C", "pid": os.getpid(),
+                                "ts": (time.perf_counter() - _t0) * 1e6, "args": {name: value}})
+
+# =============================================================================
+# 2. RESTITUTION
+# =============================================================================
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+def summary() -> dict:
+    """{étage: {count, p50, p95, p99}} sur la fenêtre glissante + compteurs et jauges."""
+    with _lock:
+        windows = {name: sorted(d) for name, d in _durations.items()}
+        totals = dict(_totals)
+        counters = dict(_counters)
+        gauges = {k: {"value": v, "max": m} for k, (v, m) in _gauges.items()}
+    spans = {name: {"count": totals[name], "p50": _percentile(v, 0.50), "p95": _percentile(v, 0.95),
+                    "p99": _percentile(v, 0.99)} for name, v in windows.items() if v}
+    return {"spans": spans, "counters": counters, "gauges": gauges}
+
+def format_summary(order=("normalize", "lexicon_match", "prompt_build", "render", "vocoder",
+                          "pipeline_total", "ui_draw")) -> list[str]:
+    """Lignes [TRACE] pour la console (étages connus d'abord, dans l'ordre du pipeline)."""
+    s = summary()
+    names = [n for n in order if n in s["spans"]] + sorted(n for n in s["spans"] if n not in order)
+    lines = [f"[TRACE] {n:<14} n={s['spans'][n]['count']:<5} p50={s['spans'][n]['p50'] * 1e3:8.2f}ms "
+             f"p95={s['spans'][n]['p95'] * 1e3:8.2f}ms p99={s['spans'][n]['p99'] * 1e3:8.2f}ms" for n in names]
+    if s["counters"]:
+        lines.append("[TRACE] " + " ".join(f"{k}={v}" for k, v in sorted(s["counters"].items())))
+    if s["gauges"]:
+        lines.append("[TRACE] " + " ".join(f"{k}={g['value']} (max {g['max']})" for k, g in sorted(s["gauges"].items())))
+    return lines
+
+def export_chrome_trace(path: str) -> int:
+    """Écrit les événements collectés (JSON Chrome trace) ; renvoie leur nombre."""
+    with _lock:
+        events = list(_events or ())
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
+
+def _export_at_exit():
+    if _export_path and _events:
+        try:
+            export_chrome_trace(_export_path)
+        except OSError as e:
+            print(f"[WARN] Export de trace impossible ({_export_path}) : {e}")
+
+if os.environ.get("AI_STUDIO_TRACE", "") not in ("", "0") or os.environ.get("AI_STUDIO_TRACE_FILE"):
+    enable(export_path=os.environ.get("AI_STUDIO_TRACE_FILE") or None)
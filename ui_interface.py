@@ -1,31 +1,71 @@
 import customtkinter as ctk
 from PIL import Image
-import threading
-import time
+import queue
+import os
 import datetime 
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from backend_logic import AIController
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+# numpy, matplotlib et backend_logic (lexique, modèle) sont importés à la demande :
+# la fenêtre s'affiche avant leur chargement (voir init_backend / build_plot_figure)
+from session_history import SessionHistory
+from session_store import SessionStore
+import tracing
 
 # --- CONFIGURATION DU THEME ---
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")
 
 class AppInterface(ctk.CTk):
-    def __init__(self):
+    # Période de vidage de la file d'événements UI (ms)
+    UI_POLL_MS = 50
+    # Fenêtre temporelle affichée dans la vue signal (s)
+    PLOT_DURATION = 0.05
+    # WAV réel : plage minimale au zoom (s), facteur par cran de molette
+    SIGNAL_MIN_SPAN = 0.002
+    SIGNAL_ZOOM_STEP = 1.25
+    # Historique : lignes recyclées dans la sidebar, pochettes gardées prêtes à afficher
+    HISTORY_ROWS = 10
+    DISPLAY_CACHE_SIZE = 8
+    # Budget mémoire des images pleine résolution (au-delà : déversées sur disque)
+    HISTORY_MAX_BYTES = 64 * 1024 ** 2
+    # Archive persistante : dossier et taille des pages chargées depuis la base
+    SESSION_DIR = "sessions"
+    HISTORY_PAGE = 50
+
+    def __init__(self, on_phase=None):
+        t_init = time.perf_counter()
         super().__init__()
+        # on_phase(nom, secondes) : mesures de démarrage (main.py --profile-startup)
+        self.on_phase = on_phase
 
         # --- SETUP FENETRE PRINCIPALE ---
         self.title("Polytech AI Audio Studio")
         self.geometry("1350x850") 
         self.configure(fg_color="#121212") 
 
-        self.ai = AIController()
+        self.ai = None  # construit en arrière-plan (init_backend), GÉNÉRER bloqué d'ici là
         self.is_admin_unlocked = False
         self.is_playing = False
         self.view_mode = "COVER"
-        self.session_history = [] # Pour stocker les données
+        self.session_history = SessionHistory(max_bytes=self.HISTORY_MAX_BYTES) # Pour stocker les données
+        self.search_history = None  # résultats de la recherche en cours (modèle séparé), sinon None
+        self.history_offset = 0
+        self.display_cache = OrderedDict() # clé d'image -> CTkImage 400x400
+        self.store = None  # SessionStore, ouvert sur store_executor (open_store)
+        self.store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-store") # écritures dans l'ordre
+        self.history_cursor = None  # id de la plus ancienne session archivée chargée
+        self.history_more = False   # reste-t-il des pages plus anciennes ?
+        self.history_loading = None # historique dont une page est en cours de lecture
+        self.history_filter = None  # mots de la recherche en cours
+        self.history_saved = (None, False)  # (curseur, pages restantes) de l'historique pendant une recherche
+
+        # Exécuteur borné pour le démarrage et la vue Signal (les générations n'y attendent pas :
+        # leur résultat revient par un rappel du pipeline) + file d'événements vers la boucle Tk
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ui-work")
+        self.ui_events = queue.Queue()
+        self.request_seq = 0
+        self.current_handle = None  # lu et écrit sur le thread Tk uniquement
         self.grid_columnconfigure(0, weight=0, minsize=260) 
         self.grid_columnconfigure(1, weight=1) 
         
@@ -43,14 +83,36 @@ class AppInterface(ctk.CTk):
         self.sidebar_frame.grid_propagate(False) 
 
         # Titre Sidebar
-        ctk.CTkLabel(self.sidebar_frame, text="HISTORIQUE", font=("Arial", 14, "bold"), text_color="#666666").pack(pady=(30, 20), padx=20, anchor="w")
-
-        # Liste déroulante
-        self.scroll_history = ctk.CTkScrollableFrame(self.sidebar_frame, fg_color="transparent")
-        self.scroll_history.pack(fill="both", expand=True, padx=10, pady=10)
+        ctk.CTkLabel(self.sidebar_frame, text="HISTORIQUE", font=("Arial", 14, "bold"), text_color="#666666").pack(pady=(30, 10), padx=20, anchor="w")
+
+        # Recherche dans l'archive (texte et/ou nom d'émotion), Entrée pour valider
+        self.entry_history_search = ctk.CTkEntry(self.sidebar_frame, placeholder_text="Rechercher (texte, émotion)...",
+                                                 height=30, fg_color="#222", border_width=0, font=("Arial", 11))
+        self.entry_history_search.pack(fill="x", padx=10, pady=(0, 5))
+        self.entry_history_search.bind("<Return>", self.on_history_search)
+
+        # Liste virtualisée : un nombre fixe de lignes, réaffectées au défilement
+        self.history_list = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
+        self.history_list.pack(side="left", fill="both", expand=True, padx=(10, 0), pady=10)
+        self.history_scrollbar = ctk.CTkScrollbar(self.sidebar_frame, command=self.on_history_scroll)
+        self.history_scrollbar.pack(side="right", fill="y", pady=10)
+        for w in (self.history_list, self.sidebar_frame):
+            w.bind("<MouseWheel>", self.on_history_wheel)
+            w.bind("<Button-4>", self.on_history_wheel)
+            w.bind("<Button-5>", self.on_history_wheel)
+
+        self.history_rows = []
+        for _ in range(self.HISTORY_ROWS):
+            btn = ctk.CTkButton(self.history_list, text="", anchor="w", compound="left",
+                                fg_color="#2b2b2b", hover_color="#333333",
+                                height=50, width=220, font=("Arial", 11))
+            btn.bind("<MouseWheel>", self.on_history_wheel)
+            btn.bind("<Button-4>", self.on_history_wheel)
+            btn.bind("<Button-5>", self.on_history_wheel)
+            self.history_rows.append(btn)
         
         # Message vide par défaut
-        self.lbl_empty_hist = ctk.CTkLabel(self.scroll_history, text="Aucune génération...", text_color="#444", font=("Arial", 12, "italic"))
+        self.lbl_empty_hist = ctk.CTkLabel(self.history_list, text="Aucune génération...", text_color="#444", font=("Arial", 12, "italic"))
         self.lbl_empty_hist.pack(pady=20)
 
 
@@ -95,20 +157,17 @@ class AppInterface(ctk.CTk):
                                       font=("Arial", 16), text_color="#555555")
         self.lbl_image.place(relx=0.5, rely=0.5, anchor="center")
 
-        # MODE B : GRAPHES 
+        # MODE B : GRAPHES (figure matplotlib construite au premier affichage)
         self.graph_frame = ctk.CTkFrame(self.visual_container, fg_color="transparent")
-        self.fig, self.axs = plt.subplots(1, 2, figsize=(10, 4), facecolor='#121212')
-        self.fig.subplots_adjust(wspace=0.25, left=0.10, right=0.95, top=0.85, bottom=0.25)
-        
-        for ax in self.axs:
-            ax.set_facecolor('#1e1e1e')
-            ax.tick_params(axis='x', colors='#888888', labelsize=9)
-            ax.tick_params(axis='y', colors='#888888', labelsize=9)
-            for spine in ax.spines.values(): spine.set_color('#333333')
-            ax.grid(True, color='#333333', linestyle='--', alpha=0.5)
-
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.graph_frame)
-        self.canvas.get_tk_widget().pack(expand=True, fill="both", pady=10)
+        self.fig = None
+        self.pending_plot = "neutre"  # émotion à tracer dès que la figure existe
+        # WAV affiché : pyramide min/max + STFT (waveform_pyramid), ouverte hors du thread Tk
+        self.signal = None
+        self.signal_path = None
+        self.signal_emotion = "neutre"  # repli si la pyramide ne peut pas être construite
+        self.signal_view = (0.0, 0.0)   # plage affichée (s)
+        self.signal_drag = None
+        self.signal_redraw_pending = False
 
 
         # =================================================
@@ -147,15 +206,26 @@ class AppInterface(ctk.CTk):
         self.entry_text = ctk.CTkEntry(self.input_container, width=400, height=45, placeholder_text="Décris l'émotion ou le son...", 
                                        corner_radius=25, border_width=0, fg_color="#2a2a2a", text_color="white", font=("Arial", 14))
         self.entry_text.pack(side="left", padx=(0, 15))
-        self.btn_run = ctk.CTkButton(self.input_container, text="GÉNÉRER", height=45, width=140, corner_radius=25, 
-                                     fg_color="#1db954", hover_color="#1ed760", font=("Arial", 13, "bold"), text_color="black", 
-                                     command=self.on_generate_click)
+        self.btn_run = ctk.CTkButton(self.input_container, text="CHARGEMENT...", height=45, width=140, corner_radius=25, 
+                                     fg_color="#555555", hover_color="#1ed760", font=("Arial", 13, "bold"), text_color="black", 
+                                     state="disabled", command=self.on_generate_click)
         self.btn_run.pack(side="left")
 
         # Console 
         self.frame_details = ctk.CTkFrame(self, fg_color="#000000", height=200, corner_radius=0)
         self.setup_admin_panel()
 
+        self.after(self.UI_POLL_MS, self.poll_ui_events)
+
+        # Archive : ouverture de la base puis dernière page, sur le thread d'écriture (dans l'ordre) ;
+        # la sidebar est remplie à l'arrivée, le reste est chargé en remontant la liste
+        self.store_executor.submit(self.open_store)
+        self.load_history_page()
+
+        # Contrôleur, lexique et modèle : chargés hors du thread Tk
+        self.report_phase("window", time.perf_counter() - t_init)
+        self.executor.submit(self.init_backend)
+
 
     # --- LOGIQUE ADMIN ---
     def setup_admin_panel(self):
@@ -190,9 +260,41 @@ class AppInterface(ctk.CTk):
                 login.destroy()
         ctk.CTkButton(login, text="Unlock", fg_color="#333", command=check).pack(pady=10)
 
+    # --- DÉMARRAGE EN ARRIÈRE-PLAN ---
+    def report_phase(self, name, seconds):
+        if self.on_phase is not None: self.on_phase(name, seconds)
+
+    def init_backend(self):
+        """Thread du pool : import du backend, contrôleur + lexique, préchauffage du modèle."""
+        try:
+            t = time.perf_counter()
+            from backend_logic import AIController
+            self.report_phase("import backend", time.perf_counter() - t)
+            t = time.perf_counter()
+            ai = AIController()
+            self.report_phase("controller + lexicon", time.perf_counter() - t)
+            t = time.perf_counter()
+            ai.generator.wait_ready()
+            self.report_phase("model warm-up", time.perf_counter() - t)
+        except Exception as e:
+            self.ui_events.put(("startup_error", None, str(e)))
+            return
+        self.ui_events.put(("ready", None, ai))
+        # Préchargement des modules de la vue Signal (imports seulement, pas de widget hors thread Tk)
+        t = time.perf_counter()
+        import matplotlib.figure
+        import matplotlib.backends.backend_tkagg
+        self.report_phase("import matplotlib", time.perf_counter() - t)
+
+    def on_backend_ready(self, ai):
+        self.ai = ai
+        self.btn_run.configure(state="normal", text="GÉNÉRER", fg_color="#1db954")
+        self.report_phase("ready", None)
+
     # --- LOGIQUE VISUELLE ---
     def toggle_view_mode(self):
         if self.view_mode == "COVER":
+            if self.fig is None: self.build_plot_figure()
             self.cover_frame.grid_forget()
             self.graph_frame.grid(row=0, column=0, sticky="nsew")
             self.view_mode = "GRAPH"
@@ -203,113 +305,517 @@ class AppInterface(ctk.CTk):
             self.view_mode = "COVER"
             self.btn_view.configure(text="Signal", fg_color="#333333")
 
-    def update_plots(self, emotion_label="neutre"):
-        self.axs[0].clear(); self.axs[1].clear()
+    def build_plot_figure(self):
+        """Figure + canevas Tk (thread Tk uniquement), au premier passage en vue Signal."""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.fig = Figure(figsize=(10, 4), facecolor='#121212')
+        self.axs = self.fig.subplots(1, 2)
+        self.fig.subplots_adjust(wspace=0.25, left=0.10, right=0.95, top=0.85, bottom=0.25)
+        
         for ax in self.axs:
             ax.set_facecolor('#1e1e1e')
+            ax.tick_params(axis='x', colors='#888888', labelsize=9)
+            ax.tick_params(axis='y', colors='#888888', labelsize=9)
+            for spine in ax.spines.values(): spine.set_color('#333333')
             ax.grid(True, color='#333333', linestyle='--', alpha=0.5)
-        
-        fs = 44100; duration = 0.05
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.graph_frame)
+        self.canvas.get_tk_widget().pack(expand=True, fill="both", pady=10)
+        self.init_plot_artists()
+        if self.signal is not None: self.draw_signal()
+        else: self.update_plots(self.pending_plot)
+
+    def init_plot_artists(self):
+        """Artistes persistants : mis à jour par set_data puis blittés sur un fond en cache."""
+        self.axs[0].set_title("Amplitude (Time Domain)", color='white', fontsize=10, pad=10)
+        self.axs[1].set_title("Spectrum (Frequency Domain)", color='white', fontsize=10, pad=10)
+        self.axs[1].set_xlabel("Frequency (Hz)", color='#888888', fontsize=9)
+        # Spectre normalisé (pas de graduations en Y) : échelle fixe, le fond reste valide
+        self.axs[1].set_ylim(0, 1.1); self.axs[1].set_yticks([])
+        self.set_plot_axes()
+
+        self.line_wave, = self.axs[0].plot([], [], color='#1db954', linewidth=1.5, animated=True)
+        self.fill_spec = self.axs[1].fill_between([0, 1], [0, 0], color='#1db954', alpha=0.3, animated=True)
+        self.line_spec, = self.axs[1].plot([], [], color='white', linewidth=1, animated=True)
+        self.plot_artists = (self.line_wave, self.fill_spec, self.line_spec)
+
+        self.plot_background = None
+        self.plot_class = None
+        self.plot_cache = {}
+        self.canvas.mpl_connect("draw_event", self.on_plot_draw)
+        # Zoom (molette) et défilement (glisser) sur la forme d'onde d'un WAV réel
+        self.canvas.mpl_connect("scroll_event", self.on_signal_scroll)
+        self.canvas.mpl_connect("button_press_event", self.on_signal_press)
+        self.canvas.mpl_connect("motion_notify_event", self.on_signal_drag)
+        self.canvas.mpl_connect("button_release_event", self.on_signal_release)
+
+    def set_plot_axes(self, signal=None):
+        """Échelles : clip de démonstration (ms, 0-2 kHz) ou WAV réel (s, jusqu'à Nyquist)."""
+        if signal is None:
+            self.axs[0].set_xlabel("Time (ms)", color='#888888', fontsize=9)
+            self.axs[0].set_xlim(0, self.PLOT_DURATION * 1000); self.axs[0].set_ylim(-1.5, 1.5)
+            self.axs[1].set_xlim(0, 2000)
+        else:
+            self.axs[0].set_xlabel("Time (s)", color='#888888', fontsize=9)
+            self.axs[0].set_ylim(-1.05, 1.05)
+            self.axs[1].set_xlim(0, signal.sample_rate / 2)
+        # WAV réel : l'axe des temps suit le zoom/défilement, il est blitté avec les artistes
+        # (hors du fond en cache) plutôt que de forcer un rendu complet à chaque geste
+        self.axs[0].xaxis.set_animated(signal is not None)
+
+    def on_plot_draw(self, event=None):
+        """Après chaque rendu complet (1er affichage, resize) : fond en cache + artistes."""
+        self.plot_background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.blit_plot_artists(restore=False)
+
+    def blit_plot_artists(self, restore=True):
+        if restore: self.canvas.restore_region(self.plot_background)
+        if self.axs[0].xaxis.get_animated(): self.axs[0].draw_artist(self.axs[0].xaxis)
+        self.axs[0].draw_artist(self.line_wave)
+        self.axs[1].draw_artist(self.fill_spec); self.axs[1].draw_artist(self.line_spec)
+        self.canvas.blit(self.fig.bbox)
+
+    @staticmethod
+    def emotion_class(emotion_label):
+        if "calme" in emotion_label or "triste" in emotion_label: return "calme"
+        if "colere" in emotion_label or "peur" in emotion_label: return "tension"
+        return "vif"
+
+    @staticmethod
+    def decimate_minmax(x, y, n_px):
+        """Garde min et max par colonne de pixels : même silhouette, au plus 2*n_px points."""
+        import numpy as np
+        if len(y) <= 2 * n_px: return x, y
+        k = -(-len(y) // n_px); m = -(-len(y) // k)
+        yb = np.pad(y, (0, m * k - len(y)), mode="edge").reshape(m, k)
+        xs = np.repeat(x[::k], 2); ys = np.empty(2 * m, dtype=y.dtype)
+        ys[0::2] = yb.min(axis=1); ys[1::2] = yb.max(axis=1)
+        return xs, ys
+
+    def plot_data(self, emo_class):
+        """Forme d'onde + spectre (rfft) par classe d'émotion, calculés une seule fois."""
+        if emo_class in self.plot_cache: return self.plot_cache[emo_class]
+        import numpy as np
+        fs = 44100; duration = self.PLOT_DURATION
         t = np.linspace(0, duration, int(fs*duration))
-        freq_base = 440
-        if "calme" in emotion_label or "triste" in emotion_label:
+        if emo_class == "calme":
             freq_base = 220
             y = 0.8 * np.sin(2 * np.pi * freq_base * t)
-        elif "colere" in emotion_label or "peur" in emotion_label:
+        elif emo_class == "tension":
             freq_base = 150
-            y = 0.6 * np.sign(np.sin(2 * np.pi * freq_base * t)) + 0.3 * np.random.normal(0, 1, len(t))
+            noise = np.random.default_rng(0).normal(0, 1, len(t))
+            y = 0.6 * np.sign(np.sin(2 * np.pi * freq_base * t)) + 0.3 * noise
         else:
             freq_base = 880
             y = 0.5 * np.sin(2 * np.pi * freq_base * t) + 0.3 * np.sin(2 * np.pi * (freq_base*1.5) * t)
 
-        self.axs[0].plot(t*1000, y, color='#1db954', linewidth=1.5)
-        self.axs[0].set_title("Amplitude (Time Domain)", color='white', fontsize=10, pad=10)
-        self.axs[0].set_xlabel("Time (ms)", color='#888888', fontsize=9)
-        self.axs[0].set_ylim(-1.5, 1.5)
-
-        t_long = np.linspace(0, 1, fs)
-        if "calme" in emotion_label: y_long = 0.8 * np.sin(2 * np.pi * freq_base * t_long)
-        else: y_long = y
-        N = len(y); yf = np.fft.fft(y); xf = np.fft.fftfreq(N, 1/fs)[:N//2]
-        mag = 2.0/N * np.abs(yf[0:N//2])
+        N = len(y); xf = np.fft.rfftfreq(N, 1/fs)[:N//2]
+        mag = 2.0/N * np.abs(np.fft.rfft(y)[:N//2])
+        # Décimation à la largeur en pixels : reste fluide même sur un clip de 10 s
+        n_px = max(int(self.fig.get_figwidth() * self.fig.dpi / 2), 200)
+        wave = self.decimate_minmax(t * 1000, y, n_px)
+        band = xf <= 2000
+        spec = self.decimate_minmax(xf[band], mag[band] / (mag.max() or 1.0), n_px)
+        data = (wave, spec)
+        self.plot_cache[emo_class] = data
+        return data
 
-        self.axs[1].fill_between(xf, mag, color='#1db954', alpha=0.3)
-        self.axs[1].plot(xf, mag, color='white', linewidth=1)
-        self.axs[1].set_title("Spectrum (Frequency Domain)", color='white', fontsize=10, pad=10)
-        self.axs[1].set_xlabel("Frequency (Hz)", color='#888888', fontsize=9)
-        self.axs[1].set_xlim(0, 2000); self.axs[1].set_yticks([])
-        self.canvas.draw()
+    def update_plots(self, emotion_label="neutre"):
+        if self.fig is None:
+            self.pending_plot = emotion_label  # tracé au premier affichage de la vue Signal
+            return
+        emo_class = self.emotion_class(emotion_label)
+        if emo_class == self.plot_class: return  # rien n'a changé à l'écran
+        (t_ms, y), (xf, mag) = self.plot_data(emo_class)
+        was_signal = self.plot_class == "signal"
+        if was_signal: self.set_plot_axes()
+
+        self.line_wave.set_data(t_ms, y)
+        self.set_spectrum(xf, mag)
+        self.plot_class = emo_class
+
+        if self.plot_background is None or was_signal:
+            self.canvas.draw_idle()  # 1er affichage ou changement d'échelle : rendu complet, le fond est capturé
+        else:
+            self.blit_plot_artists()
+
+    def set_spectrum(self, xf, mag):
+        import numpy as np
+        self.line_spec.set_data(xf, mag)
+        verts = np.column_stack([np.concatenate([xf, xf[::-1]]), np.concatenate([mag, np.zeros_like(mag)])])
+        self.fill_spec.set_verts([verts])
+
+    # --- VUE SIGNAL : WAV REEL (PYRAMIDE) ---
+    def show_signal(self, audio, emotion):
+        """Trace le WAV généré (pyramide ouverte en arrière-plan), sinon le clip de l'émotion."""
+        self.signal = None
+        self.signal_path = None
+        self.signal_emotion = emotion
+        if audio and os.path.exists(audio):
+            self.signal_path = str(audio)
+            self.executor.submit(self.open_signal, self.signal_path)
+        else:
+            self.update_plots(emotion)
+
+    def open_signal(self, path):
+        """Thread du pool : construit (1re fois) ou relit la pyramide à côté du WAV."""
+        try:
+            from waveform_pyramid import SignalPyramid
+            pyramid = SignalPyramid.open(path)
+        except (OSError, ValueError) as e:
+            self.ui_events.put(("signal_error", None, (path, str(e))))
+            return
+        self.ui_events.put(("signal", None, pyramid))
+
+    def on_signal_ready(self, pyramid):
+        if str(pyramid.audio_path) != self.signal_path: return  # un autre WAV a été demandé depuis
+        self.signal = pyramid
+        self.signal_view = (0.0, pyramid.duration)
+        if self.fig is not None: self.draw_signal()
+
+    def on_signal_error(self, path, message):
+        if path != self.signal_path: return
+        self.textbox_logs.insert("end", f"[WARN] Signal indisponible ({path}) : {message}\n")
+        self.signal_path = None
+        self.update_plots(self.signal_emotion)
+
+    def draw_signal(self):
+        """Plage signal_view : seul le niveau de pyramide adapté à la largeur en pixels est lu."""
+        import numpy as np
+        t0, t1 = self.signal_view
+        n_px = max(int(self.axs[0].bbox.width), 100)
+        t, lo, hi = self.signal.envelope(t0, t1, n_px)
+        ys = np.empty(2 * len(t), dtype=np.float32)
+        ys[0::2] = lo; ys[1::2] = hi
+        self.line_wave.set_data(np.repeat(t, 2), ys)
+        # Spectre moyen de la plage visible (niveau STFT grossier)
+        xf, mag = self.signal.mean_spectrum(t0, t1)
+        self.set_spectrum(*self.decimate_minmax(xf, mag / (mag.max() or 1.0), n_px))
+
+        rescale = self.plot_class != "signal"
+        if rescale:
+            self.set_plot_axes(self.signal)
+            self.plot_class = "signal"
+        self.axs[0].set_xlim(t0, max(t1, t0 + self.SIGNAL_MIN_SPAN))
+        if self.plot_background is None or rescale:
+            self.canvas.draw_idle()  # 1er affichage ou changement d'échelle : rendu complet, le fond est capturé
+        else:
+            self.blit_plot_artists()  # zoom/défilement : fond en cache + artistes et axe des temps
+
+    def set_signal_view(self, t0, t1):
+        duration = self.signal.duration
+        span = min(max(t1 - t0, self.SIGNAL_MIN_SPAN), duration)
+        t0 = min(max(t0, 0.0), duration - span)
+        self.signal_view = (t0, t0 + span)
+        # Regroupe les événements souris d'une même itération de la boucle Tk
+        if not self.signal_redraw_pending:
+            self.signal_redraw_pending = True
+            self.after_idle(self.flush_signal_view)
+
+    def flush_signal_view(self):
+        self.signal_redraw_pending = False
+        if self.signal is not None: self.draw_signal()
+
+    def on_signal_scroll(self, event):
+        if self.signal is None or event.inaxes is not self.axs[0] or event.xdata is None: return
+        factor = 1 / self.SIGNAL_ZOOM_STEP if event.button == "up" else self.SIGNAL_ZOOM_STEP
+        t0, t1 = self.signal_view
+        # Zoom centré sur le curseur
+        self.set_signal_view(event.xdata - (event.xdata - t0) * factor, event.xdata + (t1 - event.xdata) * factor)
+
+    def on_signal_press(self, event):
+        if self.signal is None or event.inaxes is not self.axs[0] or event.button != 1: return
+        if event.dblclick:
+            self.set_signal_view(0.0, self.signal.duration)  # double-clic : vue complète
+            return
+        self.signal_drag = (event.x, self.signal_view)
+
+    def on_signal_drag(self, event):
+        if self.signal_drag is None or event.x is None: return
+        x0, (t0, t1) = self.signal_drag
+        dt = (event.x - x0) * (t1 - t0) / max(self.axs[0].bbox.width, 1)
+        self.set_signal_view(t0 - dt, t1 - dt)
+
+    def on_signal_release(self, event):
+        self.signal_drag = None
 
     # --- LOGIQUE GENERATION ---
     def on_generate_click(self):
         text = self.entry_text.get()
-        if not text: return
-        self.btn_run.configure(state="disabled", text="CALCUL...", fg_color="#555555")
+        if not text or self.ai is None: return
+        seq = self.request_seq + 1
+        try:
+            # Non bloquant : la boucle Tk n'attend jamais la file du pipeline
+            handle = self.ai.submit(text, on_progress=lambda e: self.ui_events.put(("progress", seq, e.progress)),
+                                    block=False)
+        except queue.Full:
+            # La demande en cours continue : elle n'est remplacée que si la nouvelle est acceptée
+            self.textbox_logs.insert("end", "[WARN] Pipeline saturé, réessayez dans un instant\n")
+            return
+        # La nouvelle demande remplace la précédente (annulée si pas encore servie)
+        self.request_seq = seq
+        if self.current_handle is not None: self.current_handle.cancel()
+        self.current_handle = handle
+        self.btn_run.configure(text="CALCUL...", fg_color="#555555")
         self.lbl_track_title.configure(text=text, text_color="#aaaaaa")
         self.audio_controls.pack_forget(); self.progress_bar.pack(); self.progress_bar.set(0)
-        threading.Thread(target=self.run_process, args=(text,)).start()
-
-    def run_process(self, text):
-        for i in range(20): time.sleep(0.05); self.progress_bar.set((i+1)/20)
-        prompt, img, audio = self.ai.process_pipeline(text)
-        self.after(0, self.show_results, prompt, img, audio, text)
+        handle.future.add_done_callback(lambda f: self.on_generation_done(seq, text, f))
+
+    def on_generation_done(self, seq, text, future):
+        """Rappel du future (thread du pipeline) : ne touche jamais aux widgets, tout passe par ui_events."""
+        if future.cancelled(): return
+        try:
+            prompt, img, audio = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            self.ui_events.put(("error", seq, str(e)))
+            return
+        self.ui_events.put(("result", seq, (prompt, img, audio, text)))
+
+    def poll_ui_events(self):
+        """Boucle Tk : applique par lots les événements venus des threads de travail."""
+        progress = None
+        try:
+            while True:
+                kind, seq, payload = self.ui_events.get_nowait()
+                if kind == "ready": self.on_backend_ready(payload); continue
+                if kind == "signal": self.on_signal_ready(payload); continue
+                if kind == "signal_error": self.on_signal_error(*payload); continue
+                if kind == "history_page": self.on_history_page(*payload); continue
+                if kind == "startup_error":
+                    self.textbox_logs.insert("end", f"[ERROR] Initialisation du backend : {payload}\n")
+                    self.btn_run.configure(text="INDISPONIBLE"); continue
+                if seq != self.request_seq: continue  # demande remplacée entre-temps
+                if kind == "progress": progress = payload
+                elif kind == "result": progress = None; self.current_handle = None; self.show_results(*payload)
+                elif kind == "error": progress = None; self.current_handle = None; self.show_error(payload)
+        except queue.Empty:
+            pass
+        if progress is not None: self.progress_bar.set(progress)
+        self.after(self.UI_POLL_MS, self.poll_ui_events)
+
+    def show_error(self, message):
+        self.textbox_logs.insert("end", f"[ERROR] {message}\n")
+        self.lbl_track_title.configure(text="Erreur de génération", text_color="#ff5555")
+        self.progress_bar.pack_forget()
+        self.btn_run.configure(state="normal", text="GÉNÉRER", fg_color="#1db954")
 
     def show_results(self, prompt, img, audio, original_text):
 
-        ctk_img = ctk.CTkImage(light_image=img, dark_image=img, size=(400, 400))
-        self.lbl_image.configure(image=ctk_img, text="")
         self.lbl_track_title.configure(text=original_text, text_color="white")
         self.entry_prompt_debug.delete(0, "end"); self.entry_prompt_debug.insert(0, f"PROMPT> {prompt}")
         self.textbox_logs.delete("0.0", "end"); self.textbox_logs.insert("end", f"[SUCCESS] Audio generated at {audio}\n")
+        st = self.ai.result_cache.stats()
+        self.textbox_logs.insert("end", f"[CACHE] hits={st['hits']} misses={st['misses']} stores={st['stores']} evictions={st['evictions']}\n")
+        sf = self.ai.single_flight.stats()
+        self.textbox_logs.insert("end", f"[DEDUP] requests={sf['requests']} collapsed={sf['collapsed']}\n")
         
         emo = "neutre"
         if "[emotion:" in prompt: emo = prompt.split("[emotion:")[1].split("]")[0]
-        self.update_plots(emo)
+        with tracing.span("ui_draw"):
+            self.show_signal(audio, emo)
 
-        self.progress_bar.pack_forget(); self.audio_controls.pack()
-        self.btn_run.configure(state="normal", text="GÉNÉRER", fg_color="#1db954")
+            self.progress_bar.pack_forget(); self.audio_controls.pack()
+            self.btn_run.configure(state="normal", text="GÉNÉRER", fg_color="#1db954")
 
-        self.add_to_history(original_text, prompt, emo, img, audio)
+            entry = self.add_to_history(original_text, prompt, emo, img, audio)
+            self.lbl_image.configure(image=self.display_image(entry), text="")
+        # Percentiles glissants par étage (AI_STUDIO_TRACE=1)
+        for line in tracing.format_summary() if tracing.enabled() else ():
+            self.textbox_logs.insert("end", line + "\n")
 
     # --- GESTION HISTORIQUE ---
+    @property
+    def shown_history(self):
+        """Liste affichée dans la sidebar : résultats de la recherche, sinon l'historique"""
+        return self.search_history if self.search_history is not None else self.session_history
+
     def add_to_history(self, text, prompt, emotion, img, audio):
-        """Crée un bouton dans la sidebar pour rappeler cette session"""
-        self.lbl_empty_hist.pack_forget() 
-        
+        """Enregistre la session (vignette + image pleine résolution paresseuse) et l'affiche dans la sidebar"""
         # Capture de l'heure
         now = datetime.datetime.now().strftime("%H:%M")
-        
-        # Sauvegarde des données
-        session_data = {
-            "text": text, "prompt": prompt, "emotion": emotion,
-            "img": img, "audio": audio, "time": now
-        }
-        self.session_history.append(session_data)
-        
-        # Création du bouton visuel
-        idx = len(self.session_history) - 1
-        
-        btn_text = f"{now} | {emotion.upper()}\n{text[:25]}..."
-        btn = ctk.CTkButton(self.scroll_history, text=btn_text, anchor="w",
-                            fg_color="#2b2b2b", hover_color="#333333",
-                            height=50, width=220, font=("Arial", 11),
-                            command=lambda i=idx: self.restore_session(i))
-        btn.pack(pady=5, padx=5)
-
-    def restore_session(self, index):
+        idx = self.session_history.append(text, prompt, emotion, img, audio, now)
+        entry = self.session_history[idx]
+        self.store_executor.submit(self.persist_session, entry, img)
+
+        # Défilement automatique vers la dernière entrée (la vue d'une recherche reste inchangée)
+        if self.search_history is None:
+            self.history_offset = max(0, len(self.session_history) - self.HISTORY_ROWS)
+            self.refresh_history_rows()
+        return entry
+
+    def refresh_history_rows(self):
+        """Réaffecte les lignes du pool aux entrées visibles (history_offset...)"""
+        history = self.shown_history
+        n = len(history)
+        for slot, btn in enumerate(self.history_rows):
+            idx = self.history_offset + slot
+            if idx >= n:
+                btn.pack_forget()
+                continue
+            entry = history[idx]
+            thumb = entry.extra.get("thumb")
+            if thumb is None and entry.thumbnail is not None:
+                thumb = ctk.CTkImage(light_image=entry.thumbnail, dark_image=entry.thumbnail, size=(48, 24))
+                entry.extra["thumb"] = thumb
+            btn.configure(text=f"{entry.time} | {entry.emotion.upper()}\n{entry.text[:25]}...", image=thumb,
+                          command=lambda e=entry: self.restore_session(e))
+            if not btn.winfo_ismapped():
+                btn.pack(pady=5, padx=5)
+        if n:
+            self.lbl_empty_hist.pack_forget()
+            self.history_scrollbar.set(self.history_offset / n, min(1.0, (self.history_offset + self.HISTORY_ROWS) / n))
+        else:
+            self.lbl_empty_hist.configure(text="Aucun résultat..." if self.search_history is not None else "Aucune génération...")
+            self.lbl_empty_hist.pack(pady=20)
+            self.history_scrollbar.set(0.0, 1.0)
+
+    def scroll_history_to(self, offset):
+        offset = max(0, min(int(offset), len(self.shown_history) - self.HISTORY_ROWS))
+        if offset != self.history_offset:
+            self.history_offset = offset
+            self.refresh_history_rows()
+        # Arrivé en haut de la liste : page suivante de l'archive
+        if offset == 0 and self.history_more:
+            self.load_history_page()
+
+    def on_history_scroll(self, action, value, unit=None):
+        """Callback de la scrollbar : ("moveto", fraction) ou ("scroll", n, "units"/"pages")"""
+        if action == "moveto":
+            self.scroll_history_to(round(float(value) * len(self.shown_history)))
+        elif action == "scroll":
+            step = self.HISTORY_ROWS if unit == "pages" else 1
+            self.scroll_history_to(self.history_offset + int(value) * step)
+
+    def on_history_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_history_to(self.history_offset - 1)
+        else:
+            self.scroll_history_to(self.history_offset + 1)
+
+    def display_image(self, entry):
+        """Pochette 400x400 d'une entrée, gardée dans un petit cache LRU (None si l'image est absente)"""
+        handle = entry.result
+        if handle is None:
+            return None
+        ctk_img = self.display_cache.get(handle.key)
+        if ctk_img is not None:
+            self.display_cache.move_to_end(handle.key)
+            return ctk_img
+        try:
+            img = handle.get()
+        except OSError:
+            return None
+        ctk_img = ctk.CTkImage(light_image=img, dark_image=img, size=(400, 400))
+        self.display_cache[handle.key] = ctk_img
+        while len(self.display_cache) > self.DISPLAY_CACHE_SIZE:
+            self.display_cache.popitem(last=False)
+        return ctk_img
+
+    # --- ARCHIVE (SessionStore) ---
+    def open_store(self):
+        """Thread d'écriture : ouverture de la base (création / migration du schéma)"""
+        try:
+            self.store = SessionStore(self.SESSION_DIR)
+        except Exception as e:
+            print(f"[WARN] Archive des sessions indisponible : {e}")
+
+    def persist_session(self, entry, img):
+        """Thread d'écriture : ajoute la session à la base"""
+        if self.store is None: return
+        try:
+            image_path = self.store.save_image(img)
+            # L'historique relira ce PNG au lieu d'en déverser une seconde copie
+            if entry.result is not None and entry.result.path is None:
+                entry.result.path = image_path
+            entry.store_id = self.store.add(entry.text, entry.prompt, entry.emotion, audio=entry.audio,
+                                            time_label=entry.time, thumbnail=entry.thumbnail,
+                                            image_path=image_path)
+        except Exception as e:
+            print(f"[WARN] Archivage de la session impossible : {e}")
+
+    def load_history_page(self):
+        """Demande la page suivante (plus ancienne) de l'archive, ajoutée en tête de la liste à son arrivée"""
+        history = self.shown_history
+        if self.history_loading is history: return
+        self.history_loading = history
+        self.store_executor.submit(self.fetch_history_page, history, self.history_cursor, self.history_filter)
+
+    def fetch_history_page(self, history, cursor, words):
+        """Thread d'écriture : lecture de la page et décodage des vignettes, hors du thread Tk"""
+        sessions, thumbs = [], []
+        try:
+            if self.store is not None:
+                text, emotion = None, None
+                if words:
+                    # Un mot qui est une émotion de l'archive filtre par émotion, le reste par texte
+                    emotions = set(self.store.emotions())
+                    emotion = next((w.lower() for w in words if w.lower() in emotions), None)
+                    text = " ".join(w for w in words if w.lower() != emotion) or None
+                sessions = self.store.page(cursor, self.HISTORY_PAGE, text=text, emotion=emotion)
+                thumbs = [st.thumbnail_image() for st in sessions]
+        except Exception as e:
+            print(f"[WARN] Lecture de l'archive impossible : {e}")
+            sessions, thumbs = [], []
+        self.ui_events.put(("history_page", None, (history, sessions, thumbs)))
+
+    def on_history_page(self, history, sessions, thumbs):
+        if self.history_loading is history: self.history_loading = None
+        if history is not self.shown_history: return  # recherche remplacée entre-temps
+        self.history_more = len(sessions) == self.HISTORY_PAGE
+        if not sessions:
+            if not len(history):
+                self.refresh_history_rows()
+            return
+        self.history_cursor = sessions[-1].id
+        added = history.prepend_stored(sessions, thumbs)
+        # Les index se décalent : on garde les mêmes lignes à l'écran (sauf au premier chargement)
+        if len(history) == added:
+            self.history_offset = max(0, added - self.HISTORY_ROWS)
+        else:
+            self.history_offset += added
+        self.refresh_history_rows()
+
+    def on_history_search(self, event=None):
+        """
+        Affiche les résultats de la recherche dans une liste à part (vide = retour à l'historique,
+        qui continue de recevoir les nouvelles générations)
+        """
+        words = self.entry_history_search.get().split()
+        if self.search_history is None:
+            self.history_saved = (self.history_cursor, self.history_more)
+        if not words:
+            self.search_history = None
+            self.history_filter = None
+            self.history_cursor, self.history_more = self.history_saved
+            self.history_offset = max(0, len(self.session_history) - self.HISTORY_ROWS)
+            self.refresh_history_rows()
+            return
+        self.search_history = SessionHistory(max_bytes=self.HISTORY_MAX_BYTES)
+        self.history_filter = words
+        self.history_cursor = None
+        self.history_more = False
+        self.history_offset = 0
+        self.load_history_page()
+
+    def restore_session(self, data):
         """Recharge une ancienne session quand on clique dessus"""
-        data = self.session_history[index]
         
-        self.lbl_track_title.configure(text=data["text"], text_color="white")
-        self.entry_text.delete(0, "end"); self.entry_text.insert(0, data["text"])
+        self.lbl_track_title.configure(text=data.text, text_color="white")
+        self.entry_text.delete(0, "end"); self.entry_text.insert(0, data.text)
         
-        ctk_img = ctk.CTkImage(light_image=data["img"], dark_image=data["img"], size=(400, 400))
-        self.lbl_image.configure(image=ctk_img, text="")
+        ctk_img = self.display_image(data)
+        if ctk_img is not None:
+            self.lbl_image.configure(image=ctk_img, text="")
+        else:
+            self.lbl_image.configure(image="", text="IMAGE INDISPONIBLE")
         
-        self.entry_prompt_debug.delete(0, "end"); self.entry_prompt_debug.insert(0, f"PROMPT> {data['prompt']}")
-        self.textbox_logs.insert("end", f"[RESTORE] Loaded session from {data['time']}\n")
+        self.entry_prompt_debug.delete(0, "end"); self.entry_prompt_debug.insert(0, f"PROMPT> {data.prompt}")
+        self.textbox_logs.insert("end", f"[RESTORE] Loaded session from {data.time}\n")
         
-        self.update_plots(data["emotion"])
+        self.show_signal(data.audio, data.emotion)
         
         self.progress_bar.pack_forget()
         self.audio_controls.pack()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Vocodeur : spectrogramme -> audio (Griffin-Lim NumPy)
+- STFT / ISTFT vectorisées (fenêtres glissantes + overlap-add).
+- Griffin-Lim "rapide" (momentum) avec nombre d'itérations réglable
+  (compromis qualité / latence) et arrêt anticipé à convergence.
+- Reconstruction par blocs de trames : chaque bloc est écrit dans le WAV
+  dès qu'il est prêt, la forme d'onde complète n'est jamais en mémoire.
+  Les blocs se recouvrent (contexte), la phase est propagée d'un bloc à
+  l'autre et les jonctions sont fondues enchaînées.
+"""
+
+import math
+import os
+import uuid
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+@dataclass(frozen=True)
+class VocoderConfig:
+    sample_rate: int = 24000     # 24kHz, comme annoncé dans le prompt
+    duration: float = 10.0       # 10s
+    n_fft: int = 1024
+    hop: int = 256               # n_fft doit être un multiple de hop
+    n_iter: int = 32             # qualité / latence
+    tol: float = 1e-3            # arrêt si la convergence spectrale progresse moins que ça
+    momentum: float = 0.99       # Griffin-Lim rapide (0 = algorithme classique)
+    db_range: float = 60.0       # dynamique représentée par l'image (0 -> -60 dB)
+    block_frames: int = 128      # trames reconstruites par bloc
+    context_frames: int = 8      # trames de contexte de chaque côté d'un bloc
+    seed: int = 0                # phase initiale
+
+# =============================================================================
+# 1. STFT / ISTFT
+# =============================================================================
+
+def stft(x: np.ndarray, n_fft: int, hop: int, window: np.ndarray) -> np.ndarray:
+    """(trames, bins) complexe, trames sans padding."""
+    frames = np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop]
+    return np.fft.rfft(frames * window, axis=1)
+
+def istft(X: np.ndarray, n_fft: int, hop: int, window: np.ndarray, wsum: np.ndarray) -> np.ndarray:
+    """Overlap-add vectorisé : n_fft/hop additions de tranches (une par décalage)."""
+    frames = np.fft.irfft(X, n=n_fft, axis=1) * window
+    n_frames = frames.shape[0]
+    out = np.zeros(n_fft + (n_frames - 1) * hop, dtype=np.float64)
+    for k in range(n_fft // hop):
+        seg = frames[:, k * hop:(k + 1) * hop].reshape(-1)
+        out[k * hop:k * hop + seg.size] += seg
+    return out / wsum
+
+def _window_sum(n_frames: int, n_fft: int, hop: int, window: np.ndarray) -> np.ndarray:
+    """Somme des fenêtres² en overlap-add (normalisation de l'ISTFT)."""
+    w2 = np.tile(window ** 2, (n_frames, 1))
+    out = np.zeros(n_fft + (n_frames - 1) * hop, dtype=np.float64)
+    for k in range(n_fft // hop):
+        seg = w2[:, k * hop:(k + 1) * hop].reshape(-1)
+        out[k * hop:k * hop + seg.size] += seg
+    return np.maximum(out, 1e-8)
+
+# =============================================================================
+# 2. GRIFFIN-LIM
+# =============================================================================
+
+def griffin_lim(S: np.ndarray, n_fft: int, hop: int, window: np.ndarray,
+                n_iter: int = 32, tol: float = 1e-3, momentum: float = 0.99,
+                init_phase: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Estime une forme d'onde dont la STFT a pour module S (trames, bins).
+    Renvoie (signal, phase finale, itérations effectuées).
+    """
+    wsum = _window_sum(S.shape[0], n_fft, hop, window)
+    phase = np.exp(1j * init_phase) if init_phase is not None else np.ones_like(S, dtype=np.complex128)
+    norm = np.linalg.norm(S) or 1.0
+    prev_proj = np.zeros_like(S, dtype=np.complex128)
+    prev_sc = np.inf
+    it = 0
+    for it in range(1, n_iter + 1):
+        x = istft(S * phase, n_fft, hop, window, wsum)
+        proj = stft(x, n_fft, hop, window)
+        # Convergence spectrale : écart entre module visé et module obtenu
+        sc = np.linalg.norm(S - np.abs(proj)) / norm
+        accel = proj + momentum * (proj - prev_proj) if momentum else proj
+        prev_proj = proj
+        phase = np.exp(1j * np.angle(accel))
+        if prev_sc - sc < tol:
+            break
+        prev_sc = sc
+    x = istft(S * phase, n_fft, hop, window, wsum)
+    return x, np.angle(phase), it
+
+# =============================================================================
+# 3. IMAGE -> MODULE STFT
+# =============================================================================
+
+def _linear_resample_axis(a: np.ndarray, positions: np.ndarray, axis: int) -> np.ndarray:
+    """Interpolation linéaire vectorisée de a aux positions (fractionnaires) sur un axe."""
+    i0 = np.clip(np.floor(positions).astype(np.intp), 0, a.shape[axis] - 1)
+    i1 = np.minimum(i0 + 1, a.shape[axis] - 1)
+    w = (positions - i0).astype(np.float32)
+    shape = [1, 1]
+    shape[axis] = -1
+    w = w.reshape(shape)
+    return np.take(a, i0, axis=axis) * (1 - w) + np.take(a, i1, axis=axis) * w
+
+def magnitude_block(mag_img: np.ndarray, start: int, stop: int, n_frames: int, n_fft: int,
+                    db_range: float) -> np.ndarray:
+    """
+    Module STFT (stop-start trames, n_fft//2+1 bins) pour les trames [start, stop)
+    d'un spectrogramme image (ligne 0 = aigus, valeurs [0, 1], échelle dB).
+    """
+    img = mag_img[::-1]  # vue : ligne 0 = graves
+    h, w = img.shape
+    bins = n_fft // 2 + 1
+    t_pos = np.arange(start, stop) * (w - 1) / max(n_frames - 1, 1)
+    f_pos = np.arange(bins) * (h - 1) / (bins - 1)
+    cols = _linear_resample_axis(img, t_pos, axis=1)        # (h, trames)
+    block = _linear_resample_axis(cols, f_pos, axis=0).T    # (trames, bins)
+    # [0, 1] -> amplitude linéaire ; 0 exactement = silence
+    S = np.where(block > 0, 10.0 ** ((block - 1.0) * db_range / 20.0), 0.0)
+    # Gain : une sinusoïde d'amplitude A donne un pic ~ A * sum(w) / 2
+    return S * (np.hanning(n_fft).sum() / 2.0) * 0.15
+
+# =============================================================================
+# 4. RECONSTRUCTION EN FLUX
+# =============================================================================
+
+def iter_audio_blocks(mag_img: np.ndarray, config: VocoderConfig = VocoderConfig()) -> Iterator[np.ndarray]:
+    """Blocs float32 successifs de la forme d'onde (sample_rate * duration échantillons au total)."""
+    n_fft, hop = config.n_fft, config.hop
+    if n_fft % hop:
+        raise ValueError("n_fft doit être un multiple de hop")
+    window = np.hanning(n_fft)
+    n_samples = int(round(config.sample_rate * config.duration))
+    offset = n_fft - hop                              # premier échantillon entièrement couvert
+    n_frames = math.ceil((n_samples + offset) / hop) + 1
+    ctx = max(config.context_frames, n_fft // hop)
+    xfade = min(n_fft // 2, ctx * hop)
+    fade_in = np.linspace(0.0, 1.0, xfade, endpoint=False)
+
+    emitted = 0          # échantillons écrits (repère de sortie)
+    tail = None          # fin du bloc précédent, fondue avec le début du suivant
+    carry_phase = None   # phase des trames de recouvrement, propagée au bloc suivant
+    rng = np.random.default_rng(config.seed)
+
+    for a in range(0, n_frames, config.block_frames):
+        b = min(a + config.block_frames, n_frames)
+        s, e = max(0, a - ctx), min(n_frames, b + ctx)
+        S = magnitude_block(mag_img, s, e, n_frames, n_fft, config.db_range)
+
+        init = rng.uniform(-np.pi, np.pi, S.shape)
+        if carry_phase is not None:
+            c_start, phase_prev = carry_phase
+            k = min(phase_prev.shape[0], e - c_start)
+            init[c_start - s:c_start - s + k] = phase_prev[:k]
+        x, phase, _ = griffin_lim(S, n_fft, hop, window, config.n_iter, config.tol,
+                                  config.momentum, init_phase=init)
+        carry_phase = (max(s, b - ctx), phase[max(s, b - ctx) - s:])
+
+        # Échantillons du bloc [a*hop, b*hop) (+ xfade pour la fondue), repère z
+        lo = a * hop - s * hop
+        hi = min(b * hop + (xfade if b < n_frames else 0), (e - 1) * hop + n_fft) - s * hop
+        chunk = x[lo:hi]
+        if tail is not None:
+            n = min(xfade, chunk.size, tail.size)
+            chunk = chunk.copy()
+            chunk[:n] = tail[:n] * (1.0 - fade_in[:n]) + chunk[:n] * fade_in[:n]
+        if b < n_frames:
+            tail, chunk = chunk[-xfade:], chunk[:-xfade]
+
+        # Repère z -> repère de sortie (on saute les `offset` premiers échantillons)
+        z0 = a * hop
+        start = max(offset - z0, 0)
+        stop = min(chunk.size, offset + n_samples - z0)
+        if stop > start:
+            out = np.tanh(chunk[start:stop]).astype(np.float32)  # limiteur doux, sans pic global
+            emitted += out.size
+            yield out
+        if emitted >= n_samples:
+            break
+
+def write_wav(mag_img: np.ndarray, path: str | Path, config: VocoderConfig = VocoderConfig()) -> Path:
+    """
+    Reconstruit l'audio et l'écrit en WAV 16 bits mono, bloc par bloc.
+    Écrit dans un fichier temporaire puis renommé : un lecteur (cache, autre
+    processus) ne voit jamais un WAV à moitié écrit.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with wave.open(str(tmp), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(config.sample_rate)
+            for block in iter_audio_blocks(mag_img, config):
+                wav.writeframes((block * 32767.0).astype("<i2").tobytes())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
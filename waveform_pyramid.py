@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Pyramides multi-résolution d'un WAV, pour la vue Signal (zoom / défilement)
+- Forme d'onde : min/max par bloc de BASE_BLOCK échantillons au niveau 0, puis
+  chaque niveau regroupe FACTOR blocs du niveau précédent.
+- STFT : module par trame (n_fft/hop) au niveau 0, calculé par tuiles de
+  TILE_FRAMES trames ; chaque niveau moyenne FACTOR trames du précédent
+  (la moyenne d'une plage est donc la même quel que soit le niveau lu).
+Construction par morceaux sur le WAV ouvert en memory-map, écrite directement
+dans des .npy en memory-map dimensionnés d'avance (ni le WAV ni la pyramide ne
+sont jamais entiers en mémoire). Résultat mis en cache à côté de l'audio
+(<audio>.pyramid/), relu en memory-map ; une requête ne lit que le niveau qui
+correspond à la largeur en pixels.
+"""
+
+import json
+import math
+import os
+import shutil
+import struct
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+import vocoder
+
+VERSION = 1
+BASE_BLOCK = 64          # échantillons par bloc min/max au niveau 0
+FACTOR = 4               # réduction entre deux niveaux
+TILE_FRAMES = 256        # trames STFT par tuile
+N_FFT = 1024
+HOP = 256
+CHUNK_SAMPLES = 1 << 20  # lecture du WAV par morceaux (multiple de BASE_BLOCK)
+CHUNK_ENTRIES = 1 << 12  # réduction d'un niveau par morceaux (multiple de FACTOR)
+
+WAVE, STFT, META = "waveform.npy", "stft.npy", "meta.json"
+
+# =============================================================================
+# 1. LECTURE DU WAV (MEMORY-MAP)
+# =============================================================================
+
+def read_wav_header(path: str | Path) -> tuple[int, int, int, int]:
+    """(fréquence, canaux, décalage des données, nombre de trames) d'un WAV PCM 16 bits."""
+    with open(path, "rb") as f:
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{path} n'est pas un fichier WAV")
+        fmt = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                raise ValueError(f"{path} : bloc 'data' introuvable")
+            chunk_id, size = struct.unpack("<4sI", head)
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack("<HHIIHH", f.read(16))
+                f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} : bloc 'fmt ' manquant")
+                audio_format, channels, rate, _, block_align, bits = fmt
+                if audio_format != 1 or bits != 16:
+                    raise ValueError(f"{path} : seul le PCM 16 bits est pris en charge")
+                return rate, channels, f.tell(), size // block_align
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+
+def open_samples(path: str | Path) -> tuple[np.memmap, int]:
+    """Échantillons int16 (trames, canaux) en memory-map, et fréquence d'échantillonnage."""
+    rate, channels, offset, n_frames = read_wav_header(path)
+    if n_frames == 0:
+        return np.zeros((0, channels), dtype="<i2"), rate
+    return np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(n_frames, channels)), rate
+
+def _mono(block: np.ndarray) -> np.ndarray:
+    """Morceau (trames, canaux) int16 -> float32 mono dans [-1, 1]."""
+    x = block.astype(np.float32)
+    if x.shape[1] > 1:
+        x = x.mean(axis=1)
+    else:
+        x = x[:, 0]
+    return x / 32768.0
+
+# =============================================================================
+# 2. CONSTRUCTION
+# =============================================================================
+
+def _reduce_minmax(level: np.ndarray) -> np.ndarray:
+    """(n, 2) min/max -> (ceil(n/FACTOR), 2) : min des min, max des max."""
+    n = len(level)
+    m = -(-n // FACTOR)
+    padded = np.pad(level, ((0, m * FACTOR - n), (0, 0)), mode="edge").reshape(m, FACTOR, 2)
+    return np.stack([padded[:, :, 0].min(axis=1), padded[:, :, 1].max(axis=1)], axis=1)
+
+def _reduce_mean(level: np.ndarray) -> np.ndarray:
+    """Moyenne de FACTOR trames consécutives (la dernière entrée peut en couvrir moins)."""
+    n = len(level)
+    m = n // FACTOR
+    out = np.empty((-(-n // FACTOR), level.shape[1]), dtype=np.float32)
+    out[:m] = level[:m * FACTOR].astype(np.float32).reshape(m, FACTOR, -1).mean(axis=1)
+    if n > m * FACTOR:
+        out[m] = level[m * FACTOR:].astype(np.float32).mean(axis=0)
+    return out
+
+def _reduce_into(src: np.ndarray, dst: np.ndarray, reduce):
+    """Niveau suivant de src écrit dans dst, par morceaux de CHUNK_ENTRIES entrées."""
+    for start in range(0, len(src), CHUNK_ENTRIES):
+        d0 = start // FACTOR
+        reduced = reduce(np.asarray(src[start:start + CHUNK_ENTRIES]))
+        dst[d0:d0 + len(reduced)] = reduced
+
+def _waveform_level0(samples: np.memmap, out: np.ndarray):
+    """Min/max par bloc de BASE_BLOCK échantillons, écrits dans out (ceil(n/BASE_BLOCK), 2)."""
+    n = len(samples)
+    for start in range(0, n, CHUNK_SAMPLES):
+        x = _mono(samples[start:start + CHUNK_SAMPLES])
+        m = -(-len(x) // BASE_BLOCK)
+        blocks = np.pad(x, (0, m * BASE_BLOCK - len(x)), mode="edge").reshape(m, BASE_BLOCK)
+        b0 = start // BASE_BLOCK
+        out[b0:b0 + m, 0] = blocks.min(axis=1)
+        out[b0:b0 + m, 1] = blocks.max(axis=1)
+
+def _stft_frames(n: int) -> int:
+    return 1 + (n - N_FFT) // HOP if n >= N_FFT else 0
+
+def _stft_level0(samples: np.memmap, out: np.ndarray):
+    """Module STFT (trames, bins) écrit dans out, tuile par tuile (TILE_FRAMES trames à la fois)."""
+    n_frames = len(out)
+    window = np.hanning(N_FFT).astype(np.float32)
+    for f0 in range(0, n_frames, TILE_FRAMES):
+        f1 = min(f0 + TILE_FRAMES, n_frames)
+        x = _mono(samples[f0 * HOP:(f1 - 1) * HOP + N_FFT])
+        out[f0:f1] = np.abs(vocoder.stft(x, N_FFT, HOP, window))
+
+def _level_sizes(n: int, stop: int) -> list[int]:
+    """Longueurs des niveaux successifs (réduction par FACTOR) jusqu'à au plus `stop` entrées."""
+    sizes = [n]
+    while sizes[-1] > stop:
+        sizes.append(-(-sizes[-1] // FACTOR))
+    return sizes
+
+def _build_levels(path: Path, sizes: list[int], width: int, level0, reduce):
+    """Tous les niveaux dans un seul .npy float16 en memory-map, le niveau 0 rempli par level0(out)."""
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float16, shape=(sum(sizes), width))
+    offset = 0
+    level0(out[:sizes[0]])
+    for size, next_size in zip(sizes, sizes[1:]):
+        _reduce_into(out[offset:offset + size], out[offset + size:offset + size + next_size], reduce)
+        offset += size
+    out.flush()
+    del out
+
+def _is_current(meta: dict | None, audio_path: Path) -> bool:
+    """La pyramide décrite par meta correspond-elle au WAV tel qu'il est sur disque ?"""
+    st = audio_path.stat()
+    return (meta is not None and meta.get("version") == VERSION and meta.get("source_size") == st.st_size
+            and meta.get("source_mtime_ns") == st.st_mtime_ns)
+
+def _install(tmp: Path, out_dir: Path, audio_path: Path):
+    """
+    Met tmp à la place de out_dir. Si out_dir existe déjà et est à jour (construit en
+    même temps par un autre thread ou processus), on le garde ; périmé, il est remplacé.
+    """
+    for _ in range(2):
+        try:
+            os.replace(tmp, out_dir)
+            return
+        except OSError:
+            if _is_current(_read_meta(out_dir), audio_path):
+                shutil.rmtree(tmp, ignore_errors=True)
+                return
+            shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+
+def build_pyramid(audio_path: str | Path, out_dir: str | Path | None = None) -> Path:
+    """Calcule les deux pyramides d'un WAV et les écrit (atomiquement) dans out_dir."""
+    audio_path = Path(audio_path)
+    out_dir = Path(out_dir) if out_dir else pyramid_dir(audio_path)
+    samples, rate = open_samples(audio_path)
+    st = audio_path.stat()
+
+    wave_sizes = _level_sizes(-(-len(samples) // BASE_BLOCK), 1)
+    stft_sizes = _level_sizes(_stft_frames(len(samples)), TILE_FRAMES)
+
+    tmp = out_dir.with_name(f"{out_dir.name}.tmp-{uuid.uuid4().hex}")
+    tmp.mkdir(parents=True)
+    try:
+        _build_levels(tmp / WAVE, wave_sizes, 2, lambda out: _waveform_level0(samples, out), _reduce_minmax)
+        _build_levels(tmp / STFT, stft_sizes, N_FFT // 2 + 1, lambda out: _stft_level0(samples, out), _reduce_mean)
+        meta = {
+            "version": VERSION, "source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns,
+            "sample_rate": rate, "n_samples": len(samples), "n_fft": N_FFT, "hop": HOP,
+            "tile_frames": TILE_FRAMES, "n_frames": stft_sizes[0],
+            # (début, longueur, échantillons par bloc) / (début, longueur, trames de niveau 0 par entrée)
+            "wave_levels": _layout(wave_sizes, BASE_BLOCK),
+            "stft_levels": _layout(stft_sizes, 1),
+        }
+        with open(tmp / META, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        _install(tmp, out_dir, audio_path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return out_dir
+
+def _layout(sizes: list[int], base: int) -> list[list[int]]:
+    out, offset, step = [], 0, base
+    for size in sizes:
+        out.append([offset, size, step])
+        offset += size
+        step *= FACTOR
+    return out
+
+def pyramid_dir(audio_path: str | Path) -> Path:
+    audio_path = Path(audio_path)
+    return audio_path.with_name(audio_path.stem + ".pyramid")
+
+# =============================================================================
+# 3. LECTURE PAR NIVEAU
+# =============================================================================
+
+class SignalPyramid:
+    """Pyramides d'un WAV relues en memory-map ; requêtes par plage de temps et largeur en pixels."""
+
+    def __init__(self, audio_path: Path, directory: Path, meta: dict):
+        self.audio_path = audio_path
+        self.directory = directory
+        self.meta = meta
+        self.sample_rate = meta["sample_rate"]
+        self.n_samples = meta["n_samples"]
+        self.duration = self.n_samples / self.sample_rate if self.sample_rate else 0.0
+        self.hop = meta["hop"]
+        self.n_fft = meta["n_fft"]
+        self.wave = np.load(directory / WAVE, mmap_mode="r")
+        self.stft = np.load(directory / STFT, mmap_mode="r")
+        self.wave_levels = meta["wave_levels"]
+        self.stft_levels = meta["stft_levels"]
+        self._samples = None
+
+    @classmethod
+    def open(cls, audio_path: str | Path, rebuild: bool = False) -> "SignalPyramid":
+        """Ouvre la pyramide d'un WAV, en la (re)construisant si absente ou périmée."""
+        audio_path = Path(audio_path)
+        directory = pyramid_dir(audio_path)
+        meta = None if rebuild else _read_meta(directory)
+        if not _is_current(meta, audio_path):
+            build_pyramid(audio_path, directory)
+            meta = _read_meta(directory)
+        return cls(audio_path, directory, meta)
+
+    @property
+    def samples(self) -> np.memmap:
+        if self._samples is None:
+            self._samples, _ = open_samples(self.audio_path)
+        return self._samples
+
+    @property
+    def freqs(self) -> np.ndarray:
+        return np.fft.rfftfreq(self.n_fft, 1.0 / self.sample_rate)
+
+    def _clip(self, t0: float, t1: float) -> tuple[int, int]:
+        s0 = int(np.clip(math.floor(t0 * self.sample_rate), 0, self.n_samples))
+        s1 = int(np.clip(math.ceil(t1 * self.sample_rate), s0, self.n_samples))
+        return s0, s1
+
+    def envelope(self, t0: float, t1: float, n_px: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (temps en s, min, max) de la forme d'onde sur [t0, t1], entre n_px et FACTOR*n_px colonnes.
+        Lit le niveau le plus grossier dont un bloc tient dans un pixel ; en dessous de
+        BASE_BLOCK échantillons par pixel, réduit directement les échantillons bruts.
+        """
+        s0, s1 = self._clip(t0, t1)
+        per_px = (s1 - s0) / max(n_px, 1)
+        usable = [lvl for lvl in self.wave_levels if lvl[2] <= per_px]
+        if usable:
+            offset, length, block = usable[-1]
+            b0, b1 = s0 // block, min(-(-s1 // block), length)
+            env = np.asarray(self.wave[offset + b0:offset + b1], dtype=np.float32)
+            times = (np.arange(b0, b1) * block + block / 2) / self.sample_rate
+            return times, env[:, 0], env[:, 1]
+        x = _mono(np.asarray(self.samples[s0:s1]))
+        k = max(int(per_px), 1)
+        if k == 1:
+            return np.arange(s0, s1) / self.sample_rate, x, x
+        m = -(-len(x) // k)
+        blocks = np.pad(x, (0, m * k - len(x)), mode="edge").reshape(m, k)
+        return (s0 + np.arange(m) * k + k / 2) / self.sample_rate, blocks.min(axis=1), blocks.max(axis=1)
+
+    def _stft_level(self, f0: int, f1: int, max_entries: int):
+        """Niveau STFT le plus fin dont la plage [f0, f1) tient en max_entries entrées."""
+        for offset, length, step in self.stft_levels:
+            e0, e1 = f0 // step, min(-(-f1 // step), length)
+            if e1 - e0 <= max_entries or (offset, length, step) == tuple(self.stft_levels[-1]):
+                return offset, e0, e1, step
+        raise AssertionError("pyramide vide")
+
+    def _frames(self, t0: float, t1: float) -> tuple[int, int]:
+        n_frames = self.meta["n_frames"]
+        f0 = int(np.clip(t0 * self.sample_rate // self.hop, 0, n_frames))
+        f1 = int(np.clip(-(-t1 * self.sample_rate // self.hop), f0, n_frames))
+        return f0, max(f1, min(f0 + 1, n_frames))
+
+    def spectrogram(self, t0: float, t1: float, n_px: int) -> tuple[np.ndarray, np.ndarray]:
+        """(temps des colonnes en s, module (colonnes, bins)) sur [t0, t1], au plus n_px colonnes."""
+        f0, f1 = self._frames(t0, t1)
+        offset, e0, e1, step = self._stft_level(f0, f1, n_px)
+        times = (np.arange(e0, e1) * step + step / 2) * self.hop / self.sample_rate
+        return times, np.asarray(self.stft[offset + e0:offset + e1], dtype=np.float32)
+
+    def stft_tile(self, level: int, index: int) -> np.ndarray:
+        """Tuile `index` (TILE_FRAMES entrées) d'un niveau STFT, vue memory-map."""
+        offset, length, _ = self.stft_levels[level]
+        tile = self.meta["tile_frames"]
+        return self.stft[offset + index * tile:offset + min((index + 1) * tile, length)]
+
+    def mean_spectrum(self, t0: float, t1: float, max_entries: int = 64) -> tuple[np.ndarray, np.ndarray]:
+        """(fréquences, module moyen) sur [t0, t1], lu sur un niveau grossier (au plus max_entries trames)."""
+        f0, f1 = self._frames(t0, t1)
+        offset, e0, e1, _ = self._stft_level(f0, f1, max_entries)
+        if e1 <= e0:
+            return self.freqs, np.zeros(self.n_fft // 2 + 1, dtype=np.float32)
+        return self.freqs, np.asarray(self.stft[offset + e0:offset + e1], dtype=np.float32).mean(axis=0)
+
+def _read_meta(directory: Path) -> dict | None:
+    try:
+        with open(directory / META, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None